@@ -1,37 +1,134 @@
+import pandas as pd
+
+from metrics import span, timed
+
+# --- Expert Knowledge Base: The Strategy & Impact Glossary ---
+FEATURE_GLOSSARY = {
+    'api': 'Controls the I/O interface. Changing from POSIX to MPIIO can improve performance for highly parallel jobs.',
+    'transferSize': 'The size of each I/O operation. Larger values can increase throughput for sequential access but may use more memory.',
+    'blockSize': 'The total size of a contiguous data block. Larger values are generally better for large files and sequential access.',
+    'segmentCount': 'The number of data segments. Higher values can increase parallelism but also metadata overhead.',
+    'numTasks': 'The number of concurrent processes. Higher values increase parallelism but can lead to contention.',
+    'filePerProc': 'Using one file per process (1) can reduce contention but creates many small files. Sharing files (0) is the opposite.',
+    'useStridedDatatype': 'Enables non-contiguous access. Useful for specific data patterns but can be less performant than simple sequential I/O.',
+    'setAlignment': 'Aligns data in memory. Matching this to the filesystem block size is critical for performance.',
+    'useO_DIRECT': 'Bypasses the OS cache (1). This can be faster for very large transfers but slower for repeated access to the same data.',
+    'fsync': 'Forces writes to disk (1). This is safe but very slow. Disabling it (0) is much faster but risks data loss on a crash.',
+    'LUSTRE_STRIPE_SIZE': 'The size of a data chunk on a Lustre OST. This should be tuned to match the application\'s I/O size.',
+    'LUSTRE_STRIPE_WIDTH': 'The number of storage servers to stripe data across. A higher width increases parallelism but also network overhead.'
+}
+
+# --- Define the comprehensive deny-list ---
+COLS_TO_IGNORE = ['nprocs', 'test_id', 'y_true', 'y_pred', 'error', 'tag']
+
+# Which kinds of evidence each pipeline puts in front of the LLM.
+PIPELINE_EVIDENCE = {
+    'raw_darshan': {'has_shap': False, 'has_darshan': True},
+    'darshan_shap': {'has_shap': True, 'has_darshan': True},
+    'shap_only': {'has_shap': True, 'has_darshan': False},
+}
+
+
+def format_diagnosis_summary(pipeline: str, top_shap: pd.Series = None, top_raw: pd.Series = None) -> str:
+    """
+    Formats the 'PERFORMANCE DIAGNOSIS DATA' section from the top SHAP features
+    and/or the top raw Darshan counters (each a Series sorted by feature name).
+    """
+    evidence = PIPELINE_EVIDENCE[pipeline]
+    sections = []
 
+    if evidence['has_shap']:
+        sections.append(f"Top Performance Bottlenecks (from SHAP analysis):\n{top_shap.to_string()}")
 
-def create_prompt(diagnosis_summary: str, config: str, has_shap: bool, has_darshan: bool, options: dict, glossary: dict) -> str:
+    if evidence['has_darshan']:
+        if evidence['has_shap']:
+            sections.append(f"Top Most Frequent Raw I/O Operations (from Darshan counters):\n{top_raw.to_string()}")
+        else:
+            sections.append(f"Top Raw I/O Operations:\n{top_raw.to_string()}")
+
+    return "\n\n".join(sections)
+
+
+@timed('diagnosis')
+def build_diagnosis_summary(pipeline: str, job_raw: pd.DataFrame, job_shap: pd.DataFrame, top_n: int = 5) -> str:
     """
-    Creates the definitive, most advanced prompt using a unified reasoning framework
-    that forces a deep, three-stage analysis and produces a final, consolidated
-    recommendation.
+    Builds the 'PERFORMANCE DIAGNOSIS DATA' section for one job: the top SHAP
+    features and/or the top non-zero raw Darshan counters, depending on the pipeline.
+
+    For many jobs at once, use diagnosis.DiagnosisEngine instead.
     """
-    options_str = ""
-    for key, value in options.items():
-        description = glossary.get(key, "No strategic description available.")
-        options_str += f"- **{key}**: {value}\n  - *Strategic Impact:* {description}\n"
+    evidence = PIPELINE_EVIDENCE[pipeline]
+    top_shap = top_raw = None
+
+    if evidence['has_shap']:
+        job_shap_data = job_shap.drop(columns=COLS_TO_IGNORE, errors='ignore').iloc[0]
+        top_shap = job_shap_data.nlargest(top_n).sort_index()
+
+    if evidence['has_darshan']:
+        job_raw_data = job_raw.iloc[0].drop(labels=COLS_TO_IGNORE, errors='ignore')
+        numeric_job_data = pd.to_numeric(job_raw_data, errors='coerce').dropna()
+        non_zero_counters = numeric_job_data[numeric_job_data > 0]
+        top_raw = non_zero_counters.nlargest(top_n).sort_index()
+
+    return format_diagnosis_summary(pipeline, top_shap, top_raw)
 
-    # --- 1. Define the Core Context for the LLM ---
-    prompt_header = f"""
+
+def format_config_string(job_config: pd.DataFrame) -> str:
+    """
+    Formats a job's IOR configuration row as sorted 'key = value' lines.
+    """
+    config_dict = job_config.drop(columns=['config_id', 'testFile'], errors='ignore').iloc[0].to_dict()
+    sorted_config_items = sorted(config_dict.items())
+    return "\n".join([f"{key} = {value}" for key, value in sorted_config_items])
+
+
+def build_job_prompt(pipeline: str, job_raw: pd.DataFrame, job_shap: pd.DataFrame,
+                     job_config: pd.DataFrame, options: dict, diagnosis_summary: str = None,
+                     compiler=None) -> str:
+    """
+    Builds the complete LLM prompt for one job under the given pipeline.
+
+    Pass a precomputed diagnosis_summary (e.g. from diagnosis.DiagnosisEngine)
+    to skip the per-job top-k computation, and a prompt_compiler.PromptCompiler
+    to put the invariant part of the prompt first (options is then ignored in
+    favour of the compiler's own option set).
+    """
+    if diagnosis_summary is None:
+        diagnosis_summary = build_diagnosis_summary(pipeline, job_raw, job_shap)
+    with span('prompt'):
+        config_string = format_config_string(job_config)
+        if compiler is not None:
+            return compiler.compile(pipeline, diagnosis_summary, config_string)
+        return create_prompt(diagnosis_summary, config_string, options=options,
+                             glossary=FEATURE_GLOSSARY, **PIPELINE_EVIDENCE[pipeline])
+
+
+# --- 1. Define the Core Context for the LLM ---
+PROMPT_ROLE_AND_CONTEXT = """
 **ROLE AND GOAL:**
 You are an expert HPC I/O diagnostician. Your goal is to systematically evaluate all potential optimizations for a given performance issue, score them, rank them, and finally synthesize your findings into a single, actionable configuration recommendation.
 
 **CONTEXT:**
 You have performance data listing top bottlenecks (the symptoms), the current configuration (the environment), and a strategic guide for all possible parameter changes (the Optimization Levers).
+"""
 
-**PERFORMANCE DIAGNOSIS DATA (The Symptoms):**
-{diagnosis_summary}
-
-**CURRENT I/O CONFIGURATION FILE (The Environment):**
-{config}
 
-**OPTIMIZATION LEVERS AND STRATEGIC IMPACT (Your Only Choices):**
-{options_str}
-"""
+def format_options(options: dict, glossary: dict) -> str:
+    """
+    Formats the optimization levers: every parameter's possible values and its strategic impact.
+    """
+    options_str = ""
+    for key, value in options.items():
+        description = glossary.get(key, "No strategic description available.")
+        options_str += f"- **{key}**: {value}\n  - *Strategic Impact:* {description}\n"
+    return options_str
 
-    # --- 2. Build the Definitive Three-Stage Reasoning Framework ---
-    # This entire block of text is sent to the LLM as its instructions.
 
+def build_reasoning_framework(has_shap: bool, has_darshan: bool) -> str:
+    """
+    Builds the Definitive Three-Stage Reasoning Framework.
+    This entire block of text is sent to the LLM as its instructions.
+    """
     reasoning_framework = """
 **YOUR TASK: You MUST complete the following three stages in order.**
 
@@ -80,8 +177,32 @@ parameter1 = new_value  (Impact: X, Risk: Y - Expected to solve the primary bott
 parameter2 = new_value  (Impact: A, Risk: B - A complementary change to improve throughput)
 
 """
-    
+    return reasoning_framework
+
+
+def create_prompt(diagnosis_summary: str, config: str, has_shap: bool, has_darshan: bool, options: dict, glossary: dict) -> str:
+    """
+    Creates the definitive, most advanced prompt using a unified reasoning framework
+    that forces a deep, three-stage analysis and produces a final, consolidated
+    recommendation.
+    """
+    options_str = format_options(options, glossary)
+
+    prompt_header = PROMPT_ROLE_AND_CONTEXT + f"""
+**PERFORMANCE DIAGNOSIS DATA (The Symptoms):**
+{diagnosis_summary}
+
+**CURRENT I/O CONFIGURATION FILE (The Environment):**
+{config}
+
+**OPTIMIZATION LEVERS AND STRATEGIC IMPACT (Your Only Choices):**
+{options_str}
+"""
+
+    # --- 2. Build the Definitive Three-Stage Reasoning Framework ---
+    reasoning_framework = build_reasoning_framework(has_shap, has_darshan)
+
     # Assemble all the pieces into the final prompt
     full_prompt = prompt_header + reasoning_framework
     
-    return full_prompt
\ No newline at end of file
+    return full_prompt
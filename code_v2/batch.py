@@ -0,0 +1,352 @@
+# batch.py
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import metrics
+from llm_api import call_llm, stream_llm, streaming_enabled, LLMError
+from config_index import observed_columns
+from surrogate import speedup_columns
+from utils import (save_suggestion, extract_pipeline_data, build_comparison_frame, write_comparison_csv,
+                   build_modified_config, write_modified_config)
+
+
+def build_suggestion_outputs(original_config: dict, after_changes: dict, pipeline: str, test_id: str,
+                             original_ior_config_csv_path: Path, ior_config_df=None, surrogate=None,
+                             min_speedup: float = None, config_index=None, config_positions: dict = None) -> dict:
+    """
+    Builds the comparison table and the modified IOR configuration of one
+    suggestion in memory, without writing anything (see write_suggestion_outputs).
+
+    With a surrogate model the comparison gets predicted speedup columns, and
+    when min_speedup is set, suggestions predicted to be slower than that get
+    no modified configuration (so they are never rerun with IOR). With a
+    config_index.ConfigIndex it also gets the speedup observed for the same
+    (or the nearest profiled) configuration. config_positions is the
+    utils.config_row_positions of ior_config_df, from the table's owner.
+
+    Returns:
+        dict: 'comparison', 'modified' (None if the job is not in the
+        configuration table or the suggestion is below min_speedup), 'speedup'
+        (None without a surrogate) and 'below_min_speedup'.
+    """
+    speedup = None
+    extra_columns = None
+    with metrics.span('csv'):
+        if surrogate is not None:
+            scores = surrogate.score_suggestions(original_config, after_changes)
+            speedup = scores['speedup']
+            extra_columns = speedup_columns(scores, pipeline)
+        if config_index is not None:
+            check = config_index.check_suggestion(original_config, after_changes)
+            if check is not None:
+                changed = [p for p in after_changes if p in config_index.parameters]
+                extra_columns = {**(extra_columns or {}), **observed_columns(check, changed, pipeline)}
+        comparison = build_comparison_frame(original_config, after_changes, pipeline, extra_columns=extra_columns)
+
+    outputs = {'comparison': comparison, 'modified': None, 'speedup': speedup,
+               'below_min_speedup': speedup is not None and min_speedup is not None and speedup < min_speedup}
+    if not outputs['below_min_speedup']:
+        with metrics.span('apply'):
+            config_df = ior_config_df if ior_config_df is not None else pd.read_csv(original_ior_config_csv_path)
+            outputs['modified'] = build_modified_config(config_df, after_changes, test_id, config_positions)
+    return outputs
+
+
+def write_suggestion_outputs(outputs: dict, pipeline: str, test_id: str, output_dir: Path,
+                             original_ior_config_csv_path: Path, min_speedup: float = None,
+                             store=None, write_files: bool = None, written: list = None):
+    """
+    Writes the tables of build_suggestion_outputs to the comparison and
+    modified configuration CSVs and, with a results_store.ResultsStore, adds
+    them to the store. The CSVs are written only if the store's export_files
+    is set (write_files overrides that).
+
+    Args:
+        written (list): If given, the path of every file written is appended
+                        to it, so a caller can remove them again.
+    """
+    if write_files is None:
+        write_files = store is None or store.export_files
+    with metrics.span('csv'):
+        if store is not None:
+            store.add_comparison(test_id, pipeline, outputs['comparison'])
+        if write_files:
+            path = write_comparison_csv(outputs['comparison'], pipeline, output_dir, test_id)
+            if written is not None:
+                written.append(path)
+
+    if outputs['below_min_speedup']:
+        print(f"Predicted speedup {outputs['speedup']:.2f}x for {pipeline} {test_id} is below {min_speedup}x; "
+              f"modified configuration not written.")
+        if store is not None:
+            # Clears any modified configuration stored for an earlier response
+            store.add_modified_config(test_id, pipeline, pd.DataFrame())
+        return
+    modified = outputs['modified']
+    if modified is None:
+        print(f"Error: Test ID '{test_id}' not found in '{original_ior_config_csv_path}'. No changes applied.")
+        return
+    with metrics.span('apply'):
+        if write_files:
+            path = write_modified_config(modified, pipeline, output_dir, test_id)
+            if written is not None:
+                written.append(path)
+        if store is not None:
+            store.add_modified_config(test_id, pipeline, modified)
+
+
+def write_suggestion_csvs(original_config: dict, after_changes: dict, pipeline: str, test_id: str,
+                          output_dir: Path, original_ior_config_csv_path: Path, ior_config_df=None,
+                          surrogate=None, min_speedup: float = None, config_index=None,
+                          store=None, write_files: bool = None, config_positions: dict = None):
+    """
+    Builds and writes the comparison CSV and the modified IOR configuration
+    CSV for one suggestion (build_suggestion_outputs, then write_suggestion_outputs).
+
+    Returns:
+        float: The predicted speedup of all changes together, or None without a surrogate.
+    """
+    outputs = build_suggestion_outputs(original_config, after_changes, pipeline, test_id,
+                                       original_ior_config_csv_path, ior_config_df=ior_config_df,
+                                       surrogate=surrogate, min_speedup=min_speedup, config_index=config_index,
+                                       config_positions=config_positions)
+    write_suggestion_outputs(outputs, pipeline, test_id, output_dir, original_ior_config_csv_path,
+                             min_speedup=min_speedup, store=store, write_files=write_files)
+    return outputs['speedup']
+
+
+def _run_llm(task: dict, build_outputs) -> dict:
+    """
+    Calls the LLM for one task and measures the call.
+
+    In streaming mode the outputs of the task are built in memory by this
+    worker as soon as the After block is complete, while the rest of the
+    response is still being generated. Nothing is written here: the caller
+    writes them once the whole response has arrived, so a stream that fails
+    after its After block leaves no outputs behind.
+
+    Returns:
+        dict: 'suggestion' (None if the call failed), 'error', 'latency_s',
+        'ttft_s', 'after_block_s' and 'outputs' (the built outputs, or None).
+    """
+    outcome = {'suggestion': None, 'error': None, 'ttft_s': None, 'after_block_s': None, 'outputs': None}
+    start = time.perf_counter()
+    with metrics.job(task['test_id'], task['pipeline']):
+        try:
+            if streaming_enabled():
+                def on_after_block(after_changes):
+                    outcome['outputs'] = build_outputs(task, after_changes)
+
+                result = stream_llm(task['prompt'], on_after_block=on_after_block)
+                outcome.update(suggestion=result['content'], ttft_s=result['ttft_s'],
+                               after_block_s=result['after_block_s'])
+            else:
+                outcome['suggestion'] = call_llm(task['prompt'])
+        except LLMError as e:
+            outcome['error'] = str(e)
+        except Exception as e:
+            # E.g. a suggestion that cannot be applied: this task fails, the batch goes on
+            outcome['error'] = f"{type(e).__name__}: {e}"
+    if outcome['error'] is not None:
+        outcome['outputs'] = None
+    outcome['latency_s'] = time.perf_counter() - start
+    return outcome
+
+
+def _percentiles(values: list):
+    if not values:
+        return float('nan'), float('nan')
+    p50, p95 = np.percentile(values, [50, 95])
+    return float(p50), float(p95)
+
+
+def summarize_run(latencies: list, elapsed: float, ttfts: list = None, jobs: int = None) -> dict:
+    """
+    Computes throughput and latency percentiles for a finished batch.
+
+    Args:
+        latencies (list): The latency of every LLM call.
+        elapsed (float): Wall time of the batch.
+        ttfts (list): Time to first token of the streamed calls.
+        jobs (int): Jobs covered by the successful calls (more than the calls
+                    when suggestions are fanned out to cluster members).
+                    Defaults to one job per call.
+    """
+    jobs = len(latencies) if jobs is None else jobs
+    summary = {
+        'calls': len(latencies),
+        'jobs': jobs,
+        'elapsed_s': elapsed,
+        'calls_per_s': len(latencies) / elapsed if elapsed > 0 else 0.0,
+        'jobs_per_s': jobs / elapsed if elapsed > 0 else 0.0,
+    }
+    summary['p50_s'], summary['p95_s'] = _percentiles(latencies)
+    summary['ttft_p50_s'], summary['ttft_p95_s'] = _percentiles(ttfts or [])
+    return summary
+
+
+def run_batch(tasks: list, output_dir: Path, original_ior_config_csv_path: Path, concurrency: int = 8,
+              ior_config_df=None, surrogate=None, min_speedup: float = None, config_index=None,
+              checkpoint=None, store=None, config_positions: dict = None) -> list:
+    """
+    Dispatches the LLM calls for many jobs through a bounded thread pool and
+    writes each job's results to disk as soon as its call finishes.
+
+    Args:
+        tasks (list): One dict per job with the keys 'test_id', 'pipeline',
+                      'prompt' and 'original_config'. An optional 'members' list
+                      (dicts with 'test_id' and 'original_config') makes the task
+                      a cluster representative: its parsed suggestion is applied
+                      to every member as well.
+        output_dir (Path): The directory where suggestion and CSV files are saved.
+        original_ior_config_csv_path (Path): Path to the original ior_configurations(in).csv.
+        concurrency (int): The maximum number of LLM calls in flight at once.
+        ior_config_df (pd.DataFrame): The already-loaded configuration table, so it
+                                      is not re-read for every job.
+        config_positions (dict): utils.config_row_positions of ior_config_df, from the
+                                 table's owner (e.g. JobStore.ior_config_positions).
+        surrogate (surrogate.KNNSurrogate): Scores each suggestion (see write_suggestion_csvs).
+        min_speedup (float): Minimum predicted speedup for writing a modified configuration.
+        config_index (config_index.ConfigIndex): Checks each suggestion against measured results.
+        checkpoint (checkpoint.Checkpoint): Records each task as started before its call
+                                            and as done or failed once its outputs are written.
+                                            Tasks then also need an 'input_hash'.
+        store (results_store.ResultsStore): Stores every prompt, response and the tables
+                                            of the CSV files, in transactions of batch_size
+                                            jobs. With a store, a task is recorded as done
+                                            only once its batch is committed.
+
+    Returns:
+        A list of per-task result dicts ('test_id', 'pipeline', 'latency_s', 'ttft_s',
+        'members', 'predicted_speedup', 'status').
+    """
+    def build_outputs(task: dict, after_changes: dict) -> dict:
+        """
+        The outputs of the task and of each of its cluster members, by test_id.
+        """
+        pipeline = task['pipeline']
+        return {target['test_id']: build_suggestion_outputs(
+                    target['original_config'], after_changes, pipeline, target['test_id'],
+                    original_ior_config_csv_path, ior_config_df=ior_config_df,
+                    surrogate=surrogate, min_speedup=min_speedup, config_index=config_index,
+                    config_positions=config_positions)
+                for target in [task] + task.get('members', [])}
+
+    def write_outputs(task: dict, suggestion: str, outputs: dict, written: list):
+        pipeline = task['pipeline']
+        if store is None or store.export_files:
+            with metrics.span('save'):
+                written.append(save_suggestion(output_dir, pipeline, task['test_id'], task['prompt'], suggestion))
+        for target in [task] + task.get('members', []):
+            target_outputs = outputs[target['test_id']]
+            write_suggestion_outputs(target_outputs, pipeline, target['test_id'], output_dir,
+                                     original_ior_config_csv_path, min_speedup=min_speedup, store=store,
+                                     written=written)
+            if store is not None:
+                with metrics.span('save'):
+                    store.add_analysis(target['test_id'], pipeline, task['prompt'], suggestion,
+                                       representative=task['test_id'] if target is not task else None,
+                                       predicted_speedup=target_outputs['speedup'])
+
+    def discard_outputs(task: dict, written: list):
+        """
+        Removes what write_outputs wrote before it failed: the files and the store's buffered rows.
+        """
+        for path in written:
+            Path(path).unlink(missing_ok=True)
+        if store is not None:
+            for target in [task] + task.get('members', []):
+                store.discard(target['test_id'], task['pipeline'])
+
+    # Tasks whose results are buffered in the store, recorded as done once it commits them
+    committing = []
+
+    def record_committed(flushed: bool):
+        if flushed and committing and checkpoint is not None:
+            checkpoint.record_each(committing, 'done')
+        if flushed:
+            committing.clear()
+
+    results = []
+    latencies = []
+    ttfts = []
+    print(f"Dispatching {len(tasks)} LLM calls with concurrency {concurrency}...")
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        if checkpoint is not None:
+            checkpoint.record_many(tasks, 'started')
+        futures = {executor.submit(_run_llm, task, build_outputs): task for task in tasks}
+
+        for future in as_completed(futures):
+            task = futures[future]
+            test_id, pipeline = task['test_id'], task['pipeline']
+            outcome = future.result()
+            latency = outcome['latency_s']
+            latencies.append(latency)
+            if outcome['ttft_s'] is not None:
+                ttfts.append(outcome['ttft_s'])
+            result = {'test_id': test_id, 'pipeline': pipeline, 'latency_s': latency, 'ttft_s': outcome['ttft_s'],
+                      'members': len(task.get('members', []))}
+
+            if outcome['suggestion'] is not None:
+                # --- Write this job's results, only now that the whole response has arrived ---
+                written = []
+                with metrics.job(test_id, pipeline):
+                    try:
+                        outputs = outcome['outputs']
+                        if outputs is None:
+                            with metrics.span('parse'):
+                                _, after_changes = extract_pipeline_data(outcome['suggestion'])
+                            outputs = build_outputs(task, after_changes)
+                        write_outputs(task, outcome['suggestion'], outputs, written)
+                    except Exception as e:
+                        discard_outputs(task, written)
+                        outcome['error'] = f"{type(e).__name__}: {e}"
+
+            if outcome['suggestion'] is None or outcome['error'] is not None:
+                print(f"[{len(results) + 1}/{len(tasks)}] {pipeline} {test_id}: failed ({outcome['error']})")
+                results.append({**result, 'status': 'failed'})
+                if checkpoint is not None:
+                    checkpoint.record(task, 'failed', latency_s=latency, error=outcome['error'])
+                metrics.finish_job(test_id, pipeline, 'failed', latency_s=latency, error=outcome['error'])
+                continue
+
+            fanned_out = f" (applied to {result['members']} more jobs)" if result['members'] else ""
+            print(f"[{len(results) + 1}/{len(tasks)}] {pipeline} {test_id}: done in {latency:.2f}s{fanned_out}")
+            results.append({**result, 'predicted_speedup': outputs[test_id]['speedup'], 'status': 'done'})
+            done = {'latency_s': latency, 'ttft_s': outcome['ttft_s'], 'after_block_s': outcome['after_block_s']}
+            if store is not None:
+                committing.append((task, done))
+                with metrics.job(test_id, pipeline), metrics.span('save'):
+                    record_committed(store.maybe_flush())
+            elif checkpoint is not None:
+                checkpoint.record(task, 'done', **done)
+            metrics.finish_job(test_id, pipeline, 'done', latency_s=latency, ttft_s=outcome['ttft_s'],
+                               members=result['members'], predicted_speedup=results[-1]['predicted_speedup'])
+
+    if store is not None:
+        store.flush()
+        record_committed(True)
+
+    covered = sum(1 + r['members'] for r in results if r['status'] == 'done')
+    summary = summarize_run(latencies, time.perf_counter() - start, ttfts, jobs=covered)
+    failed = sum(1 for r in results if r['status'] == 'failed')
+    print(f"\nBatch finished: {summary['calls'] - failed} succeeded, {failed} failed "
+          f"in {summary['elapsed_s']:.2f}s")
+    print(f"Throughput: {summary['calls_per_s']:.2f} calls/s, {summary['jobs_per_s']:.2f} jobs/s | "
+          f"LLM latency p50: {summary['p50_s']:.2f}s, p95: {summary['p95_s']:.2f}s")
+    if covered > len(results) - failed:
+        print(f"Suggestions from {len(results) - failed} LLM calls were applied to {covered} jobs.")
+    predicted = [r['predicted_speedup'] for r in results if r.get('predicted_speedup') is not None]
+    if predicted:
+        below = sum(1 for x in predicted if min_speedup is not None and x < min_speedup)
+        print(f"Predicted speedup median: {np.median(predicted):.2f}x"
+              + (f" | {below} suggestion(s) below {min_speedup}x were not written" if min_speedup is not None else ""))
+    if ttfts:
+        print(f"Time to first token p50: {summary['ttft_p50_s']:.2f}s, p95: {summary['ttft_p95_s']:.2f}s")
+    return results
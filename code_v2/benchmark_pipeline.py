@@ -0,0 +1,157 @@
+# benchmark_pipeline.py
+"""
+End-to-end load benchmark: runs the full main.py pipeline in fleet mode
+against a local mock_llm_server.MockLLMServer and reports throughput, LLM
+latency percentiles and the time spent outside LLM calls (startup, data
+loading, prompt building, output writing).
+
+Outputs and the response cache go to a temporary directory, so the real
+output/ folder and cache are not touched.
+
+Usage:
+    python benchmark_pipeline.py darshan_shap --top 50 --concurrency 16 --latency-mean-s 1.5
+    python benchmark_pipeline.py all --top 20 --stream --rate-limit-rate 0.05 --json bench.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import yaml
+
+from mock_llm_server import add_server_arguments, server_from_args
+from llm_api import API_URL_ENV_VAR
+
+
+def busy_time(intervals: list) -> float:
+    """
+    Total length of the union of (start, end) intervals, i.e. the time during
+    which at least one LLM request was in flight.
+    """
+    total = 0.0
+    current_start = current_end = None
+    for start, end in sorted(intervals):
+        if current_end is None or start > current_end:
+            if current_end is not None:
+                total += current_end - current_start
+            current_start, current_end = start, end
+        else:
+            current_end = max(current_end, end)
+    if current_end is not None:
+        total += current_end - current_start
+    return total
+
+
+def write_benchmark_config(base_config_path: Path, work_dir: Path, stream: bool) -> Path:
+    """
+    Writes a copy of config.yaml that keeps the response cache in work_dir and
+    sets the streaming mode.
+    """
+    with open(base_config_path, 'r') as f:
+        config = yaml.safe_load(f)
+    llm_config = config.setdefault('llm', {})
+    llm_config.setdefault('cache', {})['path'] = str(work_dir / 'llm_cache.sqlite')
+    llm_config.setdefault('stream', {})['enabled'] = stream
+    config_path = work_dir / 'config.yaml'
+    with open(config_path, 'w') as f:
+        yaml.safe_dump(config, f, sort_keys=False)
+    return config_path
+
+
+def run_benchmark(args) -> dict:
+    base_dir = Path(__file__).resolve().parent
+    server = server_from_args(args).start()
+    try:
+        with tempfile.TemporaryDirectory(prefix='agent_io_bench_') as tmp:
+            work_dir = Path(tmp)
+            config_path = write_benchmark_config(base_dir / 'config.yaml', work_dir, args.stream)
+            command = [sys.executable, str(base_dir / 'main.py'), args.pipeline,
+                       '--config', str(config_path), '--output-dir', str(work_dir / 'output'), '--no-cache']
+            command += ['--all'] if args.all else ['--top', str(args.top)]
+            if args.concurrency:
+                command += ['--concurrency', str(args.concurrency)]
+            env = {**os.environ, API_URL_ENV_VAR: server.url}
+
+            print(f"Mock server: {server.url}")
+            print(f"Running: {' '.join(command[1:])}")
+            start = time.perf_counter()
+            completed = subprocess.run(command, cwd=base_dir, env=env, capture_output=True, text=True)
+            wall_s = time.perf_counter() - start
+            if completed.returncode != 0:
+                print(completed.stdout[-2000:])
+                print(completed.stderr[-2000:])
+                raise RuntimeError(f"main.py exited with status {completed.returncode}")
+            if args.verbose:
+                print(completed.stdout)
+
+            suggestions = len(list((work_dir / 'output').glob('suggestion_*.txt')))
+            modified_csvs = len(list((work_dir / 'output').glob('ior_configurations_modified_*.csv')))
+    finally:
+        server.shutdown()
+
+    intervals = server.intervals
+    latencies = [end - begin for begin, end in intervals]
+    llm_busy_s = busy_time(intervals)
+    stats = server.stats()
+    results = {
+        'pipeline': args.pipeline,
+        'jobs': suggestions,
+        'modified_csvs': modified_csvs,
+        'wall_s': wall_s,
+        'jobs_per_s': suggestions / wall_s if wall_s > 0 else 0.0,
+        'requests': stats['requests'],
+        'rate_limited': stats['rate_limited'],
+        'errors': stats['errors'],
+        'llm_busy_s': llm_busy_s,
+        'non_llm_s': wall_s - llm_busy_s,
+        'non_llm_per_job_ms': (wall_s - llm_busy_s) / suggestions * 1000 if suggestions else float('nan'),
+        'startup_s': (min(b for b, _ in intervals) - start) if intervals else float('nan'),
+    }
+    for name, value in zip(['latency_p50_s', 'latency_p95_s', 'latency_p99_s'],
+                           np.percentile(latencies, [50, 95, 99]) if latencies else [float('nan')] * 3):
+        results[name] = float(value)
+    return results
+
+
+def print_report(results: dict):
+    print("\n--- Benchmark Results ---")
+    print(f"Jobs completed:      {results['jobs']} ({results['modified_csvs']} modified configuration CSVs)")
+    print(f"Wall time:           {results['wall_s']:.2f}s")
+    print(f"Throughput:          {results['jobs_per_s']:.2f} jobs/s")
+    print(f"Requests served:     {results['requests']} "
+          f"({results['rate_limited']} rate-limited, {results['errors']} errors injected)")
+    print(f"LLM latency:         p50 {results['latency_p50_s']:.3f}s, p95 {results['latency_p95_s']:.3f}s, "
+          f"p99 {results['latency_p99_s']:.3f}s")
+    print(f"LLM busy time:       {results['llm_busy_s']:.2f}s")
+    print(f"Non-LLM overhead:    {results['non_llm_s']:.2f}s "
+          f"({results['non_llm_per_job_ms']:.1f} ms/job, {results['startup_s']:.2f}s before the first request)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end benchmark of main.py against a local mock LLM server")
+    parser.add_argument('pipeline', help="Pipeline to run (as accepted by main.py, including 'all').")
+    scope = parser.add_mutually_exclusive_group()
+    scope.add_argument('--top', type=int, default=20, metavar='N', help="Analyze the N worst-performing jobs.")
+    scope.add_argument('--all', action='store_true', help="Analyze every job.")
+    parser.add_argument('--concurrency', type=int, help="Maximum concurrent LLM calls.")
+    parser.add_argument('--stream', action='store_true', help="Use the streaming (SSE) endpoint.")
+    parser.add_argument('--json', type=Path, help="Also write the results to this JSON file.")
+    parser.add_argument('--verbose', action='store_true', help="Print main.py's output.")
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    results = run_benchmark(args)
+    print_report(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults saved to: {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,394 @@
+# benchmark_suite.py
+"""
+Benchmarks of the data and parsing hot paths on synthetic data sets at
+several multiples of the data_v2 size (see synthetic_data.py).
+
+Each scale runs in its own process, so its peak RSS is not inflated by the
+previous scale's tables. The cases, in order:
+
+    cache_build                   first open of the CSVs: builds the columnar cache (rows/s)
+    load_all_data                 the single-job load of the worst job (calls/s)
+    load_job_store                all four tables joined into a JobStore (jobs/s)
+    job_lookup                    JobStore.get plus the job's raw/SHAP/config rows (lookups/s)
+    diagnosis_top_k               DiagnosisEngine's top-k pass over every job (jobs/s)
+    create_prompt                 agent.create_prompt for a sample of jobs (prompts/s)
+    extract_pipeline_data         parsing of the (mock) LLM responses to those prompts (responses/s)
+    apply_llm_suggestions_to_csv  modified configuration CSVs for the sample (files/s)
+
+Every case is timed over a few rounds (throughput from the median round)
+and reports its own peak RSS. The results of a run are appended to a
+history file (in the user's cache directory by default, like the synthetic
+data) and compared with the previous run: a case whose throughput dropped,
+or whose peak RSS grew, by more than benchmark.regression_threshold is
+reported as a regression.
+
+Usage:
+    python benchmark_suite.py                                # benchmark.scales in config.yaml
+    python benchmark_suite.py --scales 1 10 100 1000 --json bench.json
+    python benchmark_suite.py --scales 1 10 --fail-on-regression
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+import yaml
+
+import metrics
+from synthetic_data import cache_dir, default_output_dir, generate, is_generated
+
+CASES = ['cache_build', 'load_all_data', 'load_job_store', 'job_lookup', 'diagnosis_top_k',
+         'create_prompt', 'extract_pipeline_data', 'apply_llm_suggestions_to_csv']
+
+
+def _reset_peak_rss() -> bool:
+    """
+    Resets the kernel's peak RSS (VmHWM) of this process, so the next reading
+    covers only what follows. Linux only; returns False where unsupported.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_bytes() -> int:
+    """
+    The peak RSS since the last reset, or of the whole process where it cannot be reset.
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return metrics.peak_rss_bytes()
+
+
+def measure(case: str, fn, ops: int, unit: str, rounds: int) -> dict:
+    """
+    Times rounds calls of fn, each doing ops operations.
+
+    Returns:
+        dict: The case's result: round times, throughput of the median round and peak RSS.
+    """
+    scoped = _reset_peak_rss()
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    median = statistics.median(times)
+    return {
+        'case': case, 'status': 'ok', 'ops': ops, 'unit': unit, 'rounds': rounds,
+        'min_s': min(times), 'median_s': median, 'max_s': max(times),
+        'ops_per_s': ops / median if median > 0 else float('inf'),
+        'peak_rss_bytes': _peak_rss_bytes(), 'peak_rss_scope': 'case' if scoped else 'process',
+    }
+
+
+def run_cases(data_dir: Path, results_file: Path, rounds: int, sample_jobs: int, pipeline: str, seed: int = 0):
+    """
+    Runs every case on one data set and appends each result to results_file
+    as soon as it is known, so the results survive if the process is killed
+    (e.g. out of memory) in a later case.
+    """
+    # Imported here so the parent process stays small
+    from agent import FEATURE_GLOSSARY, PIPELINE_EVIDENCE, create_prompt, format_config_string
+    from data_loader import CACHE_DIRNAME, TABLE_FILES, load_all_data, load_job_store, open_cached_tables
+    from diagnosis import DiagnosisEngine
+    from mock_llm_server import build_canned_response
+    from utils import apply_llm_suggestions_to_csv, discover_parameter_options, extract_pipeline_data
+
+    state = {}
+
+    def case_cache_build():
+        rows = 0
+        for file_name, _ in TABLE_FILES:
+            with open(data_dir / file_name, 'rb') as f:
+                rows += sum(1 for _ in f) - 1
+
+        def build():
+            shutil.rmtree(data_dir / CACHE_DIRNAME, ignore_errors=True)
+            open_cached_tables(data_dir)
+        # A cold build is a one-off, so it is timed once
+        return measure('cache_build', build, rows, 'rows', 1)
+
+    def case_load_all_data():
+        return measure('load_all_data', lambda: load_all_data(data_dir), 1, 'calls', rounds)
+
+    def case_load_job_store():
+        def load():
+            state['store'] = load_job_store(data_dir, compact=True)
+        result = measure('load_job_store', load, 0, 'jobs', rounds)
+        store = state['store']
+        result['ops'] = len(store)
+        result['ops_per_s'] = len(store) / result['median_s']
+        rng = np.random.default_rng(seed)
+        sample = rng.choice(len(store), size=min(sample_jobs, len(store)), replace=False)
+        state['jobs'] = [store.get(store.test_ids[i]) for i in sample]
+        return result
+
+    def case_job_lookup():
+        store = state['store']
+        rng = np.random.default_rng(seed + 1)
+        test_ids = [store.test_ids[i] for i in rng.integers(0, len(store), size=10 * sample_jobs)]
+
+        def lookup():
+            for test_id in test_ids:
+                job = store.get(test_id)
+                job.raw, job.shap, job.config
+        return measure('job_lookup', lookup, len(test_ids), 'lookups', rounds)
+
+    def case_diagnosis_top_k():
+        def diagnose():
+            state['diagnoses'] = DiagnosisEngine(state['store'])
+        return measure('diagnosis_top_k', diagnose, len(state['store']), 'jobs', rounds)
+
+    def case_create_prompt():
+        diagnoses, jobs = state['diagnoses'], state['jobs']
+        options = discover_parameter_options(state['store'].ior_config_df)
+        inputs = [(diagnoses.summary(pipeline, job.position), format_config_string(job.config)) for job in jobs]
+        prompts = []
+
+        def build():
+            prompts[:] = [create_prompt(summary, config_string, options=options, glossary=FEATURE_GLOSSARY,
+                                        **PIPELINE_EVIDENCE[pipeline])
+                          for summary, config_string in inputs]
+        result = measure('create_prompt', build, len(inputs), 'prompts', rounds)
+        state['responses'] = [build_canned_response(prompt) for prompt in prompts]
+        return result
+
+    def case_extract_pipeline_data():
+        responses = state['responses']
+        parsed = []
+
+        def parse():
+            parsed[:] = [extract_pipeline_data(response)[1] for response in responses]
+        result = measure('extract_pipeline_data', parse, len(responses), 'responses', rounds)
+        state['changes'] = parsed
+        return result
+
+    def case_apply_llm_suggestions_to_csv():
+        store = state['store']
+        data_path = data_dir / TABLE_FILES[-1][0]
+        targets = list(zip(state['jobs'], state['changes']))
+        with tempfile.TemporaryDirectory(prefix='agent_io_bench_') as tmp:
+            def apply():
+                for job, changes in targets:
+                    apply_llm_suggestions_to_csv(
+                        data_path, changes, job.test_id,
+                        Path(tmp) / f"ior_configurations_modified_{pipeline}_{job.test_id}.csv",
+                        config_df=store.ior_config_df, config_positions=store.ior_config_positions)
+            return measure('apply_llm_suggestions_to_csv', apply, len(targets), 'files', rounds)
+
+    cases = [case_cache_build, case_load_all_data, case_load_job_store, case_job_lookup, case_diagnosis_top_k,
+             case_create_prompt, case_extract_pipeline_data, case_apply_llm_suggestions_to_csv]
+    failed = None
+    with open(results_file, 'a') as out, open(os.devnull, 'w') as devnull:
+        for case, fn in zip(CASES, cases):
+            if failed is not None and case not in ('cache_build', 'load_all_data'):
+                result = {'case': case, 'status': 'skipped', 'error': f"needs {failed}"}
+            else:
+                try:
+                    # The loaders and writers report progress on stdout
+                    with contextlib.redirect_stdout(devnull):
+                        result = fn()
+                except Exception as e:
+                    result = {'case': case, 'status': 'failed', 'error': f"{type(e).__name__}: {e}"}
+                    if case not in ('cache_build', 'load_all_data'):
+                        failed = failed or case
+            out.write(json.dumps(result) + '\n')
+            out.flush()
+
+
+def run_scale(scale: int, data_dir: Path, rounds: int, sample_jobs: int, pipeline: str, seed: int = 0) -> list:
+    """
+    Runs the cases on one data set in a subprocess and collects their results.
+    Cases the subprocess did not get to (e.g. after it was killed) are reported as failed.
+    """
+    with tempfile.TemporaryDirectory(prefix='agent_io_bench_') as tmp:
+        results_file = Path(tmp) / 'results.jsonl'
+        command = [sys.executable, str(Path(__file__).resolve()), '--worker', str(data_dir),
+                   '--results-file', str(results_file), '--rounds', str(rounds),
+                   '--sample-jobs', str(sample_jobs), '--pipeline', pipeline, '--seed', str(seed)]
+        completed = subprocess.run(command)
+        results = []
+        if results_file.exists():
+            with open(results_file) as f:
+                results = [json.loads(line) for line in f if line.strip()]
+    done = {r['case'] for r in results}
+    for case in CASES:
+        if case not in done:
+            results.append({'case': case, 'status': 'failed',
+                            'error': f"benchmark process exited with code {completed.returncode}"})
+    return [{'scale': scale, **r} for r in results]
+
+
+def git_commit(base_dir: Path):
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=base_dir, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def read_last_run(history_file: Path):
+    """
+    The last run recorded in the history file, or None.
+    """
+    if not history_file.exists():
+        return None
+    last = None
+    with open(history_file) as f:
+        for line in f:
+            try:
+                last = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+    return last
+
+
+def compare_runs(run: dict, previous: dict, threshold: float) -> list:
+    """
+    The (case, scale) results of run that are slower, or use more memory,
+    than in previous by more than threshold (a fraction).
+
+    Returns:
+        list: One dict per regression with 'case', 'scale', 'metric', 'previous' and 'current'.
+    """
+    before = {(r['case'], r['scale']): r for r in previous.get('results', []) if r.get('status') == 'ok'}
+    regressions = []
+    for result in run['results']:
+        old = before.get((result['case'], result['scale']))
+        if old is None or result.get('status') != 'ok':
+            continue
+        if result['ops_per_s'] < old['ops_per_s'] * (1 - threshold):
+            regressions.append({'case': result['case'], 'scale': result['scale'], 'metric': 'ops_per_s',
+                                'previous': old['ops_per_s'], 'current': result['ops_per_s']})
+        if (result.get('peak_rss_bytes') and old.get('peak_rss_bytes')
+                and result['peak_rss_bytes'] > old['peak_rss_bytes'] * (1 + threshold)):
+            regressions.append({'case': result['case'], 'scale': result['scale'], 'metric': 'peak_rss_bytes',
+                                'previous': old['peak_rss_bytes'], 'current': result['peak_rss_bytes']})
+    return regressions
+
+
+def print_report(run: dict, previous: dict = None, regressions: list = None):
+    scales = run['scales']
+    by_key = {(r['case'], r['scale']): r for r in run['results']}
+    before = {(r['case'], r['scale']): r for r in (previous or {}).get('results', []) if r.get('status') == 'ok'}
+
+    print(f"\n=== Hot-path benchmark ({run['git_commit'] or 'unknown commit'}, {run['rounds']} rounds) ===")
+    print(f"{'case':<30}{'scale':>7}{'ops':>10}{'throughput':>25}{'per op':>12}{'vs 1x':>8}{'peak RSS':>11}{'vs prev':>9}")
+    for case in CASES:
+        base = by_key.get((case, scales[0]))
+        for scale in scales:
+            result = by_key.get((case, scale))
+            if result is None:
+                continue
+            if result['status'] != 'ok':
+                print(f"{case:<30}{scale:>6}x  {result['status']}: {result['error']}")
+                continue
+            per_op = result['median_s'] / result['ops'] if result['ops'] else result['median_s']
+            scaling = ''
+            if base is not None and base.get('status') == 'ok' and base['ops'] and result['ops']:
+                scaling = f"{per_op / (base['median_s'] / base['ops']):.2f}"
+            old = before.get((case, scale))
+            change = f"{result['ops_per_s'] / old['ops_per_s'] - 1:+.0%}" if old else ''
+            rss = f"{result['peak_rss_bytes'] / 2**20:.0f} MiB" if result.get('peak_rss_bytes') else 'n/a'
+            print(f"{case:<30}{scale:>6}x{result['ops']:>10}{result['ops_per_s']:>12.1f} {result['unit'] + '/s':<12}"
+                  f"{per_op * 1e3:>10.3f}ms{scaling:>8}{rss:>11}{change:>9}")
+    print("(per op: median round / ops; vs 1x: per-op time relative to the smallest scale; "
+          "vs prev: throughput change since the previous run)")
+    if previous is not None:
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) since run {previous['run_id']} ({previous.get('git_commit')}):")
+            for r in regressions:
+                print(f"  {r['case']} at {r['scale']}x: {r['metric']} {r['previous']:.4g} -> {r['current']:.4g}")
+        else:
+            print(f"\nNo regressions since run {previous['run_id']} ({previous.get('git_commit')}).")
+
+
+def main():
+    base_dir = Path(__file__).resolve().parent
+    parser = argparse.ArgumentParser(description="Benchmark the data and parsing hot paths on synthetic data")
+    parser.add_argument('--scales', type=int, nargs='+',
+                        help="Data set sizes as multiples of data_v2 (default: benchmark.scales in config.yaml).")
+    parser.add_argument('--config', type=Path, default=base_dir / 'config.yaml',
+                        help="Path to the configuration file (default: config.yaml next to this script).")
+    parser.add_argument('--data-dir', type=Path, default=base_dir / 'data_v2',
+                        help="The real data directory the synthetic data sets are generated from.")
+    parser.add_argument('--history', type=Path,
+                        help="JSONL file of earlier runs (default: benchmark.history in config.yaml).")
+    parser.add_argument('--json', type=Path, help="Also write this run's results to this JSON file.")
+    parser.add_argument('--fail-on-regression', action='store_true',
+                        help="Exit with status 1 if a case regressed since the previous run.")
+    # Internal: run the cases on one data set (see run_scale)
+    parser.add_argument('--worker', type=Path, help=argparse.SUPPRESS)
+    parser.add_argument('--results-file', type=Path, help=argparse.SUPPRESS)
+    parser.add_argument('--rounds', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--sample-jobs', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--pipeline', help=argparse.SUPPRESS)
+    parser.add_argument('--seed', type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        run_cases(args.worker, args.results_file, args.rounds, args.sample_jobs, args.pipeline, seed=args.seed)
+        return
+
+    with open(args.config, 'r') as f:
+        config = yaml.safe_load(f)
+    bench_config = config.get('benchmark', {})
+    scales = sorted(args.scales or bench_config.get('scales') or [1, 10, 100])
+    rounds = bench_config.get('rounds') or 3
+    sample_jobs = bench_config.get('sample_jobs') or 1000
+    pipeline = bench_config.get('pipeline') or 'darshan_shap'
+    seed = bench_config.get('seed') or 0
+    # A relative benchmark.history is taken from the cache directory
+    history_file = args.history or cache_dir() / Path(bench_config.get('history') or 'benchmark_history.jsonl').expanduser()
+
+    run = {'run_id': uuid.uuid4().hex[:12], 'time': time.time(), 'git_commit': git_commit(base_dir),
+           'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count(),
+           'scales': scales, 'rounds': rounds, 'sample_jobs': sample_jobs, 'pipeline': pipeline, 'results': []}
+    for scale in scales:
+        data_dir = default_output_dir(args.data_dir, scale)
+        if not is_generated(data_dir, scale, seed):
+            print(f"Generating the {scale}x synthetic data set in '{data_dir}'...")
+            if generate(args.data_dir, data_dir, scale, seed=seed) is None:
+                print("Halting the benchmark due to data generation failure.")
+                return
+        print(f"Benchmarking {scale}x ({data_dir})...")
+        run['results'].extend(run_scale(scale, data_dir, rounds, sample_jobs, pipeline, seed))
+
+    previous = read_last_run(history_file)
+    regressions = compare_runs(run, previous, bench_config.get('regression_threshold', 0.25)) if previous else []
+    run['regressions'] = regressions
+    print_report(run, previous, regressions)
+
+    history_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(history_file, 'a') as f:
+        f.write(json.dumps(run) + '\n')
+    print(f"\nResults appended to: {history_file}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(run, f, indent=2)
+        print(f"Results saved to: {args.json}")
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
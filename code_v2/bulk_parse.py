@@ -0,0 +1,165 @@
+# bulk_parse.py
+"""
+Bulk re-parsing of archived suggestion_*.txt outputs into one table.
+
+Every file under the given directories is split at its LLM SUGGESTION
+marker, and the response's Before and After blocks are parsed with the
+single-pass extraction in utils (so the prompt's example block is never
+mistaken for a suggestion). The files are parsed in chunks across a process
+pool, and the result is one row per suggested parameter:
+
+    test_id, pipeline, parameter, before, after, impact, risk
+
+'before' is the value in the response's Before block (empty if it lists
+none), and impact and risk are empty for suggestions without scores.
+
+Usage:
+    python bulk_parse.py                                  # output/ -> output/parsed_suggestions.csv
+    python bulk_parse.py /archive/run1 /archive/run2 --output archive.csv --workers 8
+"""
+import argparse
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+import yaml
+
+from utils import extract_pipeline_data, suggestion_response
+
+COLUMNS = ['test_id', 'pipeline', 'parameter', 'before', 'after', 'impact', 'risk']
+
+# The first two lines of a suggestion file (utils.format_suggestion)
+HEADER_PATTERN = re.compile(r'--- Analysis for test_id: (.*?) ---\n--- Pipeline: (.*?) ---\n')
+
+
+def parse_suggestion_text(text: str, fallback_name: str = '') -> list:
+    """
+    Parses the text of one suggestion file.
+
+    Args:
+        text (str): The file's content.
+        fallback_name (str): The file name, for the test_id and pipeline when the header is missing.
+
+    Returns:
+        list: One (test_id, pipeline, parameter, before, after, impact, risk) tuple per suggested parameter.
+    """
+    header = HEADER_PATTERN.match(text)
+    if header:
+        test_id, pipeline = header.groups()
+    else:
+        # suggestion_<pipeline>_<test_id>.txt; pipeline names may contain underscores, test_ids do not
+        pipeline, _, test_id = fallback_name.removeprefix('suggestion_').removesuffix('.txt').rpartition('_')
+
+    before_config, after_changes = extract_pipeline_data(suggestion_response(text))
+
+    rows = []
+    for param, details in after_changes.items():
+        # Skip generic placeholder parameters like 'parameter1', 'parameter2'
+        if param.startswith('parameter'):
+            continue
+        rows.append((test_id, pipeline, param, before_config.get(param), details['value'],
+                     details['impact'] if details['impact'] != 'N/A' else None,
+                     details['risk'] if details['risk'] != 'N/A' else None))
+    return rows
+
+
+def parse_files(paths: list) -> tuple:
+    """
+    Parses a chunk of suggestion files (one process-pool task).
+
+    Returns:
+        tuple: (rows, number of files that could not be read).
+    """
+    rows = []
+    unreadable = 0
+    for path in paths:
+        try:
+            text = Path(path).read_text()
+        except (OSError, UnicodeDecodeError) as e:
+            print(f"Warning: Skipping '{path}': {e}")
+            unreadable += 1
+            continue
+        rows.extend(parse_suggestion_text(text, Path(path).name))
+    return rows, unreadable
+
+
+def find_suggestion_files(paths: list, pattern: str = 'suggestion_*.txt') -> list:
+    """
+    The files given, plus the files matching pattern under the directories given.
+    """
+    files = []
+    for path in paths:
+        if path.is_dir():
+            files.extend(sorted(str(p) for p in path.rglob(pattern) if p.is_file()))
+        else:
+            files.append(str(path))
+    return files
+
+
+def bulk_parse(files: list, workers: int = None, chunk_files: int = 500) -> pd.DataFrame:
+    """
+    Parses many suggestion files into one table, in chunks across a process pool.
+
+    Args:
+        files (list): Paths of the suggestion files.
+        workers (int): Processes parsing files (default: CPU count).
+        chunk_files (int): Files per pool task; larger chunks cut the inter-process overhead.
+
+    Returns:
+        pd.DataFrame: The COLUMNS table, in file order.
+    """
+    workers = workers or os.cpu_count() or 1
+    chunks = [files[i:i + chunk_files] for i in range(0, len(files), chunk_files)]
+    if workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(parse_files, chunks))
+    else:
+        results = [parse_files(chunk) for chunk in chunks]
+
+    rows = [row for chunk_rows, _ in results for row in chunk_rows]
+    unreadable = sum(count for _, count in results)
+    if unreadable:
+        print(f"Warning: {unreadable} file(s) could not be read.")
+    df = pd.DataFrame(rows, columns=COLUMNS)
+    for column in ('test_id', 'pipeline', 'parameter'):
+        df[column] = df[column].astype('category')
+    for column in ('impact', 'risk'):
+        df[column] = df[column].astype('Int8')
+    return df
+
+
+def main():
+    base_dir = Path(__file__).resolve().parent
+    parser = argparse.ArgumentParser(description="Parse archived suggestion files into one table")
+    parser.add_argument('paths', nargs='*', type=Path, default=[base_dir / 'output'],
+                        help="Suggestion files, or directories to search for them (default: output/ next to this script).")
+    parser.add_argument('--config', type=Path, default=base_dir / 'config.yaml',
+                        help="Path to the configuration file (default: config.yaml next to this script).")
+    parser.add_argument('--output', type=Path, default=base_dir / 'output' / 'parsed_suggestions.csv',
+                        help="CSV file the table is written to (default: output/parsed_suggestions.csv).")
+    parser.add_argument('--workers', type=int, help="Processes parsing files (default: bulk_parse.workers in config.yaml).")
+    args = parser.parse_args()
+    with open(args.config, 'r') as f:
+        config = yaml.safe_load(f)
+    bulk_config = config.get('bulk_parse', {})
+
+    start = time.perf_counter()
+    files = find_suggestion_files(args.paths, bulk_config.get('pattern') or 'suggestion_*.txt')
+    if not files:
+        print(f"Error: No suggestion files found in: {', '.join(map(str, args.paths))}")
+        return
+    print(f"Parsing {len(files)} suggestion file(s)...")
+    df = bulk_parse(files, workers=args.workers or bulk_config.get('workers'),
+                    chunk_files=bulk_config.get('chunk_files') or 500)
+    elapsed = time.perf_counter() - start
+    df.to_csv(args.output, index=False)
+    print(f"Parsed {len(files)} file(s) into {len(df)} suggested changes in {elapsed:.2f}s "
+          f"({len(files) / elapsed:.0f} files/s).")
+    print(f"Table saved to: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+# checkpoint.py
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from schema import SIZE_PARAMETERS, SIZE_TABLE_KEY, parse_sizes
+
+# Compact the manifest on open once it has this many more lines than (test_id, pipeline) entries
+COMPACT_SLACK_LINES = 1000
+
+
+def canonical_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    The form of a job table that is hashed, the same whether the table was
+    loaded as written in the CSVs or in compact types (schema.compact_frame):
+    sizes of the IOR configuration table as int bytes, integers as int64,
+    floats rounded to float32 precision (the precision compaction may keep)
+    and everything else as text.
+    """
+    columns = {}
+    for name in df.columns:
+        column = df[name]
+        if name in SIZE_PARAMETERS and SIZE_TABLE_KEY in df.columns and not pd.api.types.is_numeric_dtype(column):
+            sizes = parse_sizes(column)
+            column = sizes if sizes is not None else column
+        if pd.api.types.is_integer_dtype(column):
+            column = column.astype(np.int64)
+        elif pd.api.types.is_float_dtype(column):
+            column = column.astype(np.float32).astype(np.float64)
+        else:
+            column = column.astype(str)
+        columns[name] = column
+    return pd.DataFrame(columns, index=df.index)
+
+
+def row_hashes(df: pd.DataFrame) -> np.ndarray:
+    """
+    A 64-bit hash of every row's values (and the column names) in canonical
+    form, computed in one vectorized pass.
+    """
+    salt = int(hashlib.sha256('\x1f'.join(map(str, df.columns)).encode('utf-8')).hexdigest()[:16], 16)
+    return pd.util.hash_pandas_object(canonical_frame(df), index=False).to_numpy() ^ np.uint64(salt)
+
+
+def job_fingerprints(raw_df: pd.DataFrame, shap_df: pd.DataFrame, config_df: pd.DataFrame) -> list:
+    """
+    One fingerprint per job of the raw Darshan, SHAP and configuration rows,
+    for tables laid out in the same job order (as in a JobStore).
+    """
+    return [f"{r:016x}{s:016x}{c:016x}"
+            for r, s, c in zip(row_hashes(raw_df), row_hashes(shap_df), row_hashes(config_df))]
+
+
+def input_hash(pipeline: str, entries: list) -> str:
+    """
+    Hash of a task's inputs: the pipeline and the (test_id, fingerprint) of every
+    job whose outputs the task writes (the representative and any cluster members).
+    """
+    digest = hashlib.sha256(pipeline.encode('utf-8'))
+    for test_id, value in sorted(entries):
+        digest.update(f"\x1e{test_id}:{value}".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def prompt_hash(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+
+
+class Checkpoint:
+    """
+    Append-only JSONL manifest of the jobs processed in fleet mode, kept in
+    the output directory.
+
+    Every task gets a 'started' record before its LLM call is dispatched and
+    a 'done' (or 'failed') record once its outputs are on disk, each flushed
+    and fsync'ed before the run moves on (write-ahead). A record holds the
+    test_id, pipeline, input and prompt hashes, status and timings; the last
+    record of a (test_id, pipeline) is its state. A task is skipped on the
+    next run only if it is 'done' with the same hashes and its suggestion
+    (file or results store entry) still exists, so after a kill the run
+    resumes with the jobs that were in flight or not yet started.
+
+    Args:
+        path (Path): The JSONL manifest file (created if missing).
+        store (results_store.ResultsStore): If given, a done task must have its
+                                            analysis in the store instead of a
+                                            suggestion file.
+    """
+
+    def __init__(self, path: Path, store=None):
+        self.path = path
+        self.store = store
+        self._lock = threading.Lock()
+        self._latest = {}
+        lines = self._load()
+        if lines > len(self._latest) + COMPACT_SLACK_LINES:
+            self._compact()
+        self._file = open(path, 'a', encoding='utf-8')
+        if self._file.tell() > 0 and not self._ends_with_newline():
+            # Terminate a torn last line so the next record starts on its own line
+            self._file.write('\n')
+
+    def _load(self) -> int:
+        """
+        Replays the manifest. A torn last line (from a kill mid-write) is ignored.
+        """
+        if not self.path.exists():
+            return 0
+        lines = 0
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                lines += 1
+                try:
+                    record = json.loads(line)
+                    self._latest[(record['test_id'], record['pipeline'])] = record
+                except (json.JSONDecodeError, KeyError, TypeError):
+                    continue
+        return lines
+
+    def _ends_with_newline(self) -> bool:
+        with open(self.path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b'\n'
+
+    def _compact(self):
+        tmp_path = self.path.with_name(f"{self.path.name}.tmp-{os.getpid()}")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for record in self._latest.values():
+                f.write(json.dumps(record) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def is_done(self, task: dict, output_dir: Path) -> bool:
+        """
+        True if the task's last record is 'done' with the task's current input
+        and prompt hashes, and its suggestion is still in the results store or
+        (without one) its suggestion file in output_dir.
+        """
+        record = self._latest.get((task['test_id'], task['pipeline']))
+        if (record is None or record['status'] != 'done'
+                or record.get('input_hash') != task['input_hash']
+                or record.get('prompt_hash') != prompt_hash(task['prompt'])):
+            return False
+        if self.store is not None:
+            return self.store.has_suggestion(task['test_id'], task['pipeline'])
+        return (output_dir / f"suggestion_{task['pipeline']}_{task['test_id']}.txt").exists()
+
+    def pending(self, tasks: list, output_dir: Path) -> list:
+        """
+        The tasks that are new, changed, failed or were interrupted.
+        """
+        return [task for task in tasks if not self.is_done(task, output_dir)]
+
+    def record(self, task: dict, status: str, **details):
+        """
+        Appends a record for a task and forces it to disk.
+
+        Args:
+            task (dict): The batch task ('test_id', 'pipeline', 'prompt', 'input_hash').
+            status (str): 'started', 'done' or 'failed'.
+            **details: Timings and other fields to store (e.g. latency_s, error).
+        """
+        self.record_many([task], status, **details)
+
+    def record_many(self, tasks: list, status: str, **details):
+        """
+        Appends one record per task with a single write and fsync.
+        """
+        self.record_each([(task, details) for task in tasks], status)
+
+    def record_each(self, entries: list, status: str):
+        """
+        Like record_many, with each task's own details: a list of (task, details dict).
+        """
+        records = [self._record(task, status, details) for task, details in entries]
+        with self._lock:
+            self._file.write(''.join(json.dumps(record) + '\n' for record in records))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            for record in records:
+                self._latest[(record['test_id'], record['pipeline'])] = record
+
+    @staticmethod
+    def _record(task: dict, status: str, details: dict) -> dict:
+        return {
+            'test_id': task['test_id'],
+            'pipeline': task['pipeline'],
+            'input_hash': task['input_hash'],
+            'prompt_hash': prompt_hash(task['prompt']),
+            'status': status,
+            'time': time.time(),
+            'members': [member['test_id'] for member in task.get('members', [])],
+            **details,
+        }
+
+    def close(self):
+        self._file.close()
@@ -0,0 +1,178 @@
+# clustering.py
+import hashlib
+import math
+
+import numpy as np
+import pandas as pd
+
+from agent import COLS_TO_IGNORE, PIPELINE_EVIDENCE, format_config_string
+from surrogate import ConfigEncoder
+
+CLUSTER_METHODS = ['signature', 'kmeans']
+
+# Rows per distance computation when assigning points to centers
+ASSIGN_CHUNK_ROWS = 65536
+
+
+def signature_clusters(jobs: list, diagnoses, pipeline: str, include_config: bool = False) -> list:
+    """
+    Groups jobs whose prompts would show the same performance diagnosis: the
+    signature is a hash of the top-k features (names and values) that the
+    pipeline puts in front of the LLM, plus the configuration if include_config.
+
+    The representative of each cluster is its worst-performing member.
+
+    Returns:
+        A list of clusters (dicts with 'representative' and 'members', the
+        representative included), largest first.
+    """
+    clusters = {}
+    for job in jobs:
+        signature = diagnoses.summary(pipeline, job.position)
+        if include_config:
+            signature += "\n" + format_config_string(job.config)
+        key = hashlib.sha256(signature.encode('utf-8')).hexdigest()
+        clusters.setdefault(key, []).append(job)
+
+    result = [{'representative': min(members, key=lambda j: j.position), 'members': members}
+              for members in clusters.values()]
+    return sorted(result, key=lambda c: -len(c['members']))
+
+
+def _nearest_centers(X: np.ndarray, centers: np.ndarray):
+    """
+    Index of and squared distance to the nearest center of every row of X.
+    """
+    labels = np.empty(len(X), dtype=np.int64)
+    distances = np.empty(len(X))
+    center_sq = (centers ** 2).sum(axis=1)
+    for start in range(0, len(X), ASSIGN_CHUNK_ROWS):
+        chunk = X[start:start + ASSIGN_CHUNK_ROWS]
+        sq = (chunk ** 2).sum(axis=1)[:, None] + center_sq[None, :] - 2 * chunk @ centers.T
+        labels[start:start + ASSIGN_CHUNK_ROWS] = sq.argmin(axis=1)
+        distances[start:start + ASSIGN_CHUNK_ROWS] = np.maximum(sq[np.arange(len(chunk)), labels[start:start + ASSIGN_CHUNK_ROWS]], 0)
+    return labels, distances
+
+
+def _kmeans_plus_plus(X: np.ndarray, n_clusters: int, rng) -> np.ndarray:
+    centers = [X[rng.integers(len(X))]]
+    closest = ((X - centers[0]) ** 2).sum(axis=1)
+    for _ in range(1, n_clusters):
+        total = closest.sum()
+        if total <= 0:
+            break
+        centers.append(X[rng.choice(len(X), p=closest / total)])
+        closest = np.minimum(closest, ((X - centers[-1]) ** 2).sum(axis=1))
+    return np.array(centers)
+
+
+def minibatch_kmeans(X: np.ndarray, n_clusters: int, batch_size: int = 1024, max_iter: int = 100,
+                     tol: float = 1e-4, seed: int = 0):
+    """
+    MiniBatch k-means (Sculley, 2010): centers are moved towards the mean of
+    their points in small random batches, with per-center learning rates that
+    decay as 1/count. Initialized with k-means++ on a sample.
+
+    Returns:
+        A tuple (centers, labels). Centers that end up with no points are dropped.
+    """
+    rng = np.random.default_rng(seed)
+    n = len(X)
+    n_clusters = min(n_clusters, n)
+    sample = X[rng.choice(n, min(n, max(10 * n_clusters, batch_size)), replace=False)]
+    centers = _kmeans_plus_plus(sample, n_clusters, rng)
+    counts = np.zeros(len(centers))
+
+    for _ in range(max_iter):
+        batch = X[rng.choice(n, min(n, batch_size), replace=False)]
+        labels, _ = _nearest_centers(batch, centers)
+        batch_counts = np.bincount(labels, minlength=len(centers))
+        batch_sums = np.zeros_like(centers)
+        np.add.at(batch_sums, labels, batch)
+        hit = batch_counts > 0
+        counts[hit] += batch_counts[hit]
+        step = (batch_counts[hit] / counts[hit])[:, None]
+        previous = centers.copy()
+        centers[hit] += step * (batch_sums[hit] / batch_counts[hit][:, None] - centers[hit])
+        if ((centers - previous) ** 2).sum() <= tol * len(centers):
+            break
+
+    labels, _ = _nearest_centers(X, centers)
+    used = np.unique(labels)
+    remap = np.full(len(centers), -1)
+    remap[used] = np.arange(len(used))
+    return centers[used], remap[labels]
+
+
+def _standardized_block(values: np.ndarray) -> np.ndarray:
+    """
+    Scales columns to unit variance (dropping constant ones) and the whole
+    block to unit total variance, so blocks of different widths weigh the same.
+    """
+    std = values.std(axis=0)
+    keep = std > 0
+    if not keep.any():
+        return np.zeros((len(values), 0))
+    block = (values[:, keep] - values[:, keep].mean(axis=0)) / std[keep]
+    return block / math.sqrt(block.shape[1])
+
+
+def kmeans_features(store, positions: np.ndarray, pipeline: str, include_config: bool = True) -> np.ndarray:
+    """
+    Feature matrix for k-means: the evidence the pipeline uses (SHAP values,
+    log-scaled raw Darshan counters) and, if include_config, the encoded
+    IOR configuration, each as an equally weighted block.
+    """
+    evidence = PIPELINE_EVIDENCE[pipeline]
+    blocks = []
+    if evidence['has_shap']:
+        columns = [c for c in store.shap_df.columns
+                   if c not in COLS_TO_IGNORE and pd.api.types.is_numeric_dtype(store.shap_df[c])]
+        blocks.append(np.nan_to_num(store.shap_df[columns].to_numpy(dtype=np.float64)[positions]))
+    if evidence['has_darshan']:
+        columns = [c for c in store.raw_df.columns
+                   if c not in COLS_TO_IGNORE and pd.api.types.is_numeric_dtype(store.raw_df[c])]
+        raw = np.nan_to_num(store.raw_df[columns].to_numpy(dtype=np.float64)[positions])
+        blocks.append(np.log1p(np.maximum(raw, 0)))
+    if include_config:
+        blocks.append(ConfigEncoder(store.config_df).transform(store.config_df.iloc[positions]))
+    return np.hstack([_standardized_block(block) for block in blocks])
+
+
+def kmeans_clusters(jobs: list, store, pipeline: str, n_clusters: int = None,
+                    include_config: bool = True, seed: int = 0) -> list:
+    """
+    Groups jobs with MiniBatch k-means over kmeans_features(). The
+    representative of each cluster is the member closest to its center.
+    n_clusters defaults to a tenth of the jobs.
+
+    Returns:
+        A list of clusters as in signature_clusters(), largest first.
+    """
+    if not jobs:
+        return []
+    positions = np.array([job.position for job in jobs])
+    X = kmeans_features(store, positions, pipeline, include_config)
+    n_clusters = n_clusters or max(1, math.ceil(len(jobs) / 10))
+    centers, labels = minibatch_kmeans(X, n_clusters, seed=seed)
+    _, distances = _nearest_centers(X, centers)
+
+    result = []
+    for cluster in range(len(centers)):
+        members = np.flatnonzero(labels == cluster)
+        closest = members[np.argmin(distances[members])]
+        result.append({'representative': jobs[closest], 'members': [jobs[i] for i in members]})
+    return sorted(result, key=lambda c: -len(c['members']))
+
+
+def write_cluster_manifest(clusters: list, pipeline: str, output_dir, method: str):
+    """
+    Saves which representative's suggestion each job received to
+    output/clusters_<pipeline>.csv.
+    """
+    rows = [{'test_id': job.test_id, 'cluster': i, 'representative': cluster['representative'].test_id,
+             'cluster_size': len(cluster['members']), 'method': method}
+            for i, cluster in enumerate(clusters) for job in cluster['members']]
+    output_file = output_dir / f"clusters_{pipeline}.csv"
+    pd.DataFrame(rows).to_csv(output_file, index=False)
+    return output_file
@@ -0,0 +1,160 @@
+# config_index.py
+import numpy as np
+import pandas as pd
+
+from schema import parse_size
+from utils import PARAMETER_TYPES
+
+
+def canonical_value(param: str, value):
+    """
+    Normalizes one parameter value for exact matching: sizes ('4K', '1M', ...)
+    become bytes, integer parameters ints, and anything else a stripped string.
+    Values that cannot be converted are kept as stripped strings.
+    """
+    if PARAMETER_TYPES.get(param) is int:
+        try:
+            return int(float(value))
+        except (TypeError, ValueError):
+            return str(value).strip()
+    size = parse_size(value)
+    if size is not None and param != 'api':
+        return size
+    return str(value).strip()
+
+
+class ConfigIndex:
+    """
+    Index from the canonical 12-parameter configuration tuple to the runs
+    in ior_configurations(in).csv with that configuration and their measured
+    performance tags.
+
+    lookup() is a single dict access. Configurations that were never run (or
+    never profiled) fall back to nearest(): the profiled configuration that
+    differs in the fewest parameters.
+
+    Args:
+        ior_config_df (pd.DataFrame): The full configuration table.
+        tags (dict): test_id -> measured performance tag, for the profiled runs.
+    """
+
+    def __init__(self, ior_config_df: pd.DataFrame, tags: dict):
+        self.parameters = [p for p in PARAMETER_TYPES if p in ior_config_df.columns]
+        self.tags = tags
+        keys = self._keys(ior_config_df)
+        test_files = ior_config_df['testFile'].tolist()
+
+        self._index = {}
+        for key, test_file in zip(keys, test_files):
+            self._index.setdefault(key, []).append(test_file)
+
+        # Codes of the profiled configurations, for the nearest-neighbour fallback
+        measured_keys = [key for key, test_file in zip(keys, test_files) if test_file in tags]
+        self.measured_files = [test_file for test_file in test_files if test_file in tags]
+        self._codes = [{} for _ in self.parameters]
+        self._measured_codes = np.array([self._encode(key, grow=True) for key in measured_keys],
+                                        dtype=np.int32).reshape(-1, len(self.parameters))
+
+    @classmethod
+    def from_job_store(cls, store):
+        """
+        Builds the index from a JobStore's full configuration table and tags.
+        """
+        return cls(store.ior_config_df, dict(zip(store.test_ids, store.tags)))
+
+    def _keys(self, ior_config_df: pd.DataFrame) -> list:
+        columns = []
+        for param in self.parameters:
+            column = ior_config_df[param]
+            canonical = {value: canonical_value(param, value) for value in column.unique()}
+            columns.append(column.map(canonical).tolist())
+        return list(zip(*columns))
+
+    def _encode(self, key: tuple, grow: bool = False) -> list:
+        codes = []
+        for value, code_map in zip(key, self._codes):
+            if grow and value not in code_map:
+                code_map[value] = len(code_map)
+            codes.append(code_map.get(value, -1))
+        return codes
+
+    def key(self, config: dict) -> tuple:
+        """
+        The canonical tuple of a configuration (parameter: value).
+        """
+        return tuple(canonical_value(p, config.get(p)) for p in self.parameters)
+
+    def lookup(self, config: dict) -> list:
+        """
+        The testFiles of every run with exactly this configuration.
+        """
+        return self._index.get(self.key(config), [])
+
+    def measured_tag(self, config: dict):
+        """
+        The mean measured tag of the profiled runs with exactly this
+        configuration, or None if it was never profiled.
+        """
+        tags = [self.tags[t] for t in self.lookup(config) if t in self.tags]
+        return float(np.mean(tags)) if tags else None
+
+    def nearest(self, config: dict) -> dict:
+        """
+        The profiled configuration closest to config (fewest differing
+        parameters; the first such run on ties).
+
+        Returns:
+            dict: 'testFile', 'tag', 'exact' and 'differing' (the parameters
+            whose values differ), or None if no run was profiled.
+        """
+        test_files = [t for t in self.lookup(config) if t in self.tags]
+        if test_files:
+            return {'testFile': test_files[0], 'tag': self.measured_tag(config), 'exact': True, 'differing': []}
+        if not len(self._measured_codes):
+            return None
+        query = np.array(self._encode(self.key(config)), dtype=np.int32)
+        mismatches = self._measured_codes != query[None, :]
+        row = int(np.argmin(mismatches.sum(axis=1)))
+        test_file = self.measured_files[row]
+        return {'testFile': test_file, 'tag': float(self.tags[test_file]), 'exact': False,
+                'differing': [p for p, differs in zip(self.parameters, mismatches[row]) if differs]}
+
+    def check_suggestion(self, original_config: dict, suggested_changes: dict) -> dict:
+        """
+        Checks a suggestion (parsed After block) against the measured results.
+
+        Returns:
+            dict: 'original' and 'suggested' (nearest() results of the original
+            and the suggested configuration) and 'observed_speedup' (ratio of
+            their tags; higher is better), or None if nothing was profiled.
+        """
+        changes = {param: details['value'] for param, details in suggested_changes.items()
+                   if param in self.parameters}
+        original = self.nearest(original_config)
+        suggested = self.nearest({**original_config, **changes})
+        if original is None or suggested is None:
+            return None
+        return {'original': original, 'suggested': suggested,
+                'observed_speedup': suggested['tag'] / original['tag']}
+
+
+def describe_match(match: dict) -> str:
+    """
+    One-line description of a nearest() result, e.g. 'exact: test00012' or
+    'nearest: test00345 (differs in blockSize, numTasks)'.
+    """
+    if match['exact']:
+        return f"exact: {match['testFile']}"
+    return f"nearest: {match['testFile']} (differs in {', '.join(match['differing'])})"
+
+
+def observed_columns(check: dict, changed_params: list, pipeline_name: str) -> dict:
+    """
+    Formats check_suggestion() output as extra columns for utils.generate_suggestions_csv.
+    """
+    speedup = f"{check['observed_speedup']:.3f}"
+    match = describe_match(check['suggested'])
+    return {
+        f'{pipeline_name} Observed Speedup': {p: speedup for p in changed_params},
+        f'{pipeline_name} Observed Match': {p: match for p in changed_params},
+    }
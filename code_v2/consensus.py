@@ -0,0 +1,140 @@
+# consensus.py
+"""
+Merges the suggestions of several models (llm.mode: ensemble) into one.
+
+Each response's After block is parsed with utils.parse_after_block. A
+parameter is changed only if enough models change it (a strict majority by
+default), and it gets the value with the highest impact-weighted vote. The
+result is written back as a response in the usual **Before:**/**After:**
+format, so it flows through extract_pipeline_data and into a single
+suggestion column of comparison_suggestions_*.csv like any other response.
+"""
+from schema import SIZE_PARAMETERS, parse_size
+from utils import extract_pipeline_data
+
+# Vote weight of a suggestion without an impact score (the middle of the 1-10 scale)
+DEFAULT_IMPACT = 5
+
+
+def _vote_key(param: str, value) -> str:
+    """
+    Normalizes a suggested value so equal suggestions are counted together
+    ('4M', '4m' and '4194304' for a size, 'MPIIO' and 'mpiio' for the api).
+    """
+    text = str(value).strip().strip('\'"')
+    if param in SIZE_PARAMETERS:
+        size = parse_size(text)
+        if size is not None:
+            return str(size)
+    return text.upper()
+
+
+def _mean_score(scores: list):
+    scores = [s for s in scores if isinstance(s, int)]
+    return round(sum(scores) / len(scores)) if scores else 'N/A'
+
+
+def merge_after_blocks(changes_by_model: dict, min_votes: int = None, weights: dict = None) -> dict:
+    """
+    Merges per-model After blocks by vote.
+
+    Args:
+        changes_by_model (dict): {model: parse_after_block() result}, in model order.
+        min_votes (int): Models that must change a parameter for it to be changed.
+                         Defaults to a strict majority of the models given.
+        weights (dict): Optional vote weight per model (default 1).
+
+    Returns:
+        dict: The merged changes in parse_after_block format. Each entry also has
+        'votes' (models that chose the value), 'models' (models that changed the
+        parameter) and 'alternatives' ({value: votes} of the values not chosen).
+    """
+    weights = weights or {}
+    total = len(changes_by_model)
+    if min_votes is None:
+        min_votes = total // 2 + 1
+
+    merged = {}
+    params = []
+    for changes in changes_by_model.values():
+        params.extend(p for p in changes if p not in params and not p.startswith('parameter'))
+
+    for param in params:
+        candidates = {}
+        for model, changes in changes_by_model.items():
+            details = changes.get(param)
+            if details is None:
+                continue
+            impact = details['impact'] if isinstance(details['impact'], int) else DEFAULT_IMPACT
+            candidate = candidates.setdefault(_vote_key(param, details['value']),
+                                              {'value': details['value'], 'score': 0.0, 'voters': []})
+            candidate['score'] += weights.get(model, 1) * impact
+            candidate['voters'].append(details)
+        voters = sum(len(c['voters']) for c in candidates.values())
+        if voters < min_votes:
+            continue
+        # Highest weighted score wins; ties go to more votes, then to the value seen first
+        ranked = sorted(candidates.values(), key=lambda c: (-c['score'], -len(c['voters'])))
+        winner = ranked[0]
+        merged[param] = {
+            'value': winner['value'],
+            'impact': _mean_score([d['impact'] for d in winner['voters']]),
+            'risk': _mean_score([d['risk'] for d in winner['voters']]),
+            'votes': len(winner['voters']),
+            'models': voters,
+            'alternatives': {c['value']: len(c['voters']) for c in ranked[1:]},
+        }
+    return merged
+
+
+def _after_line(param: str, details: dict, total: int) -> str:
+    note = f"{details['votes']}/{total} models agree"
+    if details['alternatives']:
+        note += "; others suggested " + ", ".join(f"{value} ({votes})" for value, votes in details['alternatives'].items())
+    if details['impact'] == 'N/A' or details['risk'] == 'N/A':
+        return f"{param} = {details['value']}"
+    return f"{param} = {details['value']}  (Impact: {details['impact']}, Risk: {details['risk']} - {note})"
+
+
+def merge_responses(responses: dict, min_votes: int = None, weights: dict = None) -> str:
+    """
+    Builds the consolidated response of an ensemble call.
+
+    Args:
+        responses (dict): {model: response text}, in model order.
+        min_votes (int), weights (dict): See merge_after_blocks.
+
+    Returns:
+        str: A response with a per-model summary, followed by the merged
+        Before and After blocks (last, so extract_pipeline_data reads only those).
+    """
+    parsed = {model: extract_pipeline_data(content) for model, content in responses.items()}
+    merged = merge_after_blocks({model: after for model, (_, after) in parsed.items()}, min_votes, weights)
+    total = len(responses)
+
+    summary = []
+    for model, (_, after) in parsed.items():
+        changes = ", ".join(f"{p} -> {d['value']}" for p, d in after.items() if not p.startswith('parameter'))
+        summary.append(f"- {model}: {changes or 'no changes'}")
+
+    before = []
+    for param in merged:
+        original = next((b[param] for b, _ in parsed.values() if param in b), None)
+        if original is not None:
+            before.append(f"{param} = {original}")
+    after = [_after_line(param, details, total) for param, details in merged.items()]
+
+    required = min_votes if min_votes is not None else total // 2 + 1
+    return f"""### **Ensemble Consensus**
+Suggestions of {total} models, merged by impact-weighted vote. A parameter is changed when at least {required} of them change it.
+
+{chr(10).join(summary)}
+
+**Final Recommendation:**
+**Before:**
+{chr(10).join(before)}
+
+
+**After:**
+{chr(10).join(after)}
+"""
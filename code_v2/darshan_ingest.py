@@ -0,0 +1,345 @@
+# darshan_ingest.py
+"""
+Streaming ingestion of darshan-parser text output into the raw Darshan
+counter table (darshan_parsed_output_6-29-V5(in).csv and its columnar cache).
+
+Every log is read line by line through a generator pipeline
+(read_lines -> parse_lines -> aggregate_jobs) that keeps only the running
+job-level totals in memory, never the per-file records. Log files are parsed
+in parallel in a process pool, and the resulting rows are appended to the
+table in batches of ingest.flush_rows jobs. Jobs already in the table are skipped.
+
+A log may hold one job or several concatenated darshan-parser dumps; a new
+job starts at every '# darshan log version' header.
+
+The existing rows of the table were produced by a preprocessing step that
+is not part of this repository (e.g. nprocs is 0 and POSIX_BYTES_READ 18 in
+every row, and tag is not derived from the byte counters). Ingestion does
+not try to reproduce it: the counters are the job-level aggregates of the
+dump, tag and nprocs are left empty rather than given a definition of
+their own, and a warning lists the counters of new jobs that fall outside
+the range of the existing rows. A job's performance comes from the
+sorted-by-tag table, which ingestion does not write.
+
+Usage:
+    darshan-parser job.darshan > job.txt && python darshan_ingest.py job.txt
+    python darshan_ingest.py /scratch/darshan_dumps/2024-06-29 --workers 8
+"""
+import argparse
+import gzip
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import yaml
+
+from data_cache import append_rows, open_table
+from data_loader import CACHE_DIRNAME, RAW_DARSHAN_FILE
+
+DEFAULT_MODULES = ['POSIX', 'LUSTRE', 'MPIIO']
+
+# Header lines kept from each dump ('# <key>: <value>')
+HEADER_KEYS = {'darshan log version', 'exe', 'jobid'}
+
+# Columns of the table ingestion leaves empty: their preprocessing is not reproducible from a dump
+UNDERIVED_COLUMNS = ['nprocs', 'tag']
+
+# Counters of new jobs listed per out-of-range warning
+MAX_REPORTED_COUNTERS = 5
+
+# Most-common-value counters come in (value, count) pairs, e.g.
+# POSIX_ACCESS1_ACCESS / POSIX_ACCESS1_COUNT; the job keeps the 4 values with the highest total count.
+COMMON_VALUE_COUNTER = re.compile(r'^(\w+_(?:ACCESS|STRIDE))([1-4])_(ACCESS|STRIDE|COUNT)$')
+COMMON_VALUE_SLOTS = 4
+
+# IOR's -o option names the test file, which is the job's test_id
+IOR_TEST_FILE = re.compile(r'(?:^|\s)-o\s+(\S+)')
+
+
+def counter_reduction(name: str) -> str:
+    """
+    How per-record values of a counter combine into the job-level value:
+    'min' for start timestamps, 'max' for alignments, striping and extreme
+    values, and 'sum' for everything else (operation and byte counts, times).
+    """
+    if name.endswith('_START_TIMESTAMP'):
+        return 'min'
+    if (name.endswith(('_ALIGNMENT', '_END_TIMESTAMP')) or name.startswith('LUSTRE_')
+            or any(tag in name for tag in ('_MAX_', '_FASTEST_', '_SLOWEST_', '_VARIANCE_'))):
+        return 'max'
+    return 'sum'
+
+
+def read_lines(path: Path):
+    """
+    Yields the lines of a darshan-parser text file (plain or gzip-compressed).
+    """
+    opener = gzip.open if path.suffix == '.gz' else open
+    with opener(path, 'rt', encoding='utf-8', errors='replace') as f:
+        yield from f
+
+
+def parse_lines(lines, modules: list):
+    """
+    Turns darshan-parser lines into events:
+        ('begin',) at every new dump,
+        ('header', key, value) for the HEADER_KEYS lines,
+        ('counter', record, name, value) for each counter of the given modules,
+    where record identifies the (module, rank, record id) the counter belongs to.
+    """
+    modules = set(modules)
+    for line in lines:
+        if line.startswith('#'):
+            key, sep, value = line[1:].partition(':')
+            key = key.strip()
+            if not sep or key not in HEADER_KEYS:
+                continue
+            if key == 'darshan log version':
+                yield ('begin',)
+            yield ('header', key, value.strip())
+            continue
+        fields = line.split('\t')
+        if len(fields) < 5 or fields[0] not in modules:
+            continue
+        try:
+            value = int(fields[4])
+        except ValueError:
+            try:
+                value = float(fields[4])
+            except ValueError:
+                continue
+        yield ('counter', (fields[0], fields[1], fields[2]), fields[3], value)
+
+
+class JobAggregate:
+    """
+    Running job-level totals of one dump. Memory is bounded by the number of
+    distinct counters (plus the distinct access sizes and strides), not by
+    the number of records.
+    """
+
+    def __init__(self):
+        self.header = {}
+        self.counters = {}
+        self._common_values = {}
+        self._pending_pairs = {}
+
+    def add(self, record: tuple, name: str, value, reductions: dict):
+        match = COMMON_VALUE_COUNTER.match(name)
+        if match:
+            prefix, slot, kind = match.groups()
+            pair = self._pending_pairs.setdefault((record, prefix, slot), {})
+            pair['count' if kind == 'COUNT' else 'value'] = value
+            if len(pair) == 2:
+                del self._pending_pairs[(record, prefix, slot)]
+                if pair['count'] > 0:
+                    totals = self._common_values.setdefault(prefix, {})
+                    totals[pair['value']] = totals.get(pair['value'], 0) + pair['count']
+            return
+
+        reduction = reductions.get(name)
+        if reduction is None:
+            reduction = reductions[name] = counter_reduction(name)
+        current = self.counters.get(name)
+        if current is None:
+            self.counters[name] = value
+        elif reduction == 'sum':
+            self.counters[name] = current + value
+        elif reduction == 'max':
+            self.counters[name] = max(current, value)
+        else:
+            self.counters[name] = min(current, value)
+
+    def test_id(self, fallback: str) -> str:
+        match = IOR_TEST_FILE.search(self.header.get('exe', ''))
+        return Path(match.group(1)).name if match else fallback
+
+    def row(self, fallback_id: str) -> dict:
+        """
+        The job as one row of the counter table: the aggregated counters and
+        the most common access sizes and strides (no tag or nprocs, see
+        UNDERIVED_COLUMNS).
+        """
+        row = dict(self.counters)
+        for prefix, totals in self._common_values.items():
+            kind = prefix.rsplit('_', 1)[1]
+            # Highest count first; ties keep the order the values were first seen in (a stable
+            # sort), so a single record's slots come out as darshan-parser listed them
+            ranked = sorted(totals.items(), key=lambda item: -item[1])[:COMMON_VALUE_SLOTS]
+            for slot, (value, count) in enumerate(ranked, start=1):
+                row[f'{prefix}{slot}_{kind}'] = value
+                row[f'{prefix}{slot}_COUNT'] = count
+        for column in UNDERIVED_COLUMNS:
+            row.pop(column, None)
+        row['test_id'] = self.test_id(fallback_id)
+        return row
+
+
+def aggregate_jobs(events, source_name: str):
+    """
+    Folds parse_lines() events into one row per dump, yielded as soon as the dump ends.
+    """
+    job, index, reductions = None, 0, {}
+    for event in events:
+        if event[0] == 'begin' or job is None:
+            if job is not None and job.counters:
+                yield job.row(source_name if index == 1 else f"{source_name}-{index}")
+            job, index = JobAggregate(), index + 1
+        if event[0] == 'header':
+            job.header[event[1]] = event[2]
+        elif event[0] == 'counter':
+            job.add(event[1], event[2], event[3], reductions)
+    if job is not None and job.counters:
+        yield job.row(source_name if index == 1 else f"{source_name}-{index}")
+
+
+def ingest_file(path: Path, modules: list, columns: list = None) -> list:
+    """
+    Parses one log file into counter-table rows, keeping only the given columns.
+    """
+    source_name = path.name.split('.')[0]
+    rows = []
+    for row in aggregate_jobs(parse_lines(read_lines(path), modules), source_name):
+        if columns is not None:
+            row = {c: row[c] for c in columns if c in row}
+        rows.append(row)
+    return rows
+
+
+def _ingest_file_args(args):
+    return ingest_file(*args)
+
+
+def expand_paths(paths: list, pattern: str) -> list:
+    """
+    The files given, plus the files matching pattern under the directories given.
+    """
+    files = []
+    for path in paths:
+        if path.is_dir():
+            files.extend(sorted(p for p in path.rglob(pattern) if p.is_file()))
+        else:
+            files.append(path)
+    return files
+
+
+def ingest_logs(paths: list, data_dir: Path, modules: list = DEFAULT_MODULES, workers: int = None,
+                flush_rows: int = 1000):
+    """
+    Parses darshan-parser logs and appends one row per new job to the raw
+    Darshan counter table.
+
+    Counters that are not columns of the table are dropped, and columns no
+    log provides are filled with 0 (the counter was never incremented).
+    tag and nprocs are left empty, and counters outside the range of the
+    existing rows are reported, since the existing rows were preprocessed
+    in a way a dump does not reproduce.
+
+    Args:
+        paths (list): darshan-parser text files (optionally .gz).
+        data_dir (Path): The path to the 'data' directory.
+        modules (list): Darshan modules whose counters are aggregated.
+        workers (int): Processes parsing log files (default: CPU count).
+        flush_rows (int): Jobs buffered before they are appended to the table.
+
+    Returns:
+        dict: Counts of 'files', 'ingested', 'skipped' (already present) and
+        'out_of_range' jobs, or None on error.
+    """
+    csv_path = data_dir / RAW_DARSHAN_FILE
+    cache_dir = data_dir / CACHE_DIRNAME
+    try:
+        table = open_table(csv_path, cache_dir, 'test_id')
+    except FileNotFoundError as e:
+        print(f"Error: {e}.")
+        return None
+    columns = table.columns
+    known = set(table.column('test_id').tolist())
+    workers = workers or os.cpu_count() or 1
+    counts = {'files': len(paths), 'ingested': 0, 'skipped': 0, 'out_of_range': 0}
+    counter_columns = [c for c in columns if c != 'test_id' and c not in UNDERIVED_COLUMNS]
+    ranges = {c: (table.column(c).min(), table.column(c).max()) for c in counter_columns} if len(known) else {}
+
+    def flush(buffer):
+        if buffer:
+            frame = pd.DataFrame(buffer, columns=columns)
+            frame[counter_columns] = frame[counter_columns].fillna(0)
+            check_ranges(frame)
+            # Keep integer counters integer, as they are in the table
+            for c in counter_columns:
+                if np.issubdtype(table.column(c).dtype, np.integer) and (frame[c] % 1 == 0).all():
+                    frame[c] = frame[c].astype(table.column(c).dtype)
+            append_rows(csv_path, cache_dir, 'test_id', frame)
+            counts['ingested'] += len(buffer)
+            print(f"Appended {len(buffer)} job(s) ({counts['ingested']} so far).")
+        return []
+
+    def check_ranges(frame: pd.DataFrame):
+        outside = {c: int(((frame[c] < low) | (frame[c] > high)).sum()) for c, (low, high) in ranges.items()}
+        outside = {c: n for c, n in outside.items() if n}
+        if not outside:
+            return
+        jobs = int(np.any([(frame[c] < ranges[c][0]) | (frame[c] > ranges[c][1]) for c in outside], axis=0).sum())
+        counts['out_of_range'] += jobs
+        listed = sorted(outside, key=lambda c: -outside[c])[:MAX_REPORTED_COUNTERS]
+        print(f"Warning: {jobs} new job(s) have counters outside the range of the existing rows "
+              f"({', '.join(listed)}{', ...' if len(outside) > len(listed) else ''}); "
+              f"they may not be comparable with them.")
+
+    tasks = [(path, modules, columns) for path in paths]
+    if workers > 1 and len(tasks) > 1:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        results = pool.map(_ingest_file_args, tasks)
+    else:
+        pool = None
+        results = map(_ingest_file_args, tasks)
+
+    buffer = []
+    try:
+        for rows in results:
+            for row in rows:
+                if row['test_id'] in known:
+                    counts['skipped'] += 1
+                    continue
+                known.add(row['test_id'])
+                buffer.append(row)
+                if len(buffer) >= flush_rows:
+                    buffer = flush(buffer)
+        flush(buffer)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return counts
+
+
+def main():
+    base_dir = Path(__file__).resolve().parent
+    parser = argparse.ArgumentParser(description="Ingest darshan-parser text output into the raw Darshan counter table")
+    parser.add_argument('paths', nargs='+', type=Path,
+                        help="darshan-parser output files, or directories to search for them.")
+    parser.add_argument('--config', type=Path, default=base_dir / 'config.yaml',
+                        help="Path to the configuration file (default: config.yaml next to this script).")
+    parser.add_argument('--data-dir', type=Path, default=base_dir / 'data_v2',
+                        help="Directory holding the data tables (default: data_v2/ next to this script).")
+    parser.add_argument('--workers', type=int, help="Processes parsing log files (default: ingest.workers in config.yaml).")
+    args = parser.parse_args()
+    with open(args.config, 'r') as f:
+        config = yaml.safe_load(f)
+    ingest_config = config.get('ingest', {})
+
+    files = expand_paths(args.paths, ingest_config.get('pattern') or '*')
+    print(f"Ingesting {len(files)} darshan-parser file(s) into '{args.data_dir / RAW_DARSHAN_FILE}'...")
+    counts = ingest_logs(files, args.data_dir,
+                         modules=ingest_config.get('modules') or DEFAULT_MODULES,
+                         workers=args.workers or ingest_config.get('workers'),
+                         flush_rows=ingest_config.get('flush_rows') or 1000)
+    if counts is not None:
+        print(f"Ingested {counts['ingested']} new job(s) from {counts['files']} file(s); "
+              f"{counts['skipped']} job(s) were already in the table.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,377 @@
+# data_cache.py
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Bump when the on-disk layout changes so old caches are rebuilt.
+CACHE_FORMAT_VERSION = 2
+
+# The source CSV is hashed in blocks of this size, so an append only rehashes
+# the last (partial) block and the new bytes instead of the whole file.
+HASH_BLOCK_BYTES = 16 << 20
+
+
+def _block_hashes(path: Path, hashes: list = None, from_offset: int = 0) -> list:
+    """
+    The SHA-256 of every HASH_BLOCK_BYTES block of path (the last one may be
+    partial). Blocks that end before from_offset are taken from hashes rather
+    than read again.
+    """
+    first_block = from_offset // HASH_BLOCK_BYTES
+    hashes = list((hashes or [])[:first_block])
+    with open(path, 'rb') as f:
+        f.seek(first_block * HASH_BLOCK_BYTES)
+        while True:
+            digest = hashlib.sha256()
+            remaining = HASH_BLOCK_BYTES
+            while remaining:
+                chunk = f.read(min(remaining, 1 << 20))
+                if not chunk:
+                    break
+                digest.update(chunk)
+                remaining -= len(chunk)
+            if remaining == HASH_BLOCK_BYTES:
+                break
+            hashes.append(digest.hexdigest())
+            if remaining:
+                break
+    return hashes
+
+
+class ColumnarTable:
+    """
+    A CSV table converted to one memory-mapped .npy file per column.
+
+    Columns are only mapped when first accessed, so reading a handful of
+    columns or rows never touches the rest of the table. An optional sorted
+    index on a key column turns row lookups into a binary search.
+    """
+
+    def __init__(self, table_dir: Path, manifest: dict):
+        self.table_dir = table_dir
+        self.manifest = manifest
+        self.columns = [c['name'] for c in manifest['columns']]
+        self.key_column = manifest.get('key_column')
+        self._files = {c['name']: c for c in manifest['columns']}
+        self._arrays = {}
+        self._index = None
+
+    def __len__(self):
+        return self.manifest['nrows']
+
+    def column(self, name: str) -> np.ndarray:
+        """
+        Returns a read-only memory map of one column.
+        """
+        if name not in self._arrays:
+            self._arrays[name] = np.load(self.table_dir / self._files[name]['file'], mmap_mode='r')
+        return self._arrays[name]
+
+    def _column_values(self, name: str, positions=None) -> np.ndarray:
+        info = self._files[name]
+        values = self.column(name)
+        if positions is not None:
+            values = values[positions]
+        if info['kind'] == 'str':
+            values = values.astype(object)
+            if info.get('mask'):
+                mask = np.load(self.table_dir / info['mask'], mmap_mode='r')
+                values[mask if positions is None else mask[positions]] = np.nan
+        return np.asarray(values)
+
+    def to_frame(self, columns: list = None) -> pd.DataFrame:
+        """
+        Materializes the table (or only the given columns) as a DataFrame.
+        """
+        columns = self.columns if columns is None else columns
+        return pd.DataFrame({name: self._column_values(name) for name in columns}, columns=columns)
+
+    def positions(self, keys) -> np.ndarray:
+        """
+        Returns the row positions whose key column matches any of keys, in row order.
+        """
+        if self._index is None:
+            self._index = (np.load(self.table_dir / 'index_keys.npy', mmap_mode='r'),
+                           np.load(self.table_dir / 'index_positions.npy', mmap_mode='r'))
+        sorted_keys, sorted_positions = self._index
+        keys = np.asarray(keys if isinstance(keys, (list, tuple, np.ndarray, pd.Series)) else [keys]).astype(str)
+        starts = np.searchsorted(sorted_keys, keys, side='left')
+        ends = np.searchsorted(sorted_keys, keys, side='right')
+        matches = [sorted_positions[s:e] for s, e in zip(starts, ends) if e > s]
+        if not matches:
+            return np.empty(0, dtype=np.int64)
+        return np.sort(np.concatenate(matches))
+
+    def rows(self, positions, columns: list = None) -> pd.DataFrame:
+        """
+        Gathers only the given rows (indexed by their original row positions) into a DataFrame.
+        """
+        positions = np.asarray(positions, dtype=np.int64)
+        columns = self.columns if columns is None else columns
+        return pd.DataFrame({name: self._column_values(name, positions) for name in columns},
+                            columns=columns, index=positions)
+
+    def lookup(self, keys, columns: list = None) -> pd.DataFrame:
+        """
+        Returns the rows whose key column matches keys, like df[df[key].isin(keys)].
+        """
+        return self.rows(self.positions(keys), columns)
+
+
+def _build_table(csv_path: Path, table_dir: Path, key_column: str, source_info: dict) -> dict:
+    """
+    Parses csv_path once and writes its columnar form into table_dir.
+    """
+    df = pd.read_csv(csv_path)
+    tmp_dir = table_dir.with_name(f"{table_dir.name}.tmp-{os.getpid()}")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+
+    columns = []
+    for i, name in enumerate(df.columns):
+        series = df[name]
+        info = {'name': name, 'file': f"col_{i:04d}.npy"}
+        if series.dtype == object:
+            missing = series.isna().to_numpy()
+            values = series.where(~missing, '').astype(str).to_numpy()
+            width = max(1, int(pd.Series(values).str.len().max() or 1))
+            np.save(tmp_dir / info['file'], values.astype(f'<U{width}'))
+            info['kind'] = 'str'
+            if missing.any():
+                info['mask'] = f"col_{i:04d}_mask.npy"
+                np.save(tmp_dir / info['mask'], missing)
+        else:
+            np.save(tmp_dir / info['file'], series.to_numpy())
+            info['kind'] = 'numeric'
+        columns.append(info)
+
+    if key_column is not None:
+        keys = df[key_column].astype(str).to_numpy().astype('U')
+        order = np.argsort(keys, kind='stable')
+        np.save(tmp_dir / 'index_keys.npy', keys[order])
+        np.save(tmp_dir / 'index_positions.npy', order.astype(np.int64))
+
+    manifest = {
+        'format_version': CACHE_FORMAT_VERSION,
+        **source_info,
+        'key_column': key_column,
+        'nrows': len(df),
+        'columns': columns,
+    }
+    with open(tmp_dir / 'manifest.json', 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    shutil.rmtree(table_dir, ignore_errors=True)
+    os.replace(tmp_dir, table_dir)
+    return manifest
+
+
+def open_table(csv_path: Path, cache_dir: Path, key_column: str = None) -> ColumnarTable:
+    """
+    Opens the columnar cache of csv_path, (re)building it first if it is
+    missing or stale.
+
+    The cache is considered fresh when the source's size and mtime match the
+    manifest. If only the mtime changed, the SHA-256 of each block of the
+    source is compared before deciding to rebuild, so touching a file does not force a re-parse.
+
+    Args:
+        csv_path (Path): The source CSV file.
+        cache_dir (Path): Directory holding one sub-directory per cached table.
+        key_column (str): Column to build the row index on (e.g. 'test_id').
+
+    Raises:
+        FileNotFoundError: If csv_path does not exist.
+    """
+    stat = csv_path.stat()
+    table_dir = cache_dir / csv_path.stem
+    manifest_path = table_dir / 'manifest.json'
+
+    manifest = None
+    if manifest_path.exists():
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest.get('format_version') != CACHE_FORMAT_VERSION or manifest.get('key_column') != key_column:
+            manifest = None
+
+    if manifest is not None and (manifest['size'] != stat.st_size or manifest['mtime_ns'] != stat.st_mtime_ns):
+        if manifest['size'] == stat.st_size and manifest['block_hashes'] == _block_hashes(csv_path):
+            manifest['mtime_ns'] = stat.st_mtime_ns
+            with open(manifest_path, 'w') as f:
+                json.dump(manifest, f, indent=2)
+        else:
+            manifest = None
+
+    if manifest is None:
+        print(f"Building columnar cache for '{csv_path.name}'...")
+        source_info = {'source': csv_path.name, 'size': stat.st_size,
+                       'mtime_ns': stat.st_mtime_ns, 'block_hashes': _block_hashes(csv_path)}
+        manifest = _build_table(csv_path, table_dir, key_column, source_info)
+
+    return ColumnarTable(table_dir, manifest)
+
+
+def _save_replace(path: Path, array: np.ndarray):
+    """
+    np.save through a temporary file, so readers that still map the old file keep a valid view.
+    """
+    tmp_path = path.with_name(f"{path.name}.tmp-{os.getpid()}")
+    with open(tmp_path, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+def _append_npy(path: Path, values: np.ndarray) -> bool:
+    """
+    Appends values to a 1-D .npy file in place: the data is written at the
+    end and the shape in the header is updated.
+
+    Returns:
+        False (leaving the file untouched) if the dtypes differ or the new
+        shape does not fit in the existing header; the caller then rewrites the file.
+    """
+    with open(path, 'r+b') as f:
+        version = np.lib.format.read_magic(f)
+        if version != (1, 0):
+            return False
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        data_offset = f.tell()
+        if len(shape) != 1 or fortran_order or dtype != values.dtype:
+            return False
+        header = repr({'descr': np.lib.format.dtype_to_descr(dtype), 'fortran_order': False,
+                       'shape': (shape[0] + len(values),)})
+        # Magic string (6 bytes), version (2) and header length (2), then the header padded to the data
+        header_len = data_offset - 10
+        if len(header) + 1 > header_len:
+            return False
+        f.seek(8)
+        f.write(np.uint16(header_len).tobytes())
+        f.write((header.ljust(header_len - 1) + '\n').encode('latin1'))
+        f.seek(0, os.SEEK_END)
+        f.write(np.ascontiguousarray(values).tobytes())
+    return True
+
+
+def _append_index(table_dir: Path, new_keys: np.ndarray, first_position: int):
+    """
+    Adds the keys of rows appended at first_position onwards to the sorted key
+    index. Keys that sort after every indexed key (e.g. increasing job ids) are
+    appended to the index files in place; otherwise the new keys are sorted on
+    their own and merged into the index with searchsorted, instead of
+    re-sorting the whole index. Equal keys stay in row order.
+    """
+    keys_path, positions_path = table_dir / 'index_keys.npy', table_dir / 'index_positions.npy'
+    sorted_keys = np.load(keys_path, mmap_mode='r')
+    order = np.argsort(new_keys, kind='stable')
+    new_keys = new_keys[order]
+    new_positions = first_position + order.astype(np.int64)
+    dtype = np.result_type(sorted_keys.dtype, new_keys.dtype)
+
+    if len(sorted_keys) == 0 or new_keys[0] >= sorted_keys[-1]:
+        if dtype == sorted_keys.dtype:
+            del sorted_keys
+            if _append_npy(keys_path, new_keys.astype(dtype)):
+                if not _append_npy(positions_path, new_positions):
+                    _save_replace(positions_path, np.concatenate([np.load(positions_path), new_positions]))
+                return
+            sorted_keys = np.load(keys_path, mmap_mode='r')
+
+    # Slot of every new key in the merged index: after the indexed keys equal to it
+    slots = np.searchsorted(sorted_keys, new_keys, side='right') + np.arange(len(new_keys))
+    is_new = np.zeros(len(sorted_keys) + len(new_keys), dtype=bool)
+    is_new[slots] = True
+    keys = np.empty(len(is_new), dtype=dtype)
+    keys[slots] = new_keys
+    keys[~is_new] = sorted_keys
+    positions = np.empty(len(is_new), dtype=np.int64)
+    positions[slots] = new_positions
+    positions[~is_new] = np.load(positions_path, mmap_mode='r')
+    del sorted_keys
+    _save_replace(keys_path, keys)
+    _save_replace(positions_path, positions)
+
+
+def append_rows(csv_path: Path, cache_dir: Path, key_column: str, rows: pd.DataFrame) -> ColumnarTable:
+    """
+    Appends rows to a table: to the source CSV and, in place, to its
+    columnar cache, without re-parsing the existing rows.
+
+    Rows are aligned to the table's columns (missing columns are left
+    empty). Columns whose values no longer fit their stored dtype (longer
+    strings, floats in an integer column) are rewritten with a wider dtype.
+    The CSV is written first and the manifest last, so an interrupted append
+    leaves a stale manifest and the cache is rebuilt from the CSV on the next open.
+
+    The cost of an append depends on the rows appended, not on the table:
+    columns, masks and (for increasing keys) the key index are extended in
+    place, other keys are merged into the index without re-sorting it, and
+    only the last block of the CSV and the new bytes are hashed.
+
+    Args:
+        csv_path (Path): The source CSV file.
+        cache_dir (Path): Directory holding one sub-directory per cached table.
+        key_column (str): The table's index column (e.g. 'test_id').
+        rows (pd.DataFrame): The rows to append.
+
+    Returns:
+        ColumnarTable: The table including the new rows.
+    """
+    table = open_table(csv_path, cache_dir, key_column)
+    if rows.empty:
+        return table
+    rows = rows.reindex(columns=table.columns)
+    old_nrows = len(table)
+    old_size = table.manifest['size']
+
+    with open(csv_path, 'rb+') as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell() > 0:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b'\n':
+                f.write(b'\n')
+    rows.to_csv(csv_path, mode='a', header=False, index=False)
+
+    manifest = table.manifest
+    for info in manifest['columns']:
+        path = table.table_dir / info['file']
+        existing = np.load(path, mmap_mode='r')
+        series = rows[info['name']]
+        if info['kind'] == 'str':
+            missing = series.isna().to_numpy()
+            values = series.where(~missing, '').astype(str).to_numpy()
+            width = max(1, int(pd.Series(values).str.len().max() or 1))
+            dtype = existing.dtype if width <= existing.dtype.itemsize // 4 else np.dtype(f'<U{width}')
+            values = values.astype(dtype)
+            if 'mask' in info:
+                mask_path = table.table_dir / info['mask']
+                if not _append_npy(mask_path, missing):
+                    _save_replace(mask_path, np.concatenate([np.load(mask_path), missing]))
+            elif missing.any():
+                info['mask'] = f"{Path(info['file']).stem}_mask.npy"
+                _save_replace(table.table_dir / info['mask'],
+                              np.concatenate([np.zeros(old_nrows, dtype=bool), missing]))
+        else:
+            values = pd.to_numeric(series).to_numpy()
+            dtype = np.result_type(existing.dtype, values.dtype)
+            values = values.astype(dtype)
+        if dtype != existing.dtype or not _append_npy(path, values):
+            merged = np.concatenate([np.asarray(existing).astype(dtype), values])
+            del existing
+            _save_replace(path, merged)
+
+    if key_column is not None:
+        _append_index(table.table_dir, rows[key_column].astype(str).to_numpy().astype('U'), old_nrows)
+
+    stat = csv_path.stat()
+    manifest.update(nrows=old_nrows + len(rows), size=stat.st_size, mtime_ns=stat.st_mtime_ns,
+                    block_hashes=_block_hashes(csv_path, manifest['block_hashes'], old_size))
+    tmp_path = table.table_dir / f"manifest.json.tmp-{os.getpid()}"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, table.table_dir / 'manifest.json')
+    return ColumnarTable(table.table_dir, manifest)
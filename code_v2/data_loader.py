@@ -1,52 +1,193 @@
 import pandas as pd
 from pathlib import Path
 
-def load_all_data(data_dir: Path):
+from data_cache import open_table
+from metrics import timed
+from job_store import JobStore
+from schema import compact_frame, memory_bytes
+
+# Define the exact file names, and the job key column of each table
+SORTED_JOBS_FILE = 'darshan_parsed_output_6-29-V5_sorted_by_tag(in).csv'
+RAW_DARSHAN_FILE = 'darshan_parsed_output_6-29-V5(in).csv'
+SHAP_VALUES_FILE = 'darshan_parsed_output_6-29-V5_norm_log_scaled_with_shap_calib(in).csv'
+IOR_CONFIG_FILE = 'ior_configurations(in).csv'
+TABLE_FILES = [
+    (SORTED_JOBS_FILE, 'test_id'),
+    (RAW_DARSHAN_FILE, 'test_id'),
+    (SHAP_VALUES_FILE, 'test_id'),
+    # The column name in ior_configurations(in).csv is 'testFile'
+    (IOR_CONFIG_FILE, 'testFile'),
+]
+
+# Columnar binary copies of the CSVs live here (see data_cache.py).
+CACHE_DIRNAME = '.cache'
+
+def open_cached_tables(data_dir: Path):
     """
-    Loads all necessary data files, finds the worst-performing job,
-    and returns all relevant data for that job.
+    Opens the memory-mapped columnar cache of the four input tables, building
+    or refreshing it from the CSVs first if needed.
+
+    Returns:
+        A tuple of ColumnarTable objects in the same order as load_tables(), or None on error.
+    """
+    try:
+        return tuple(open_table(data_dir / file_name, data_dir / CACHE_DIRNAME, key_column)
+                     for file_name, key_column in TABLE_FILES)
+    except FileNotFoundError as e:
+        print(f"Error: {e}.")
+        print("Please ensure all four CSV files are in the 'data' directory.")
+        return None
+
+def load_tables(data_dir: Path, use_cache: bool = True):
+    """
+    Loads the four input tables.
 
     Args:
         data_dir (Path): The path to the 'data' directory.
+        use_cache (bool): Read the columnar binary cache instead of parsing the CSVs.
 
     Returns:
-        A tuple containing the raw data, SHAP data, IOR config data, and the worst test ID.
-        Returns (None, None, None, None) on error.
+        A tuple containing the sorted-by-tag, raw Darshan, SHAP and IOR config DataFrames.
+        Returns None on error.
     """
-    try:
-        # Define the exact file names
-        sorted_jobs_file = data_dir / 'darshan_parsed_output_6-29-V5_sorted_by_tag(in).csv'
-        raw_darshan_file = data_dir / 'darshan_parsed_output_6-29-V5(in).csv'
-        shap_values_file = data_dir / 'darshan_parsed_output_6-29-V5_norm_log_scaled_with_shap_calib(in).csv'
-        ior_config_file = data_dir / 'ior_configurations(in).csv'
+    if use_cache:
+        cached_tables = open_cached_tables(data_dir)
+        if cached_tables is None:
+            return None
+        return tuple(table.to_frame() for table in cached_tables)
 
+    try:
         # Load all datasets
-        sorted_df = pd.read_csv(sorted_jobs_file)
-        raw_darshan_df = pd.read_csv(raw_darshan_file)
-        shap_df = pd.read_csv(shap_values_file)
-        ior_config_df = pd.read_csv(ior_config_file)
+        return tuple(pd.read_csv(data_dir / file_name) for file_name, _ in TABLE_FILES)
 
     except FileNotFoundError as e:
         print(f"Error: {e}.")
         print("Please ensure all four CSV files are in the 'data' directory.")
+        return None
+
+@timed('load')
+def load_ior_config(data_dir: Path, use_cache: bool = True):
+    """
+    Loads only the IOR configuration table. Returns None on error.
+    """
+    try:
+        if use_cache:
+            return open_table(data_dir / IOR_CONFIG_FILE, data_dir / CACHE_DIRNAME, 'testFile').to_frame()
+        return pd.read_csv(data_dir / IOR_CONFIG_FILE)
+    except FileNotFoundError as e:
+        print(f"Error: {e}.")
+        return None
+
+@timed('load')
+def load_sorted_jobs(data_dir: Path, use_cache: bool = True):
+    """
+    Loads only the sorted-by-tag table (test_id and performance tag). Returns None on error.
+    """
+    try:
+        if use_cache:
+            return open_table(data_dir / SORTED_JOBS_FILE, data_dir / CACHE_DIRNAME, 'test_id').to_frame()
+        return pd.read_csv(data_dir / SORTED_JOBS_FILE)
+    except FileNotFoundError as e:
+        print(f"Error: {e}.")
+        return None
+
+def get_job_data(tables, test_id: str):
+    """
+    Finds the raw, SHAP and IOR config rows for one job.
+
+    Returns:
+        A tuple (job_raw, job_shap, job_config), or None if the job is missing from any table.
+    """
+    _, raw_darshan_df, shap_df, ior_config_df = tables
+
+    job_raw = raw_darshan_df[raw_darshan_df['test_id'] == test_id]
+    job_shap = shap_df[shap_df['test_id'] == test_id]
+
+    # The column name in ior_configurations(in).csv is 'testFile'
+    job_config = ior_config_df[ior_config_df['testFile'] == test_id]
+
+    if job_raw.empty or job_shap.empty or job_config.empty:
+        return None
+
+    return job_raw, job_shap, job_config
+
+def compact_tables(tables, float32_rtol: float = 0.0):
+    """
+    Converts the four input tables to compact types (see schema.compact_frame)
+    and reports the memory saved.
+    """
+    before = sum(memory_bytes(df) for df in tables)
+    tables = tuple(compact_frame(df, float32_rtol=float32_rtol) for df in tables)
+    after = sum(memory_bytes(df) for df in tables)
+    print(f"Compact typed tables: {before / 1e6:.1f} MB -> {after / 1e6:.1f} MB")
+    return tables
+
+@timed('load')
+def load_job_store(data_dir: Path, use_cache: bool = True, compact: bool = False, float32_rtol: float = 0.0):
+    """
+    Loads the four input tables and joins them into a JobStore.
+
+    Args:
+        data_dir (Path): The path to the 'data' directory.
+        use_cache (bool): Read the columnar binary cache instead of parsing the CSVs.
+        compact (bool): Store sizes as int bytes, api as a categorical, and
+                        downcast numbers to int32/float32 where lossless.
+        float32_rtol (float): Relative error accepted when downcasting floats (0 = lossless).
+
+    Returns:
+        JobStore: The indexed job table, or None on error.
+    """
+    tables = load_tables(data_dir, use_cache=use_cache)
+    if tables is None:
+        return None
+    if compact:
+        tables = compact_tables(tables, float32_rtol)
+    return JobStore.from_tables(tables)
+
+@timed('load')
+def load_all_data(data_dir: Path, use_cache: bool = True):
+    """
+    Loads all necessary data files, finds the worst-performing job,
+    and returns all relevant data for that job.
+
+    With the columnar cache only the rows of the worst job are read, through
+    the test_id/testFile index, instead of parsing every table.
+
+    Args:
+        data_dir (Path): The path to the 'data' directory.
+        use_cache (bool): Read the columnar binary cache instead of parsing the CSVs.
+
+    Returns:
+        A tuple containing the raw data, SHAP data, IOR config data, and the worst test ID.
+        Returns (None, None, None, None) on error.
+    """
+    if use_cache:
+        tables = open_cached_tables(data_dir)
+    else:
+        tables = load_tables(data_dir, use_cache=False)
+    if tables is None:
         return None, None, None, None
 
     # 1. Get the test_id of the worst job from the sorted file
-    worst_test_id = sorted_df.iloc[2]['test_id']
+    if use_cache:
+        worst_test_id = str(tables[0].column('test_id')[2])
+    else:
+        worst_test_id = tables[0].iloc[2]['test_id']
     print(f"Data loaded successfully.")
     print(f"Identified worst-performing job. test_id: {worst_test_id}")
 
     # 2. Find the data for this specific job in each dataframe
-    worst_job_raw = raw_darshan_df[raw_darshan_df['test_id'] == worst_test_id]
-    worst_job_shap = shap_df[shap_df['test_id'] == worst_test_id]
-    
-    # --- THIS IS THE CORRECTED LINE ---
-    # The column name in ior_configurations(in).csv is 'testFile'
-    worst_job_config = ior_config_df[ior_config_df['testFile'] == worst_test_id]
-    
+    if use_cache:
+        job_data = tuple(table.lookup(worst_test_id) for table in tables[1:])
+        if any(df.empty for df in job_data):
+            job_data = None
+    else:
+        job_data = get_job_data(tables, worst_test_id)
+
     # --- Data Validation ---
-    if worst_job_raw.empty or worst_job_shap.empty or worst_job_config.empty:
+    if job_data is None:
         print(f"Error: Could not find data for test_id '{worst_test_id}' in all files.")
         return None, None, None, None
 
-    return worst_job_raw, worst_job_shap, worst_job_config, worst_test_id
\ No newline at end of file
+    worst_job_raw, worst_job_shap, worst_job_config = job_data
+    return worst_job_raw, worst_job_shap, worst_job_config, worst_test_id
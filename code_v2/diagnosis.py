@@ -0,0 +1,120 @@
+# diagnosis.py
+import numpy as np
+import pandas as pd
+
+from agent import COLS_TO_IGNORE, PIPELINE_EVIDENCE, format_diagnosis_summary
+from metrics import timed
+
+# Rows per NumPy pass; bounds the temporary (rows x features) arrays on very large tables.
+CHUNK_ROWS = 100_000
+
+
+def top_k_indices(matrix: np.ndarray, valid: np.ndarray, k: int, name_rank: np.ndarray):
+    """
+    Selects the k largest valid entries of every row in one pass.
+
+    Ties are broken in favour of the earlier column, like Series.nlargest(keep='first').
+    The selected columns of each row are returned ordered by feature name (name_rank),
+    like Series.sort_index().
+
+    Args:
+        matrix (np.ndarray): (rows x features) float matrix.
+        valid (np.ndarray): Boolean mask of the entries that may be selected.
+        k (int): Number of entries to select per row.
+        name_rank (np.ndarray): Position of each feature in name-sorted order.
+
+    Returns:
+        A tuple (indices, counts): an int32 (rows x k) array of column indices
+        padded with -1, and the number of valid selections per row.
+    """
+    n_rows, n_cols = matrix.shape
+    k = min(k, n_cols)
+    if k == 0:
+        return np.full((n_rows, 0), -1, dtype=np.int32), np.zeros(n_rows, dtype=np.int64)
+
+    scores = np.where(valid, matrix, -np.inf)
+    kth_col = np.argpartition(scores, n_cols - k, axis=1)[:, n_cols - k]
+    threshold = scores[np.arange(n_rows), kth_col][:, None]
+
+    above = scores > threshold
+    ties = scores == threshold
+    slots_left = k - above.sum(axis=1, keepdims=True)
+    selected = (above | (ties & (np.cumsum(ties, axis=1) <= slots_left))) & valid
+
+    # Order the selected columns by name; unselected ones sort to the end
+    sort_keys = np.where(selected, name_rank[None, :], n_cols)
+    indices = np.argsort(sort_keys, axis=1, kind='stable')[:, :k]
+    counts = selected.sum(axis=1)
+    indices = np.where(np.arange(k)[None, :] < counts[:, None], indices, -1).astype(np.int32)
+    return indices, counts
+
+
+class TopKTable:
+    """
+    Compact (jobs x k) table of the top features of every job: column indices
+    into feature_names (-1 padded) and the matching values.
+    """
+
+    def __init__(self, feature_names: np.ndarray, indices: np.ndarray, values: np.ndarray, counts: np.ndarray):
+        self.feature_names = feature_names
+        self.indices = indices
+        self.values = values
+        self.counts = counts
+
+    def series(self, row: int) -> pd.Series:
+        """
+        The top features of one job as a Series sorted by feature name.
+        """
+        count = self.counts[row]
+        return pd.Series(self.values[row, :count],
+                         index=pd.Index(self.feature_names[self.indices[row, :count]], dtype=object))
+
+
+def compute_top_k(df: pd.DataFrame, k: int = 5, positive_only: bool = False) -> TopKTable:
+    """
+    Computes the top-k numeric features of every row of df, ignoring COLS_TO_IGNORE
+    and missing values (and non-positive values if positive_only).
+    """
+    feature_cols = [c for c in df.columns
+                    if c not in COLS_TO_IGNORE and pd.api.types.is_numeric_dtype(df[c])]
+    feature_names = np.array(feature_cols, dtype=object)
+    name_rank = np.argsort(np.argsort(feature_names.astype(str), kind='stable'), kind='stable')
+    values_matrix = df[feature_cols].to_numpy()
+
+    n_rows = len(df)
+    k_eff = min(k, len(feature_cols))
+    indices = np.empty((n_rows, k_eff), dtype=np.int32)
+    counts = np.empty(n_rows, dtype=np.int64)
+    for start in range(0, n_rows, CHUNK_ROWS):
+        chunk = values_matrix[start:start + CHUNK_ROWS].astype(np.float64)
+        valid = ~np.isnan(chunk)
+        if positive_only:
+            valid &= chunk > 0
+        indices[start:start + CHUNK_ROWS], counts[start:start + CHUNK_ROWS] = top_k_indices(chunk, valid, k_eff, name_rank)
+
+    values = np.take_along_axis(values_matrix, np.maximum(indices, 0), axis=1)
+    return TopKTable(feature_names, indices, values, counts)
+
+
+class DiagnosisEngine:
+    """
+    Top-k SHAP features and top-k non-zero raw Darshan counters for every job
+    in a JobStore, computed in one NumPy pass per table.
+    """
+
+    @timed('diagnosis')
+    def __init__(self, store, k: int = 5):
+        self.store = store
+        self.k = k
+        self.shap = compute_top_k(store.shap_df, k)
+        self.raw = compute_top_k(store.raw_df, k, positive_only=True)
+
+    @timed('diagnosis')
+    def summary(self, pipeline: str, position: int) -> str:
+        """
+        The 'PERFORMANCE DIAGNOSIS DATA' section for the job at position in the store.
+        """
+        evidence = PIPELINE_EVIDENCE[pipeline]
+        top_shap = self.shap.series(position) if evidence['has_shap'] else None
+        top_raw = self.raw.series(position) if evidence['has_darshan'] else None
+        return format_diagnosis_summary(pipeline, top_shap, top_raw)
@@ -0,0 +1,167 @@
+# job_store.py
+import numpy as np
+import pandas as pd
+
+from schema import display_frame
+from utils import config_row_positions
+
+
+class Job:
+    """
+    Everything known about one profiled job: its raw Darshan counters, SHAP
+    values, model outputs, performance tag and IOR configuration.
+
+    raw, shap and config are one-row DataFrames, the same shape the per-table
+    lookups in data_loader return, so they can be passed straight to the
+    prompt builders.
+    """
+
+    def __init__(self, store, position: int):
+        self._store = store
+        self.position = position
+        self.test_id = store.test_ids[position]
+        self.tag = store.tags[position]
+
+    @property
+    def raw(self) -> pd.DataFrame:
+        return self._store.raw_df.iloc[[self.position]]
+
+    @property
+    def shap(self) -> pd.DataFrame:
+        return self._store.shap_df.iloc[[self.position]]
+
+    @property
+    def config(self) -> pd.DataFrame:
+        # In text form ('4K', '1M') even when the store holds compact tables
+        return self._store.display_config_df.iloc[[self.position]]
+
+    @property
+    def original_config(self) -> dict:
+        """
+        The job's IOR parameters as a dict, without the config_id/testFile keys.
+        """
+        return self.config.drop(columns=['config_id', 'testFile'], errors='ignore').iloc[0].to_dict()
+
+    @property
+    def y_true(self) -> float:
+        return self._store.shap_df['y_true'].iat[self.position]
+
+    @property
+    def y_pred(self) -> float:
+        return self._store.shap_df['y_pred'].iat[self.position]
+
+    @property
+    def error(self) -> float:
+        return self._store.shap_df['error'].iat[self.position]
+
+    def __repr__(self):
+        return f"Job(test_id={self.test_id!r}, rank={self.position}, tag={self.tag})"
+
+
+class JobStore:
+    """
+    The raw Darshan, SHAP and IOR config tables joined on the job id and laid
+    out in performance order (worst job first).
+
+    The join and the id -> row map are built once; get(), get_many() and
+    iteration are then constant-time per job regardless of table size.
+    """
+
+    def __init__(self, sorted_df: pd.DataFrame, raw_darshan_df: pd.DataFrame,
+                 shap_df: pd.DataFrame, ior_config_df: pd.DataFrame):
+        order = pd.Index(sorted_df['test_id'])
+
+        # Row of each job in every table (-1 when the job is missing from it).
+        # Duplicate ids resolve to their first row, as df[df['test_id'] == id].iloc[0] would.
+        raw_rows = self._row_positions(raw_darshan_df['test_id'], order)
+        shap_rows = self._row_positions(shap_df['test_id'], order)
+        config_rows = self._row_positions(ior_config_df['testFile'], order)
+
+        complete = (raw_rows >= 0) & (shap_rows >= 0) & (config_rows >= 0)
+        missing = int((~complete).sum())
+        if missing:
+            print(f"Warning: {missing} job(s) are missing from at least one table and were left out of the job store.")
+
+        self.raw_df = raw_darshan_df.iloc[raw_rows[complete]].reset_index(drop=True)
+        self.shap_df = shap_df.iloc[shap_rows[complete]].reset_index(drop=True)
+        self.config_df = ior_config_df.iloc[config_rows[complete]].reset_index(drop=True)
+        self.test_ids = order[complete].tolist()
+        self.tags = sorted_df['tag'].to_numpy()[complete].tolist()
+        self._positions = {test_id: i for i, test_id in enumerate(self.test_ids)}
+        self._display_config_df = None
+        self._ior_config_positions = None
+
+        # The full configuration table (every run, not only the profiled jobs)
+        self.ior_config_df = ior_config_df
+
+    @property
+    def display_config_df(self) -> pd.DataFrame:
+        """
+        config_df in text form, converted once on first use rather than on
+        every Job.config lookup.
+        """
+        if self._display_config_df is None:
+            self._display_config_df = display_frame(self.config_df)
+        return self._display_config_df
+
+    @property
+    def ior_config_positions(self) -> dict:
+        """
+        utils.config_row_positions of ior_config_df, built on first use. It
+        belongs to this store's table: a reload builds a new store, and with
+        it a new index.
+        """
+        if self._ior_config_positions is None:
+            self._ior_config_positions = config_row_positions(self.ior_config_df)
+        return self._ior_config_positions
+
+    @staticmethod
+    def _row_positions(ids: pd.Series, order: pd.Index) -> np.ndarray:
+        """
+        Maps every id in order to the position of its first row in ids, or -1.
+        """
+        first_rows = np.flatnonzero(~ids.duplicated().to_numpy())
+        matches = pd.Index(ids.to_numpy()[first_rows]).get_indexer(order)
+        return np.where(matches >= 0, first_rows[matches], -1)
+
+    @classmethod
+    def from_tables(cls, tables):
+        """
+        Builds the store from the tuple returned by data_loader.load_tables().
+        """
+        return cls(*tables)
+
+    def __len__(self):
+        return len(self.test_ids)
+
+    def __contains__(self, test_id):
+        return test_id in self._positions
+
+    def __getitem__(self, test_id) -> Job:
+        return Job(self, self._positions[test_id])
+
+    def __iter__(self):
+        """
+        Iterates over the jobs in performance order, worst first.
+        """
+        return (Job(self, i) for i in range(len(self.test_ids)))
+
+    def get(self, test_id):
+        """
+        Returns the Job for test_id, or None if it is unknown.
+        """
+        position = self._positions.get(test_id)
+        return None if position is None else Job(self, position)
+
+    def get_many(self, test_ids) -> list:
+        """
+        Returns the Jobs for the given ids, in the order given. Unknown ids are skipped.
+        """
+        return [Job(self, self._positions[t]) for t in test_ids if t in self._positions]
+
+    def worst(self, n: int = None) -> list:
+        """
+        Returns the n worst-performing jobs (all jobs if n is None).
+        """
+        end = len(self.test_ids) if n is None else min(n, len(self.test_ids))
+        return [Job(self, i) for i in range(end)]
@@ -3,7 +3,22 @@
 import requests
 import os
 import json
+import queue
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from pathlib import Path
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+import metrics
+from consensus import merge_responses
+from llm_cache import ResponseCache, make_cache_key
+from utils import AfterBlockStreamParser
 
 load_dotenv()
 
@@ -12,44 +27,641 @@ OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 YOUR_SITE_URL = "http://localhost:3000"
 YOUR_APP_NAME = "HPC-Analyzer"
 
-def call_llm(prompt: str) -> str:
+MODEL = "openai/gpt-4o-mini" # Or any other model you prefer; llm.models in config.yaml overrides it
+MODES = ['single', 'hedged', 'ensemble']
+SAMPLING_PARAMS = {
+    # 1. Set temperature to its lowest value to minimize randomness.
+    "temperature": 0.0,
+    # 2. Set top_p to its lowest value to disable nucleus sampling.
+    "top_p": 0.0,
+
+    # 3. Provide a fixed seed to guarantee identical output for the same prompt.
+    "seed": 42
+}
+
+API_URL = "https://openrouter.ai/api/v1/chat/completions"
+# Overrides llm.api_url, e.g. to point the analyzer at mock_llm_server.py.
+API_URL_ENV_VAR = "LLM_API_URL"
+
+# Status codes that are worth retrying: throttling and transient server errors.
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
     """
-    Calls the OpenRouter API with the given prompt.
+    Raised when the LLM API cannot produce a response, after any retries.
     """
-    if not OPENROUTER_API_KEY:
-        return "Error: OPENROUTER_API_KEY is not set. Please create a .env file."
 
-    headers = {
-        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-        "HTTP-Referer": YOUR_SITE_URL,
-        "X-Title": YOUR_APP_NAME,
-        "Content-Type": "application/json"
-    }
-    
-    data = {
-        "model": "openai/gpt-4o-mini", # Or any other model you prefer
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token estimate (~4 characters per token) used for rate limiting and budgeting.
+    """
+    return max(1, len(text) // 4)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at rate_per_min, holding at
+    most one minute's worth of tokens.
+    """
+
+    def __init__(self, rate_per_min: float):
+        self.rate_per_s = rate_per_min / 60.0
+        self.capacity = float(rate_per_min)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate_per_s)
+        self.updated = now
+
+    def acquire(self, amount: float = 1):
+        """
+        Blocks until amount tokens are available, then takes them.
+        """
+        amount = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait_s = (amount - self.tokens) / self.rate_per_s
+            time.sleep(wait_s)
+
+    def adjust(self, delta: float):
+        """
+        Corrects the balance once the real cost of a request is known (may go negative).
+        """
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens - delta)
+
+
+def _retry_after_seconds(response):
+    """
+    Parses a Retry-After header (delta-seconds or HTTP-date). Returns None if absent or invalid.
+    """
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class LLMClient:
+    """
+    Reusable chat-completions client: a keep-alive connection pool, timeouts,
+    retries with exponential backoff and full jitter (honoring Retry-After),
+    and client-side requests/min and tokens/min limits.
+
+    A Retry-After longer than max_retry_after_s fails the request with
+    LLMError instead of holding the worker, so the job stays pending in the
+    checkpoint for the next run.
+    """
+
+    def __init__(self, api_url: str = API_URL, api_key: str = None, pool_size: int = 16,
+                 connect_timeout_s: float = 10, read_timeout_s: float = 120,
+                 max_retries: int = 5, backoff_base_s: float = 1.0, backoff_max_s: float = 60,
+                 max_retry_after_s: float = 60,
+                 requests_per_min: float = None, tokens_per_min: float = None,
+                 expected_completion_tokens: int = 1500):
+        self.api_url = api_url
+        self.api_key = api_key
+        self.timeout = (connect_timeout_s, read_timeout_s)
+        self.max_retries = max_retries
+        self.backoff_base_s = backoff_base_s
+        self.backoff_max_s = backoff_max_s
+        self.max_retry_after_s = max_retry_after_s
+        self.expected_completion_tokens = expected_completion_tokens
+        self.request_limiter = TokenBucket(requests_per_min) if requests_per_min else None
+        self.token_limiter = TokenBucket(tokens_per_min) if tokens_per_min else None
+        self.retries = 0
+        self._retries_lock = threading.Lock()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "HTTP-Referer": YOUR_SITE_URL,
+            "X-Title": YOUR_APP_NAME,
+            "Content-Type": "application/json"
+        })
+
+    def _backoff_seconds(self, attempt: int, response=None) -> float:
+        """
+        Raises:
+            LLMError: If the server asks to retry later than max_retry_after_s.
+        """
+        retry_after = _retry_after_seconds(response)
+        if retry_after is not None:
+            if retry_after > self.max_retry_after_s:
+                raise LLMError(f"The API asked to retry after {retry_after:.0f}s, more than the "
+                               f"{self.max_retry_after_s:g}s allowed (llm.http.max_retry_after_s)")
+            return retry_after
+        return random.uniform(0, min(self.backoff_max_s, self.backoff_base_s * (2 ** attempt)))
+
+    def _post(self, payload: dict, stream: bool = False):
+        """
+        POSTs a chat-completions request, retrying throttled and transient failures.
+
+        Returns:
+            A tuple (response, estimated_tokens) for the first successful response.
+
+        Raises:
+            LLMError: If the request fails with a non-retryable error or all retries are exhausted.
+        """
+        # Only the hosted API needs a key; local OpenRouter-compatible servers may not
+        if not self.api_key and self.api_url == API_URL:
+            raise LLMError("OPENROUTER_API_KEY is not set. Please create a .env file.")
+
+        estimated_tokens = sum(estimate_tokens(m["content"]) for m in payload["messages"]) + self.expected_completion_tokens
+        headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+        body = json.dumps(payload)
+
+        for attempt in range(self.max_retries + 1):
+            if self.request_limiter is not None:
+                self.request_limiter.acquire(1)
+            if self.token_limiter is not None:
+                self.token_limiter.acquire(estimated_tokens)
+
+            response = None
+            try:
+                response = self.session.post(self.api_url, headers=headers, data=body,
+                                             timeout=self.timeout, stream=stream)
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    response.raise_for_status()
+                    return response, estimated_tokens
+                error = f"HTTP {response.status_code}"
+                response.close()
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                error = str(e)
+            except requests.exceptions.HTTPError as http_err:
+                raise LLMError(f"API request error: {http_err}") from http_err
+
+            if attempt == self.max_retries:
+                raise LLMError(f"Giving up after {self.max_retries + 1} attempts: {error}")
+            delay = self._backoff_seconds(attempt, response)
+            with self._retries_lock:
+                self.retries += 1
+            metrics.count('retries')
+            print(f"LLM request failed ({error}); retrying in {delay:.1f}s "
+                  f"(attempt {attempt + 2}/{self.max_retries + 1})")
+            time.sleep(delay)
+
+    def _record_usage(self, usage: dict, estimated_tokens: int):
+        if self.token_limiter is not None and usage and usage.get("total_tokens") is not None:
+            self.token_limiter.adjust(usage["total_tokens"] - estimated_tokens)
+
+    def chat(self, payload: dict) -> dict:
+        """
+        Sends one chat-completions request and returns the decoded response JSON.
+
+        Raises:
+            LLMError: If no response could be obtained.
+        """
+        response, estimated_tokens = self._post(payload)
+        try:
+            response_json = response.json()
+        except ValueError as e:
+            raise LLMError(f"Could not decode the API response: {e}") from e
+        self._record_usage(response_json.get("usage"), estimated_tokens)
+        return response_json
+
+    def chat_stream(self, payload: dict):
+        """
+        Sends one streaming (SSE) chat-completions request and yields each
+        decoded event as it arrives. Closing the generator aborts the request.
+
+        Raises:
+            LLMError: If no response could be obtained or the stream breaks off.
+        """
+        response, estimated_tokens = self._post({**payload, "stream": True}, stream=True)
+        usage = None
+        try:
+            for line in response.iter_lines(decode_unicode=True):
+                # Blank lines separate events; lines starting with ':' are keep-alive comments
+                if not line or line.startswith(":") or not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                try:
+                    event = json.loads(data)
+                except ValueError as e:
+                    raise LLMError(f"Could not decode a stream event: {e}") from e
+                if event.get("error"):
+                    raise LLMError(f"The API reported an error mid-stream: {event['error']}")
+                usage = event.get("usage") or usage
+                yield event
+        except (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError) as e:
+            raise LLMError(f"The response stream broke off: {e}") from e
+        finally:
+            response.close()
+            self._record_usage(usage, estimated_tokens)
+
+    def close(self):
+        self.session.close()
+
+
+class LatencyTracker:
+    """
+    Thread-safe window of the most recent latencies of successful calls.
+    """
+
+    def __init__(self, window: int = 200):
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, latency_s: float):
+        with self._lock:
+            self._latencies.append(latency_s)
+
+    def percentile(self, q: float, min_samples: int = 1):
+        """
+        The q-th percentile (nearest rank) of the window, or None with fewer than min_samples latencies.
+        """
+        with self._lock:
+            values = sorted(self._latencies)
+        if not values or len(values) < min_samples:
+            return None
+        return values[min(len(values) - 1, max(0, round(q / 100 * len(values)) - 1))]
+
+
+# Shared client and response cache, set up by configure(). A cache of None means caching is off.
+_client = None
+_response_cache = None
+_bypass_cache = False
+_stream_config = {}
+_models = [MODEL]
+_mode = 'single'
+_hedge_config = {}
+_ensemble_config = {}
+_primary_latency = LatencyTracker()
+_model_stats = {'hedged': 0, 'backup_won': 0, 'ensemble_failures': 0}
+_stats_lock = threading.Lock()
+
+
+def configure(llm_config: dict, base_dir: Path, bypass_cache: bool = False):
+    """
+    Applies the 'llm' section of config.yaml. The LLM_API_URL environment
+    variable takes precedence over llm.api_url.
+
+    Args:
+        llm_config (dict): The 'llm' section of config.yaml (may be empty).
+        base_dir (Path): Directory that relative paths in the config are resolved against.
+        bypass_cache (bool): If True, cached responses are never read; fresh
+                             responses are still written to the cache.
+    """
+    global _client, _response_cache, _bypass_cache, _stream_config, _models, _mode, _hedge_config, \
+        _ensemble_config, _primary_latency
+    cache_config = llm_config.get('cache', {})
+    _stream_config = llm_config.get('stream', {})
+    _models = list(llm_config.get('models') or [MODEL])
+    _mode = llm_config.get('mode') or 'single'
+    _hedge_config = llm_config.get('hedge', {})
+    _ensemble_config = llm_config.get('ensemble', {})
+    if _mode not in MODES:
+        print(f"Warning: unknown llm.mode '{_mode}'; using 'single'.")
+        _mode = 'single'
+    if _mode != 'single' and len(_models) < 2:
+        print(f"Warning: llm.mode '{_mode}' needs at least two models in llm.models; using 'single'.")
+        _mode = 'single'
+    if _mode != 'single' and _stream_config.get('enabled', False):
+        print(f"Note: llm.stream is not used in '{_mode}' mode.")
+    _primary_latency = LatencyTracker(_hedge_config.get('window', 200))
+    http_config = llm_config.get('http', {})
+    rate_config = llm_config.get('rate_limit', {})
+    _bypass_cache = bypass_cache
+
+    if _client is not None:
+        _client.close()
+    _client = LLMClient(
+        api_url=os.getenv(API_URL_ENV_VAR) or llm_config.get('api_url') or API_URL,
+        api_key=OPENROUTER_API_KEY,
+        pool_size=http_config.get('pool_size', 16),
+        connect_timeout_s=http_config.get('connect_timeout_s', 10),
+        read_timeout_s=http_config.get('read_timeout_s', 120),
+        max_retries=http_config.get('max_retries', 5),
+        backoff_base_s=http_config.get('backoff_base_s', 1.0),
+        backoff_max_s=http_config.get('backoff_max_s', 60),
+        max_retry_after_s=http_config.get('max_retry_after_s', 60),
+        requests_per_min=rate_config.get('requests_per_min'),
+        tokens_per_min=rate_config.get('tokens_per_min'),
+        expected_completion_tokens=rate_config.get('expected_completion_tokens', 1500),
+    )
+
+    if _response_cache is not None:
+        _response_cache.close()
+        _response_cache = None
+    if cache_config.get('enabled', False):
+        _response_cache = ResponseCache(
+            base_dir / cache_config.get('path', 'output/llm_cache.sqlite'),
+            max_entries=cache_config.get('max_entries', 50000),
+            max_size_mb=cache_config.get('max_size_mb', 512),
+            max_age_days=cache_config.get('max_age_days', 30),
+        )
+
+
+def get_client() -> LLMClient:
+    """
+    Returns the shared client, creating one with default settings if configure() was never called.
+    """
+    global _client
+    if _client is None:
+        _client = LLMClient(api_url=os.getenv(API_URL_ENV_VAR) or API_URL, api_key=OPENROUTER_API_KEY)
+    return _client
+
+
+def cache_stats():
+    """
+    Returns the response cache counters, or None if caching is off.
+    """
+    return _response_cache.stats() if _response_cache is not None else None
+
+
+def model_stats() -> dict:
+    """
+    Returns the model fan-out counters: the mode, 'hedged' (backup requests
+    sent), 'backup_won' (backups that answered first), 'ensemble_failures'
+    (models that failed in ensemble calls) and the current hedge delay.
+    """
+    with _stats_lock:
+        return {'mode': _mode, 'models': list(_models), **_model_stats, 'hedge_delay_s': _hedge_delay()}
+
+
+def _count(name: str):
+    with _stats_lock:
+        _model_stats[name] += 1
+
+
+def streaming_enabled() -> bool:
+    """
+    Whether call_llm uses the streaming (SSE) endpoint (only with a single model).
+    """
+    return bool(_stream_config.get('enabled', False)) and _mode == 'single'
+
+
+def _cache_params() -> dict:
+    """
+    The parameters that, with the model and prompt, identify a cached response.
+    Responses from an endpoint other than the default API are kept apart.
+    """
+    api_url = get_client().api_url
+    if api_url == API_URL:
+        return SAMPLING_PARAMS
+    return {**SAMPLING_PARAMS, "api_url": api_url}
+
+
+def _request_payload(prompt: str, model: str = None) -> dict:
+    return {
+        "model": model or _models[0],
         "messages": [{"role": "user", "content": prompt}],
-        # 1. Set temperature to its lowest value to minimize randomness.
-        "temperature": 0.0,
-        # 2. Set top_p to its lowest value to disable nucleus sampling.
-        "top_p": 0.0,
-        
-        # 3. Provide a fixed seed to guarantee identical output for the same prompt.
-        "seed": 42
+        **SAMPLING_PARAMS
     }
 
+
+@metrics.timed('llm')
+def stream_llm(prompt: str, on_after_block=None, max_completion_tokens: int = None) -> dict:
+    """
+    Calls the API in streaming mode, parsing the response as it arrives.
+
+    Args:
+        prompt (str): The prompt to send.
+        on_after_block (callable): Called with the parsed After-block changes
+                                   (same format as utils.parse_after_block) as
+                                   soon as the block is complete.
+        max_completion_tokens (int): Abort the generation once the response
+                                     exceeds this many (estimated) tokens.
+                                     Defaults to llm.stream.max_completion_tokens.
+
+    Returns:
+        dict: 'content', 'after_changes', 'ttft_s' (time to first token),
+        'after_block_s' (time until the After block was complete, or None),
+        'total_s', 'aborted' and 'usage'.
+
+    Raises:
+        LLMError: If no response could be obtained.
+    """
+    if max_completion_tokens is None:
+        max_completion_tokens = _stream_config.get('max_completion_tokens')
+    stop_after_block = _stream_config.get('stop_after_block', False)
+    parser = AfterBlockStreamParser()
+    result = {'content': '', 'after_changes': {}, 'ttft_s': None, 'after_block_s': None,
+              'total_s': None, 'aborted': False, 'usage': None}
+    start = time.perf_counter()
+
+    def after_block_done():
+        result['after_block_s'] = time.perf_counter() - start
+        result['after_changes'] = parser.changes
+        if on_after_block is not None:
+            on_after_block(parser.changes)
+
+    cache_key = None
+    if _response_cache is not None:
+        cache_key = make_cache_key(_models[0], prompt, _cache_params())
+        cached = None if _bypass_cache else _response_cache.get(cache_key)
+        if not _bypass_cache:
+            metrics.count('cache_hits' if cached is not None else 'cache_misses', model=_models[0])
+        if cached is not None:
+            result['content'] = cached
+            result['ttft_s'] = time.perf_counter() - start
+            parser.feed(cached)
+            parser.close()
+            if parser.complete:
+                after_block_done()
+            result['total_s'] = time.perf_counter() - start
+            return result
+
+    print("Calling LLM for analysis (streaming)...")
+    pieces = []
+    completion_tokens = 0
+    events = get_client().chat_stream(_request_payload(prompt))
     try:
-        print("Calling LLM for analysis...")
-        response = requests.post("https://openrouter.ai/api/v1/chat/completions", headers=headers, data=json.dumps(data))
-        response.raise_for_status()
-        
-        response_json = response.json()
-        content = response_json.get("choices", [{}])[0].get("message", {}).get("content", "")
-        return content
-
-    except requests.exceptions.HTTPError as http_err:
-        print(f"API request error: {http_err}")
-        return "Error: Could not get a response from the API."
-    except Exception as e:
-        print(f"An unexpected error occurred in call_llm: {e}")
-        return "Error: An unexpected error occurred."
\ No newline at end of file
+        for event in events:
+            if event.get("usage"):
+                result['usage'] = event["usage"]
+            delta = (event.get("choices") or [{}])[0].get("delta", {}).get("content") or ""
+            if not delta:
+                continue
+            if result['ttft_s'] is None:
+                result['ttft_s'] = time.perf_counter() - start
+            pieces.append(delta)
+            completion_tokens += estimate_tokens(delta)
+            if parser.feed(delta):
+                after_block_done()
+                if stop_after_block:
+                    result['aborted'] = True
+                    break
+            if max_completion_tokens and completion_tokens > max_completion_tokens:
+                print(f"Aborting generation: token budget of {max_completion_tokens} exceeded.")
+                result['aborted'] = True
+                break
+    finally:
+        events.close()
+
+    result['content'] = "".join(pieces)
+    metrics.record_usage(result['usage'], _models[0])
+    if not parser.complete and parser.close():
+        after_block_done()
+    result['total_s'] = time.perf_counter() - start
+    if not result['content']:
+        raise LLMError("The API returned an empty response.")
+    # A generation that was cut short is not a reusable answer
+    if cache_key is not None and not result['aborted']:
+        _response_cache.put(cache_key, _models[0], result['content'])
+    return result
+
+
+def _cached(prompt: str, model: str):
+    """
+    The cached response of a model to a prompt, or None (also when the cache is off or bypassed).
+    """
+    if _response_cache is None or _bypass_cache:
+        return None
+    cached = _response_cache.get(make_cache_key(model, prompt, _cache_params()))
+    metrics.count('cache_hits' if cached is not None else 'cache_misses', model=model)
+    return cached
+
+
+def _complete(prompt: str, model: str) -> str:
+    """
+    Sends one (non-streaming) request to a model and caches the response.
+
+    Raises:
+        LLMError: If no response could be obtained.
+    """
+    response_json = get_client().chat(_request_payload(prompt, model))
+    metrics.record_usage(response_json.get("usage"), model)
+    content = response_json.get("choices", [{}])[0].get("message", {}).get("content", "")
+    if not content:
+        raise LLMError(f"The API returned an empty response ({model}).")
+    if _response_cache is not None:
+        _response_cache.put(make_cache_key(model, prompt, _cache_params()), model, content)
+    return content
+
+
+def _hedge_delay() -> float:
+    """
+    How long the primary model gets before the backup request is sent: the
+    llm.hedge.percentile of its recent latencies, or llm.hedge.initial_delay_s
+    until llm.hedge.min_samples calls have been timed.
+    """
+    delay = _primary_latency.percentile(_hedge_config.get('percentile', 90), _hedge_config.get('min_samples', 20))
+    return delay if delay is not None else _hedge_config.get('initial_delay_s', 30)
+
+
+def _call_hedged(prompt: str) -> str:
+    """
+    Sends the prompt to the first model and, if it has not answered within the
+    hedge delay (or fails), to the second model as well. The first successful
+    answer wins; the slower request still completes in the background and
+    fills the cache.
+    """
+    primary, backup = _models[0], _models[1]
+    for model in (primary, backup):
+        cached = _cached(prompt, model)
+        if cached is not None:
+            return cached
+
+    answers = queue.Queue()
+
+    def request(model: str):
+        start = time.perf_counter()
+        try:
+            content = _complete(prompt, model)
+        except LLMError as e:
+            answers.put((model, None, e))
+            return
+        if model == primary:
+            _primary_latency.add(time.perf_counter() - start)
+        answers.put((model, content, None))
+
+    def send(model: str):
+        threading.Thread(target=metrics.bind(request), args=(model,), daemon=True).start()
+
+    print("Calling LLM for analysis...")
+    send(primary)
+    pending, hedged, errors = 1, False, []
+    while pending:
+        try:
+            model, content, error = answers.get(timeout=None if hedged else _hedge_delay())
+        except queue.Empty:
+            pass
+        else:
+            pending -= 1
+            if content is not None:
+                if model == backup:
+                    _count('backup_won')
+                return content
+            errors.append(f"{model}: {error}")
+        if not hedged:
+            # The primary is slow or failed: race the backup against it
+            hedged, pending = True, pending + 1
+            _count('hedged')
+            send(backup)
+    raise LLMError("; ".join(errors))
+
+
+def _call_ensemble(prompt: str) -> str:
+    """
+    Sends the prompt to every model concurrently and merges their After
+    blocks (see consensus.merge_responses). Models that fail are left out of
+    the vote.
+    """
+    responses = {model: _cached(prompt, model) for model in _models}
+    missing = [model for model, content in responses.items() if content is None]
+    if missing:
+        print(f"Calling {len(missing)} LLM(s) for analysis...")
+        with ThreadPoolExecutor(max_workers=len(missing)) as executor:
+            futures = {model: executor.submit(metrics.bind(_complete), prompt, model) for model in missing}
+        errors = []
+        for model, future in futures.items():
+            try:
+                responses[model] = future.result()
+            except LLMError as e:
+                _count('ensemble_failures')
+                print(f"Ensemble model {model} failed: {e}")
+                errors.append(f"{model}: {e}")
+                del responses[model]
+        if not responses:
+            raise LLMError("All ensemble models failed: " + "; ".join(errors))
+    return merge_responses(responses, _ensemble_config.get('min_votes'), _ensemble_config.get('weights'))
+
+
+@metrics.timed('llm')
+def call_llm(prompt: str) -> str:
+    """
+    Calls the OpenRouter API with the given prompt.
+
+    Responses are served from the on-disk cache when one is configured, since
+    the fixed sampling parameters make the output deterministic for a prompt.
+    When llm.stream.enabled is set, the streaming endpoint is used. In
+    llm.mode 'hedged' a slow first model is raced against the second one,
+    and in 'ensemble' mode all llm.models are asked and their suggestions merged.
+
+    Raises:
+        LLMError: If no response could be obtained.
+    """
+    if streaming_enabled():
+        return stream_llm(prompt)['content']
+    if _mode == 'hedged':
+        return _call_hedged(prompt)
+    if _mode == 'ensemble':
+        return _call_ensemble(prompt)
+
+    cached = _cached(prompt, _models[0])
+    if cached is not None:
+        return cached
+    print("Calling LLM for analysis...")
+    return _complete(prompt, _models[0])
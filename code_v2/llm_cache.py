@@ -0,0 +1,122 @@
+# llm_cache.py
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+
+def make_cache_key(model: str, prompt: str, params: dict) -> str:
+    """
+    Returns the content address of an LLM request: a SHA-256 over the model,
+    the prompt and the sampling parameters.
+    """
+    payload = json.dumps({'model': model, 'prompt': prompt, 'params': params}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """
+    On-disk LLM response cache backed by a single SQLite file.
+
+    Entries expire after max_age_days. When the cache grows past max_entries or
+    max_size_mb, the least recently used entries are evicted first.
+    """
+
+    # Run the size-based eviction every this many writes.
+    EVICT_EVERY = 100
+
+    def __init__(self, path: Path, max_entries: int = 50000, max_size_mb: float = 512, max_age_days: float = 30):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        self.max_age_s = max_age_days * 24 * 3600
+        self.hits = 0
+        self.misses = 0
+        self._puts = 0
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " model TEXT NOT NULL,"
+            " response TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses(last_access)")
+        self._conn.commit()
+        self.evict()
+
+    def get(self, key: str):
+        """
+        Returns the cached response for key, or None on a miss.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.max_age_s:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, model: str, response: str):
+        """
+        Stores a response, replacing any previous entry for the same key.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, response, len(response.encode('utf-8')), now, now)
+            )
+            self._conn.commit()
+            self._puts += 1
+            run_eviction = self._puts % self.EVICT_EVERY == 0
+        if run_eviction:
+            self.evict()
+
+    def evict(self):
+        """
+        Drops expired entries, then the least recently used ones until the
+        cache is within its entry and size limits.
+        """
+        with self._lock:
+            self._conn.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.max_age_s,))
+            count, total_bytes = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+            if count > self.max_entries or total_bytes > self.max_bytes:
+                keep_keys = []
+                kept_bytes = 0
+                for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY last_access DESC"):
+                    if len(keep_keys) >= self.max_entries or kept_bytes + size > self.max_bytes:
+                        break
+                    keep_keys.append(key)
+                    kept_bytes += size
+                self._conn.execute("CREATE TEMP TABLE IF NOT EXISTS keep_keys (key TEXT PRIMARY KEY)")
+                self._conn.execute("DELETE FROM keep_keys")
+                self._conn.executemany("INSERT INTO keep_keys (key) VALUES (?)", ((k,) for k in keep_keys))
+                self._conn.execute("DELETE FROM responses WHERE key NOT IN (SELECT key FROM keep_keys)")
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        """
+        Returns the hit/miss counters and the current entry count and size.
+        """
+        with self._lock:
+            count, total_bytes = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {'hits': self.hits, 'misses': self.misses, 'entries': count, 'size_bytes': total_bytes}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,160 +1,530 @@
 # main.py (Definitive Final Version)
 import yaml
 import argparse
-from pathlib import Path
 import pandas as pd
+from pathlib import Path
+
+import metrics
+from data_loader import load_all_data, load_job_store, load_ior_config, load_sorted_jobs, IOR_CONFIG_FILE
+from llm_api import call_llm, configure as configure_llm, cache_stats, model_stats, LLMError
+from agent import build_job_prompt, build_diagnosis_summary, format_config_string
+from batch import run_batch, write_suggestion_csvs
+from diagnosis import DiagnosisEngine
+from prompt_compiler import PromptCompiler
+from surrogate import KNNSurrogate
+from search import ConfigSearch, format_changes
+from config_index import ConfigIndex, describe_match
+from checkpoint import Checkpoint, job_fingerprints, input_hash
+from results_store import ResultsStore, read_suggestion
+from clustering import CLUSTER_METHODS, signature_clusters, kmeans_clusters, write_cluster_manifest
+from utils import extract_pipeline_data, discover_parameter_options, save_suggestion
+
+
+def run_fleet(args, config, data_dir: Path, output_dir: Path, pipelines: list, results=None):
+    """
+    Fleet mode: analyzes the top-N (or all) worst jobs in one run, under each of the given pipelines.
+    """
+    store = load_store(config, data_dir)
+    if store is None:
+        print("Halting execution due to data loading failure.")
+        return
+    ior_config_df = store.ior_config_df
+
+    jobs = store.worst(None if args.all else args.top)
+    print(f"Data loaded successfully. Selected {len(jobs)} jobs for pipeline(s): {', '.join(pipelines)}")
+
+    parameter_options = discover_parameter_options(ior_config_df)
+    diagnoses = DiagnosisEngine(store)
+    compiler = make_prompt_compiler(config, parameter_options)
+    if jobs:
+        for pipeline in pipelines:
+            report_prompt_sections(compiler, pipeline, jobs[0].raw, jobs[0].shap, jobs[0].config,
+                                   diagnosis_summary=diagnoses.summary(pipeline, jobs[0].position))
+
+    cluster_method = args.cluster or config.get('clustering', {}).get('method')
+    fingerprints = job_fingerprints(store.raw_df, store.shap_df, store.config_df)
+    tasks = []
+    for pipeline in pipelines:
+        if cluster_method:
+            clusters = cluster_fleet(config, cluster_method, jobs, store, diagnoses, pipeline)
+            manifest = write_cluster_manifest(clusters, pipeline, output_dir, cluster_method)
+            print(f"Clustering ({cluster_method}) for {pipeline}: {len(jobs)} jobs -> {len(clusters)} LLM calls "
+                  f"(assignments saved to: {manifest})")
+        else:
+            clusters = [{'representative': job, 'members': [job]} for job in jobs]
+
+        for cluster in clusters:
+            job = cluster['representative']
+            with metrics.job(job.test_id, pipeline):
+                prompt = build_job_prompt(pipeline, job.raw, job.shap, job.config, parameter_options,
+                                          diagnosis_summary=diagnoses.summary(pipeline, job.position),
+                                          compiler=compiler)
+            tasks.append({
+                'test_id': job.test_id,
+                'pipeline': pipeline,
+                'prompt': prompt,
+                'original_config': job.original_config,
+                'members': [{'test_id': member.test_id, 'original_config': member.original_config}
+                            for member in cluster['members'] if member is not job],
+                'input_hash': input_hash(pipeline, [(member.test_id, fingerprints[member.position])
+                                                    for member in cluster['members']]),
+            })
+
+    checkpoint = make_checkpoint(config, output_dir, results)
+    tasks = skip_checkpointed(checkpoint, tasks, output_dir, args.force)
+    if not tasks:
+        print("Every selected job is already done with unchanged inputs; nothing to do (use --force to redo them).")
+        if checkpoint is not None:
+            checkpoint.close()
+        return
+
+    surrogate = make_surrogate(config, store.config_df, store.tags)
+    config_index = make_config_index(config, ior_config_df, dict(zip(store.test_ids, store.tags)))
+    concurrency = args.concurrency or config.get('batch', {}).get('concurrency', 8)
+    try:
+        run_batch(tasks, output_dir, data_dir / IOR_CONFIG_FILE, concurrency=concurrency, ior_config_df=ior_config_df,
+                  surrogate=surrogate, min_speedup=config.get('surrogate', {}).get('min_speedup'),
+                  config_index=config_index, checkpoint=checkpoint, store=results,
+                  config_positions=store.ior_config_positions)
+    finally:
+        if checkpoint is not None:
+            checkpoint.close()
+
+
+def cluster_fleet(config, method: str, jobs: list, store, diagnoses, pipeline: str) -> list:
+    """
+    Groups the fleet's jobs so that one LLM call is made per cluster (see clustering.py).
+    """
+    cluster_config = config.get('clustering', {})
+    if method == 'signature':
+        return signature_clusters(jobs, diagnoses, pipeline,
+                                  include_config=cluster_config.get('signature_include_config', False))
+    return kmeans_clusters(jobs, store, pipeline, n_clusters=cluster_config.get('n_clusters'),
+                           include_config=cluster_config.get('kmeans_include_config', True),
+                           seed=cluster_config.get('seed', 0))
+
+
+def run_all_pipelines(args, config, data_dir: Path, output_dir: Path, pipelines: list, results=None):
+    """
+    Runs every pipeline for the worst job in one pass: the data is loaded once,
+    the LLM calls are issued concurrently, and the CSV outputs are generated
+    from the fresh suggestions.
+    """
+    use_data_cache = config.get('data', {}).get('use_cache', True)
+    worst_job_raw, worst_job_shap, worst_job_config, worst_test_id = load_all_data(data_dir, use_cache=use_data_cache)
+    if worst_test_id is None:
+        print("Halting execution due to data loading failure.")
+        return
+    ior_config_df = load_ior_config(data_dir, use_cache=use_data_cache)
+    parameter_options = discover_parameter_options(ior_config_df)
+    original_config = worst_job_config.drop(columns=['config_id', 'testFile'], errors='ignore').iloc[0].to_dict()
+    compiler = make_prompt_compiler(config, parameter_options)
+    for pipeline in pipelines:
+        report_prompt_sections(compiler, pipeline, worst_job_raw, worst_job_shap, worst_job_config)
+    fingerprint = job_fingerprints(worst_job_raw, worst_job_shap, worst_job_config)[0]
+
+    tasks = []
+    for pipeline in pipelines:
+        with metrics.job(worst_test_id, pipeline):
+            prompt = build_job_prompt(pipeline, worst_job_raw, worst_job_shap, worst_job_config, parameter_options,
+                                      compiler=compiler)
+        tasks.append({
+            'test_id': worst_test_id,
+            'pipeline': pipeline,
+            'prompt': prompt,
+            'original_config': original_config,
+            'input_hash': input_hash(pipeline, [(worst_test_id, fingerprint)]),
+        })
+
+    checkpoint = make_checkpoint(config, output_dir, results)
+    tasks = skip_checkpointed(checkpoint, tasks, output_dir, args.force)
+    if not tasks:
+        print("Every pipeline is already done for this job with unchanged inputs; nothing to do (use --force to redo them).")
+        if checkpoint is not None:
+            checkpoint.close()
+        return
+
+    tags = load_performance_tags(config, data_dir, use_data_cache)
+    surrogate = make_surrogate_from_tags(config, ior_config_df, tags)
+    config_index = make_config_index(config, ior_config_df, tags)
+    try:
+        run_batch(tasks, output_dir, data_dir / IOR_CONFIG_FILE, concurrency=len(tasks), ior_config_df=ior_config_df,
+                  surrogate=surrogate, min_speedup=config.get('surrogate', {}).get('min_speedup'),
+                  config_index=config_index, checkpoint=checkpoint, store=results)
+    finally:
+        if checkpoint is not None:
+            checkpoint.close()
+
+
+def run_search(args, config, data_dir: Path, output_dir: Path, pipelines: list, results=None):
+    """
+    Non-LLM baseline: searches the parameter grid for each selected job's best
+    configurations under the surrogate model, and writes them next to any
+    existing LLM suggestions for comparison in output/search_baseline_<test_id>.csv.
+    """
+    store = load_store(config, data_dir)
+    if store is None:
+        print("Halting execution due to data loading failure.")
+        return
+    # Without --top/--all, the worst job of the single-job mode (third row of the sorted table)
+    jobs = store.worst(None if args.all else args.top) if (args.top is not None or args.all) else store.worst(3)[2:]
+    parameter_options = discover_parameter_options(store.ior_config_df)
+
+    search_config = config.get('search', {})
+    surrogate = make_surrogate(config, store.config_df, store.tags, required=True)
+    config_index = make_config_index(config, store.ior_config_df, dict(zip(store.test_ids, store.tags)))
+    engine = ConfigSearch(surrogate, parameter_options,
+                          workers=search_config.get('workers'),
+                          max_exhaustive=search_config.get('max_exhaustive', 5_000_000),
+                          beam_width=search_config.get('beam_width', 64))
+    mode = 'exhaustive' if engine.exhaustive else f"beam search (width {engine.beam_width})"
+    print(f"Searching {engine.grid_size} candidate configurations ({mode}) for {len(jobs)} job(s)...")
+
+    top_k = search_config.get('top_k', 5)
+    max_changes = search_config.get('max_changes')
+    for job in jobs:
+        original_config = job.original_config
+        rows = [{'Rank': rank, 'Source': 'search', 'Changes': result['changes'],
+                 'Predicted Speedup': round(result['predicted_speedup'], 3)}
+                for rank, result in enumerate(engine.best_k(original_config, top_k, max_changes), start=1)]
+
+        # The LLM's Stage 3 recommendation of every pipeline that has been run for this job
+        for pipeline in pipelines:
+            suggestion = read_suggestion(output_dir, pipeline, job.test_id, results)
+            if suggestion is None:
+                continue
+            _, after_changes = extract_pipeline_data(suggestion)
+            scores = surrogate.score_suggestions(original_config, after_changes)
+            changes = {param: details['value'] for param, details in after_changes.items()
+                       if param in surrogate.encoder.parameters
+                       and str(details['value']) != str(original_config.get(param))}
+            rows.append({'Rank': 'N/A', 'Source': f'llm:{pipeline}', 'Changes': changes,
+                         'Predicted Speedup': round(scores['speedup'], 3)})
+
+        # Ground truth: the measured speedup of the same (or the nearest profiled) configuration
+        for row in rows:
+            if config_index is not None:
+                check = config_index.check_suggestion(original_config, {p: {'value': v} for p, v in row['Changes'].items()})
+                row['Observed Speedup'] = round(check['observed_speedup'], 3) if check else 'N/A'
+                row['Observed Match'] = describe_match(check['suggested']) if check else 'N/A'
+            row['Changes'] = format_changes(row['Changes'])
+
+        output_file = output_dir / f"search_baseline_{job.test_id}.csv"
+        pd.DataFrame(rows).to_csv(output_file, index=False)
+        print(f"{job.test_id}: best predicted speedup {rows[0]['Predicted Speedup']}x, saved to: {output_file}")
+
+
+def make_surrogate(config, config_df, tags, required: bool = False):
+    """
+    Trains the surrogate performance model, or returns None when surrogate.enabled
+    is off (unless required, e.g. for the search baseline).
+
+    A model whose holdout R^2 is not above surrogate.min_r2 predicts no better
+    than the mean, so it is not used: no predicted speedup columns are written
+    and min_speedup filters nothing. The search baseline still gets it, with a warning.
+    """
+    surrogate_config = config.get('surrogate', {})
+    if not required and not surrogate_config.get('enabled', False):
+        return None
+    surrogate = KNNSurrogate(config_df, tags, k=surrogate_config.get('k', 20))
+    r2 = surrogate.holdout_r2()
+    min_r2 = surrogate_config.get('min_r2') or 0.0
+    print(f"Surrogate model trained on {len(surrogate.targets)} configurations "
+          f"(k={surrogate.k}, holdout R^2 {r2:.2f}).")
+    if r2 <= min_r2:
+        if required:
+            print(f"Warning: the surrogate model's holdout R^2 ({r2:.2f}) is not above {min_r2}; "
+                  f"its predicted speedups are not better than chance.")
+            return surrogate
+        print(f"Warning: the surrogate model's holdout R^2 ({r2:.2f}) is not above {min_r2}; "
+              f"suggestions are not scored or filtered by it.")
+        return None
+    return surrogate
+
+
+def load_performance_tags(config, data_dir: Path, use_data_cache: bool):
+    """
+    Loads test_id -> measured tag for the paths that do not load a JobStore.
+
+    Returns:
+        dict, or None if neither the surrogate nor the configuration index is
+        enabled, or on error.
+    """
+    if not (config.get('surrogate', {}).get('enabled', False) or config.get('config_index', {}).get('enabled', True)):
+        return None
+    sorted_df = load_sorted_jobs(data_dir, use_cache=use_data_cache)
+    if sorted_df is None:
+        print("Warning: could not load the performance tags; suggestions are not scored.")
+        return None
+    return dict(zip(sorted_df['test_id'], sorted_df['tag']))
+
 
-from data_loader import load_all_data
-from llm_api import call_llm
-from agent import create_prompt
-from utils import generate_suggestions_csv, extract_pipeline_data, apply_llm_suggestions_to_csv # <--- ADD apply_llm_suggestions_to_csv
+def make_surrogate_from_tags(config, ior_config_df, tags: dict):
+    """
+    Like make_surrogate(), training on the profiled rows of the full configuration table.
+    """
+    if tags is None:
+        return None
+    # The column name in ior_configurations(in).csv is 'testFile'
+    profiled = ior_config_df[ior_config_df['testFile'].isin(list(tags))]
+    return make_surrogate(config, profiled, profiled['testFile'].map(tags))
+
+
+def make_config_index(config, ior_config_df, tags: dict):
+    """
+    Builds the configuration -> measured performance index, or returns None
+    when config_index.enabled is off.
+    """
+    if tags is None or not config.get('config_index', {}).get('enabled', True):
+        return None
+    config_index = ConfigIndex(ior_config_df, tags)
+    print(f"Configuration index: {len(ior_config_df)} runs, {len(config_index.measured_files)} with measured performance.")
+    return config_index
+
+
+def load_store(config, data_dir: Path):
+    """
+    Loads the JobStore with the data settings of config.yaml.
+    """
+    data_config = config.get('data', {})
+    return load_job_store(data_dir, use_cache=data_config.get('use_cache', True),
+                          compact=data_config.get('compact_types', True),
+                          float32_rtol=data_config.get('float32_rtol') or 0.0)
+
+
+def make_checkpoint(config, output_dir: Path, results=None):
+    """
+    Opens the processed-jobs checkpoint in the output directory, or returns
+    None when checkpoint.enabled is off.
+    """
+    checkpoint_config = config.get('checkpoint', {})
+    if not checkpoint_config.get('enabled', True):
+        return None
+    return Checkpoint(output_dir / checkpoint_config.get('file', 'checkpoint.jsonl'), store=results)
+
+
+def make_results_store(config, output_dir: Path):
+    """
+    Opens the consolidated results store in the output directory, or returns
+    None when results.store is off.
+    """
+    results_config = config.get('results', {})
+    if not results_config.get('store', True):
+        return None
+    return ResultsStore(output_dir / results_config.get('file', 'results.sqlite'),
+                        batch_size=results_config.get('batch_size', 200),
+                        export_files=results_config.get('export_files', True))
+
+
+def skip_checkpointed(checkpoint, tasks: list, output_dir: Path, force: bool = False) -> list:
+    """
+    Drops the tasks the checkpoint marks as done with unchanged inputs, unless force.
+    """
+    if checkpoint is None or force:
+        return tasks
+    pending = checkpoint.pending(tasks, output_dir)
+    for task in tasks:
+        if task not in pending:
+            metrics.finish_job(task['test_id'], task['pipeline'], 'skipped')
+    if len(pending) < len(tasks):
+        print(f"Checkpoint: skipping {len(tasks) - len(pending)} of {len(tasks)} LLM calls already done "
+              f"with unchanged inputs (use --force to redo them).")
+    return pending
+
+
+def make_prompt_compiler(config, parameter_options: dict):
+    """
+    Creates the run's PromptCompiler, or returns None when prompt.compiler is disabled.
+    """
+    prompt_config = config.get('prompt', {})
+    if not prompt_config.get('compiler', True):
+        return None
+    return PromptCompiler(parameter_options, token_budget=prompt_config.get('token_budget'))
+
+
+def report_prompt_sections(compiler, pipeline: str, job_raw, job_shap, job_config, diagnosis_summary: str = None):
+    """
+    Prints the estimated token count of each section of one job's compiled prompt.
+    """
+    if compiler is None:
+        return
+    if diagnosis_summary is None:
+        diagnosis_summary = build_diagnosis_summary(pipeline, job_raw, job_shap)
+    _, report = compiler.compile_with_report(pipeline, diagnosis_summary, format_config_string(job_config))
+    print(f"Prompt sections ({pipeline}, ~tokens): role/context {report['role_context']}, "
+          f"levers {report['levers']}, framework {report['framework']}, "
+          f"diagnosis {report['diagnosis']}, config {report['config']} | "
+          f"cacheable prefix {report['prefix']} of {report['total']}"
+          + (f" (compaction level {report['compaction_level']})" if report['compaction_level'] else ""))
+
+
+def report_cache_stats():
+    stats = cache_stats()
+    if stats is not None:
+        print(f"LLM response cache: {stats['hits']} hits, {stats['misses']} misses "
+              f"({stats['entries']} entries, {stats['size_bytes'] / 1024:.1f} KiB on disk)")
+    stats = model_stats()
+    if stats['mode'] == 'hedged':
+        print(f"Hedged calls: {stats['hedged']} backup request(s) sent, {stats['backup_won']} answered first "
+              f"(current hedge delay {stats['hedge_delay_s']:.1f}s)")
+    elif stats['mode'] == 'ensemble' and stats['ensemble_failures']:
+        print(f"Ensemble: {stats['ensemble_failures']} model call(s) failed and were left out of the vote")
+
+
+def run_single_job(args, config, data_dir: Path, output_dir: Path, results=None):
+    """
+    Runs one pipeline for the worst job: writes the CSV outputs from the
+    suggestion files of the previous runs, then gets and saves a fresh suggestion.
+    With a results store, the store gets the fresh suggestion's tables, so
+    its analysis, comparison and modified configuration rows always belong
+    to the same response.
+    """
+    # --- Load Data ---
+    use_data_cache = config.get('data', {}).get('use_cache', True)
+    data = load_all_data(data_dir, use_cache=use_data_cache)
+    if data[-1] is None:
+        print("Halting execution due to data loading failure.")
+        return
+    worst_job_raw, worst_job_shap, worst_job_config, worst_test_id = data
+
+
+
+    with metrics.job(worst_test_id, args.pipeline):
+        # This dictionary holds the baseline configuration for the worst job
+        original_config = worst_job_config.drop(columns=['config_id', 'testFile'], errors='ignore').iloc[0].to_dict()
+
+        darshan_shap_suggestion_content = read_suggestion(output_dir, 'darshan_shap', worst_test_id, results)
+        raw_darshan_suggestion_content = read_suggestion(output_dir, 'raw_darshan', worst_test_id, results)
+        shap_only_suggestion_content = read_suggestion(output_dir, 'shap_only', worst_test_id, results)
+        missing = [pipeline for pipeline, content in (('darshan_shap', darshan_shap_suggestion_content),
+                                                       ('raw_darshan', raw_darshan_suggestion_content),
+                                                       ('shap_only', shap_only_suggestion_content)) if content is None]
+        if missing:
+            print(f"Error: Could not find LLM suggestion output file required for CSV generation: "
+                  f"{', '.join(f'suggestion_{pipeline}_{worst_test_id}.txt' for pipeline in missing)}")
+            print(f"Please ensure you have run main.py for 'darshan_shap', 'raw_darshan', and 'shap_only' pipelines "
+                  f"for test_id '{worst_test_id}' to generate these files in the '{output_dir}' directory.")
+            return # Exit if files are not found # Exit if files are not found, as CSV generation/application cannot proceed
+
+        # Parse the suggestion content for each pipeline
+        with metrics.span('parse'):
+            _, darshan_shap_after = extract_pipeline_data(darshan_shap_suggestion_content)
+            _, raw_darshan_after = extract_pipeline_data(raw_darshan_suggestion_content)
+            _, shap_only_after = extract_pipeline_data(shap_only_suggestion_content)
+        after_by_pipeline = {
+            "raw_darshan": raw_darshan_after,
+            "darshan_shap": darshan_shap_after,
+            "shap_only": shap_only_after,
+        }
+
+        # --- Automated Discovery of Optimization Levers ---
+        original_ior_config_csv_path = data_dir / IOR_CONFIG_FILE # Path to your original config CSV
+        ior_config_df = load_ior_config(data_dir, use_cache=use_data_cache)
+        parameter_options = discover_parameter_options(ior_config_df)
+
+        # --- Build the prompt for the selected pipeline ---
+        compiler = make_prompt_compiler(config, parameter_options)
+        report_prompt_sections(compiler, args.pipeline, worst_job_raw, worst_job_shap, worst_job_config)
+        prompt = build_job_prompt(args.pipeline, worst_job_raw, worst_job_shap, worst_job_config, parameter_options,
+                                  compiler=compiler)
+
+        # --- Create CSVs for the selected pipeline only ---
+        pipeline_after = after_by_pipeline[args.pipeline]
+        tags = load_performance_tags(config, data_dir, use_data_cache)
+        surrogate = make_surrogate_from_tags(config, ior_config_df, tags)
+        config_index = make_config_index(config, ior_config_df, tags)
+        min_speedup = config.get('surrogate', {}).get('min_speedup')
+        if results is None or results.export_files:
+            write_suggestion_csvs(original_config, pipeline_after, args.pipeline, worst_test_id, output_dir,
+                                  original_ior_config_csv_path, ior_config_df=ior_config_df,
+                                  surrogate=surrogate, min_speedup=min_speedup, config_index=config_index)
+
+        # --- Get LLM Suggestion and Save ---
+        try:
+            suggestion = call_llm(prompt)
+        except LLMError as e:
+            print(f"Error: Could not get a response from the API: {e}")
+            print("No suggestion file was written.")
+            metrics.finish_job(worst_test_id, args.pipeline, 'failed', error=str(e))
+            return
+        speedup = None
+        if results is not None:
+            with metrics.span('parse'):
+                _, suggestion_after = extract_pipeline_data(suggestion)
+            speedup = write_suggestion_csvs(original_config, suggestion_after, args.pipeline, worst_test_id,
+                                            output_dir, original_ior_config_csv_path, ior_config_df=ior_config_df,
+                                            surrogate=surrogate, min_speedup=min_speedup,
+                                            config_index=config_index, store=results, write_files=False)
+        with metrics.span('save'):
+            if results is not None:
+                results.add_analysis(worst_test_id, args.pipeline, prompt, suggestion, predicted_speedup=speedup)
+                results.flush()
+                output_file = results.path
+            if results is None or results.export_files:
+                output_file = save_suggestion(output_dir, args.pipeline, worst_test_id, prompt, suggestion)
+        metrics.finish_job(worst_test_id, args.pipeline, 'done')
+        print(f"\nSuccess! Suggestion saved to: {output_file}")
+        report_cache_stats()
 
 
 def main():
-    # --- Expert Knowledge Base: The Strategy & Impact Glossary ---
-    feature_glossary = {
-        'api': 'Controls the I/O interface. Changing from POSIX to MPIIO can improve performance for highly parallel jobs.',
-        'transferSize': 'The size of each I/O operation. Larger values can increase throughput for sequential access but may use more memory.',
-        'blockSize': 'The total size of a contiguous data block. Larger values are generally better for large files and sequential access.',
-        'segmentCount': 'The number of data segments. Higher values can increase parallelism but also metadata overhead.',
-        'numTasks': 'The number of concurrent processes. Higher values increase parallelism but can lead to contention.',
-        'filePerProc': 'Using one file per process (1) can reduce contention but creates many small files. Sharing files (0) is the opposite.',
-        'useStridedDatatype': 'Enables non-contiguous access. Useful for specific data patterns but can be less performant than simple sequential I/O.',
-        'setAlignment': 'Aligns data in memory. Matching this to the filesystem block size is critical for performance.',
-        'useO_DIRECT': 'Bypasses the OS cache (1). This can be faster for very large transfers but slower for repeated access to the same data.',
-        'fsync': 'Forces writes to disk (1). This is safe but very slow. Disabling it (0) is much faster but risks data loss on a crash.',
-        'LUSTRE_STRIPE_SIZE': 'The size of a data chunk on a Lustre OST. This should be tuned to match the application\'s I/O size.',
-        'LUSTRE_STRIPE_WIDTH': 'The number of storage servers to stripe data across. A higher width increases parallelism but also network overhead.'
-    }
-    
     # --- Setup and Config ---
     base_dir = Path(__file__).resolve().parent
     data_dir = base_dir / 'data_v2'
-    output_dir = base_dir / 'output'
-    output_dir.mkdir(exist_ok=True)
-    with open(base_dir / 'config.yaml', 'r') as f:
+
+    # --config and --output-dir are read before the rest, since the pipeline choices come from the config
+    path_parser = argparse.ArgumentParser(add_help=False)
+    path_parser.add_argument('--config', type=Path, default=base_dir / 'config.yaml',
+                             help="Path to the configuration file (default: config.yaml next to main.py).")
+    path_parser.add_argument('--output-dir', type=Path, default=base_dir / 'output',
+                             help="Directory for suggestions and CSV outputs (default: output/ next to main.py).")
+    paths, _ = path_parser.parse_known_args()
+    output_dir = paths.output_dir
+    output_dir.mkdir(parents=True, exist_ok=True)
+    with open(paths.config, 'r') as f:
         config = yaml.safe_load(f)
     pipeline_choices = [p['type'] for p in config['pipelines']]
-    parser = argparse.ArgumentParser(description="HPC I/O Performance Analyzer")
-    parser.add_argument('pipeline', choices=pipeline_choices, help="The analysis pipeline to run.")
+    parser = argparse.ArgumentParser(description="HPC I/O Performance Analyzer", parents=[path_parser])
+    parser.add_argument('pipeline', choices=pipeline_choices + ['all', 'search'],
+                        help="The analysis pipeline to run, 'all' to run every pipeline in one pass, "
+                             "or 'search' for the non-LLM parameter search baseline.")
+    fleet = parser.add_mutually_exclusive_group()
+    fleet.add_argument('--top', type=int, metavar='N', help="Fleet mode: analyze the N worst-performing jobs.")
+    fleet.add_argument('--all', action='store_true', help="Fleet mode: analyze every job.")
+    parser.add_argument('--cluster', choices=CLUSTER_METHODS,
+                        help="Fleet mode: one LLM call per cluster of similar jobs (default: clustering.method in config.yaml).")
+    parser.add_argument('--concurrency', type=int, help="Maximum concurrent LLM calls in fleet mode (default: batch.concurrency in config.yaml).")
+    parser.add_argument('--force', action='store_true',
+                        help="Fleet mode and 'all': redo jobs the checkpoint marks as done with unchanged inputs.")
+    parser.add_argument('--no-cache', action='store_true', help="Bypass the LLM response cache (fresh responses are still stored).")
     args = parser.parse_args()
     print(f"Starting analysis for pipeline: {args.pipeline}")
+    configure_llm(config.get('llm', {}), base_dir, bypass_cache=args.no_cache)
+    metrics.configure(config.get('metrics', {}), output_dir, run_info={
+        'pipeline': args.pipeline, 'fleet': str(args.top is not None or args.all).lower()})
 
-    # --- Load Data ---
-    data = load_all_data(data_dir)
-    if data[-1] is None:
-        print("Halting execution due to data loading failure.")
-        return
-    worst_job_raw, worst_job_shap, worst_job_config, worst_test_id = data
-
+    results = make_results_store(config, output_dir)
 
+    try:
+        if args.pipeline == 'search':
+            run_search(args, config, data_dir, output_dir, pipeline_choices, results)
+            return
 
-    # This dictionary holds the baseline configuration for the worst job
-    original_config = worst_job_config.drop(columns=['config_id', 'testFile'], errors='ignore').iloc[0].to_dict()
+        pipelines = pipeline_choices if args.pipeline == 'all' else [args.pipeline]
+        if args.top is not None or args.all:
+            run_fleet(args, config, data_dir, output_dir, pipelines, results)
+            report_cache_stats()
+            return
+        if args.pipeline == 'all':
+            run_all_pipelines(args, config, data_dir, output_dir, pipelines, results)
+            report_cache_stats()
+            return
+        run_single_job(args, config, data_dir, output_dir, results)
+    finally:
+        if results is not None:
+            results.close()
+        metrics.close()
 
-    try:
-        darshan_shap_suggestion_content = (output_dir / f"suggestion_darshan_shap_{worst_test_id}.txt").read_text()
-        raw_darshan_suggestion_content = (output_dir / f"suggestion_raw_darshan_{worst_test_id}.txt").read_text()
-        shap_only_suggestion_content = (output_dir / f"suggestion_shap_only_{worst_test_id}.txt").read_text()
-    except FileNotFoundError as e:
-        print(f"Error: Could not find LLM suggestion output file required for CSV generation: {e}")
-        print(f"Please ensure you have run main.py for 'darshan_shap', 'raw_darshan', and 'shap_only' pipelines "
-              f"for test_id '{worst_test_id}' to generate these files in the '{output_dir}' directory.")
-        return # Exit if files are not found # Exit if files are not found, as CSV generation/application cannot proceed
-
-    # Parse the suggestion content for each pipeline
-    _, darshan_shap_after = extract_pipeline_data(darshan_shap_suggestion_content)
-    _, raw_darshan_after = extract_pipeline_data(raw_darshan_suggestion_content)
-    _, shap_only_after = extract_pipeline_data(shap_only_suggestion_content)
-
-    # --- Automated Discovery of Optimization Levers (existing code) ---
-    ior_config_df = pd.read_csv(data_dir / 'ior_configurations(in).csv')
-    parameter_options = {}
-    tunable_params = [col for col in ior_config_df.columns if col not in ['config_id', 'testFile']]
-
-    for param in tunable_params:
-        parameter_options[param] = sorted(ior_config_df[param].unique().tolist())
-
-    # --- Format Config String (existing code) ---
-    config_dict = worst_job_config.drop(columns=['config_id', 'testFile'], errors='ignore').iloc[0].to_dict()
-    sorted_config_items = sorted(config_dict.items())
-    config_string = "\n".join([f"{key} = {value}" for key, value in sorted_config_items])
-
-    # --- Define the comprehensive deny-list (existing code) ---
-    cols_to_ignore = ['nprocs', 'test_id', 'y_true', 'y_pred', 'error', 'tag']
-    
-    # --- Determine which data is available and build the correct prompt ---
-    # And perform CSV generation conditionally based on the selected pipeline
-    original_ior_config_csv_path = data_dir / 'ior_configurations(in).csv' # Path to your original config CSV
-
-    if args.pipeline == "raw_darshan":
-        job_raw_data = worst_job_raw.iloc[0].drop(labels=cols_to_ignore, errors='ignore')
-        numeric_job_data = pd.to_numeric(job_raw_data, errors='coerce').dropna()
-        non_zero_counters = numeric_job_data[numeric_job_data > 0]
-        top_counters = non_zero_counters.nlargest(5).sort_index()
-        diagnosis_summary = f"Top Raw I/O Operations:\n{top_counters.to_string()}"
-        prompt = create_prompt(diagnosis_summary, config_string, has_shap=False, has_darshan=True, options=parameter_options, glossary=feature_glossary)
-        
-        # Only create CSVs for raw_darshan if this pipeline is selected
-        generate_suggestions_csv(original_config, raw_darshan_after, "raw_darshan", output_dir, worst_test_id)
-        modified_raw_darshan_csv_path = output_dir / f"ior_configurations_modified_raw_darshan_{worst_test_id}.csv"
-        apply_llm_suggestions_to_csv(
-            original_ior_config_csv_path,
-            raw_darshan_after,
-            worst_test_id,
-            modified_raw_darshan_csv_path
-        )
-
-    elif args.pipeline == "darshan_shap":
-        job_shap_data = worst_job_shap.drop(columns=cols_to_ignore, errors='ignore').iloc[0]
-        top_shap = job_shap_data.nlargest(5).sort_index()
-        job_raw_data = worst_job_raw.iloc[0].drop(labels=cols_to_ignore, errors='ignore')
-        numeric_job_data = pd.to_numeric(job_raw_data, errors='coerce').dropna()
-        non_zero_counters = numeric_job_data[numeric_job_data > 0]
-        top_raw = non_zero_counters.nlargest(5).sort_index()
-        diagnosis_summary = (f"Top Performance Bottlenecks (from SHAP analysis):\n{top_shap.to_string()}\n\n"
-                           f"Top Most Frequent Raw I/O Operations (from Darshan counters):\n{top_raw.to_string()}")
-        prompt = create_prompt(diagnosis_summary, config_string, has_shap=True, has_darshan=True, options=parameter_options, glossary=feature_glossary)
-
-        # Only create CSVs for darshan_shap if this pipeline is selected
-        generate_suggestions_csv(original_config, darshan_shap_after, "darshan_shap", output_dir, worst_test_id)
-        modified_darshan_shap_csv_path = output_dir / f"ior_configurations_modified_darshan_shap_{worst_test_id}.csv"
-        apply_llm_suggestions_to_csv(
-            original_ior_config_csv_path,
-            darshan_shap_after,
-            worst_test_id,
-            modified_darshan_shap_csv_path
-        )
-
-    elif args.pipeline == "shap_only":
-        job_shap_data = worst_job_shap.drop(columns=cols_to_ignore, errors='ignore').iloc[0]
-        top_shap = job_shap_data.nlargest(5).sort_index()
-        diagnosis_summary = f"Top Performance Bottlenecks (from SHAP analysis):\n{top_shap.to_string()}"
-        prompt = create_prompt(diagnosis_summary, config_string, has_shap=True, has_darshan=False, options=parameter_options, glossary=feature_glossary)
-
-        # Only create CSVs for shap_only if this pipeline is selected
-        generate_suggestions_csv(original_config, shap_only_after, "shap_only", output_dir, worst_test_id)
-        original_ior_config_csv_path = data_dir / 'ior_configurations(in).csv'
-        modified_shap_only_csv_path = output_dir / f"ior_configurations_modified_shap_only_{worst_test_id}.csv"
-        apply_llm_suggestions_to_csv(
-            original_ior_config_csv_path,
-            shap_only_after,
-            worst_test_id,
-            modified_shap_only_csv_path
-        )
-
-    # --- Get LLM Suggestion and Save ---
-    suggestion = call_llm(prompt)
-    output_file = output_dir / f"suggestion_{args.pipeline}_{worst_test_id}.txt"
-    with open(output_file, 'w') as f:
-        f.write(f"--- Analysis for test_id: {worst_test_id} ---\n")
-        f.write(f"--- Pipeline: {args.pipeline} ---\n")
-        f.write("\n--- PROMPT SENT TO LLM ---\n")
-        f.write(prompt)
-        f.write("\n\n" + "="*50 + "\n\n")
-        f.write("--- LLM SUGGESTION ---\n")
-        f.write(suggestion)
-    print(f"\nSuccess! Suggestion saved to: {output_file}")
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
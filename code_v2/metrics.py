@@ -0,0 +1,488 @@
+# metrics.py
+"""
+Lightweight run instrumentation.
+
+Stages of the analysis are timed with span() (or the @timed decorator):
+load, diagnosis, prompt, llm, parse, save, csv and apply. A span is
+attributed to the job set with job() on the current thread, and so are the
+counters recorded while it is active: LLM token usage, requests, cache hits
+and misses, and retries.
+
+configure() starts a run; close() ends it. Every span and finished job is
+appended to a JSONL file as it happens, and the run totals (per-stage time
+histograms, tokens, cache hits, retries, jobs) are written to a Prometheus
+text-format file. Span times are kept in fixed buckets with a running count
+and sum, so a long-lived run (service.py) holds the same few numbers per
+stage however many spans it records. Optional per-stage profiling hooks run cProfile around the
+stage's spans and take a tracemalloc snapshot diff of its first span.
+
+Without configure() (or with metrics.enabled off) every call is a no-op.
+"""
+import bisect
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+STAGES = ['load', 'diagnosis', 'prompt', 'llm', 'parse', 'save', 'csv', 'apply']
+PROMETHEUS_PREFIX = 'agent_io'
+QUANTILES = [0.5, 0.9, 0.99]
+# Upper bounds (seconds) of the stage time buckets; a last +Inf bucket follows
+STAGE_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0]
+
+# Counters kept per job (and summed over the run)
+JOB_COUNTERS = ['llm_requests', 'prompt_tokens', 'completion_tokens', 'total_tokens',
+                'cache_hits', 'cache_misses', 'retries']
+
+# Lines of each tracemalloc snapshot diff and cProfile listing written to the profile directory
+PROFILE_TOP_LINES = 30
+
+_run = None
+_local = threading.local()
+
+
+class StageHistogram:
+    """
+    Span times of one stage: a count per STAGE_BUCKETS bucket, and the running count, sum and maximum.
+    """
+
+    def __init__(self):
+        self.buckets = [0] * (len(STAGE_BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def add(self, duration_s: float):
+        self.buckets[bisect.bisect_left(STAGE_BUCKETS, duration_s)] += 1
+        self.count += 1
+        self.sum += duration_s
+        self.max = max(self.max, duration_s)
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimates a quantile by interpolating linearly within its bucket, as
+        Prometheus' histogram_quantile() does (the +Inf bucket ends at the maximum).
+        """
+        if not self.count:
+            return float('nan')
+        rank = q * self.count
+        seen = 0
+        for i, in_bucket in enumerate(self.buckets):
+            if in_bucket and seen + in_bucket >= rank:
+                lower = STAGE_BUCKETS[i - 1] if i > 0 else 0.0
+                upper = STAGE_BUCKETS[i] if i < len(STAGE_BUCKETS) else self.max
+                return min(self.max, lower + (upper - lower) * (rank - seen) / in_bucket)
+            seen += in_bucket
+        return self.max
+
+
+def _escape_label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape_label(value)}"' for key, value in labels.items()) + '}'
+
+
+def peak_rss_bytes() -> int:
+    """
+    Peak resident set size of this process, or None where it cannot be read.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    return peak if os.uname().sysname == 'Darwin' else peak * 1024
+
+
+class RunMetrics:
+    """
+    The spans, counters and profiles of one run.
+
+    Args:
+        jsonl_path (Path): File the span and job events are appended to (None: not written).
+        prometheus_path (Path): Prometheus text file written by close() (None: not written).
+        profile_dir (Path): Directory for cProfile and tracemalloc output.
+        cprofile_stages (list): Stages profiled with cProfile.
+        tracemalloc_stages (list): Stages that get a tracemalloc snapshot diff.
+        run_info (dict): Labels describing the run (e.g. the pipeline), stored with every event.
+    """
+
+    def __init__(self, jsonl_path: Path = None, prometheus_path: Path = None, profile_dir: Path = None,
+                 cprofile_stages: list = (), tracemalloc_stages: list = (), run_info: dict = None):
+        self.run_id = uuid.uuid4().hex[:12]
+        self.run_info = run_info or {}
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.prometheus_path = prometheus_path
+        self.profile_dir = profile_dir
+        self.cprofile_stages = set(cprofile_stages or [])
+        self.tracemalloc_stages = set(tracemalloc_stages or [])
+        self._lock = threading.Lock()
+        self._file = None
+        if jsonl_path is not None:
+            jsonl_path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(jsonl_path, 'a', encoding='utf-8')
+        self.durations = {}
+        self.counters = {}
+        self.jobs = {}
+        self.job_status = {}
+        # Jobs already written; late counts (e.g. a losing hedged request) only go to the run totals
+        self._finished = set()
+        self._profiles = {}
+        self._snapshotted = set()
+        if self.tracemalloc_stages and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def _write(self, event: dict):
+        if self._file is not None:
+            self._file.write(json.dumps({'run_id': self.run_id, **event}) + '\n')
+
+    @staticmethod
+    def _new_job() -> dict:
+        return {'stages': {}, **{name: 0 for name in JOB_COUNTERS}}
+
+    def _job(self, key):
+        job = self.jobs.get(key)
+        if job is None:
+            job = self._new_job()
+            if key not in self._finished:
+                self.jobs[key] = job
+        return job
+
+    def add_span(self, stage: str, started_at: float, duration_s: float, job_key, extra: dict):
+        with self._lock:
+            histogram = self.durations.get(stage)
+            if histogram is None:
+                histogram = self.durations[stage] = StageHistogram()
+            histogram.add(duration_s)
+            event = {'event': 'span', 'stage': stage, 'time': started_at, 'duration_s': duration_s, **extra}
+            if job_key is not None:
+                stages = self._job(job_key)['stages']
+                stages[stage] = stages.get(stage, 0.0) + duration_s
+                event['test_id'], event['pipeline'] = job_key
+            self._write(event)
+
+    def count(self, name: str, value, job_key, labels: dict):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+            if job_key is not None and name in JOB_COUNTERS:
+                self._job(job_key)[name] += value
+
+    def finish_job(self, job_key, status: str, details: dict):
+        with self._lock:
+            job = self.jobs.pop(job_key, None) or self._new_job()
+            self._finished.add(job_key)
+            self.job_status[status] = self.job_status.get(status, 0) + 1
+            test_id, pipeline = job_key
+            self._write({'event': 'job', 'time': time.time(), 'test_id': test_id, 'pipeline': pipeline,
+                         'status': status, **job, **details})
+
+    def start_profile(self, stage: str):
+        """
+        Returns the profiling state for a span of stage: a running cProfile
+        profiler and/or the tracemalloc snapshot taken at its start.
+        """
+        profiler = snapshot = None
+        if stage in self.cprofile_stages and not getattr(_local, 'profiling', False):
+            profiler = cProfile.Profile()
+            _local.profiling = True
+            profiler.enable()
+        if stage in self.tracemalloc_stages and tracemalloc.is_tracing():
+            with self._lock:
+                first = stage not in self._snapshotted
+                self._snapshotted.add(stage)
+            if first:
+                snapshot = tracemalloc.take_snapshot()
+        return profiler, snapshot
+
+    def stop_profile(self, stage: str, state):
+        profiler, snapshot = state
+        if profiler is not None:
+            profiler.disable()
+            _local.profiling = False
+            with self._lock:
+                if stage in self._profiles:
+                    self._profiles[stage].add(profiler)
+                else:
+                    self._profiles[stage] = pstats.Stats(profiler)
+        if snapshot is not None and self.profile_dir is not None:
+            diff = tracemalloc.take_snapshot().compare_to(snapshot, 'lineno')
+            self.profile_dir.mkdir(parents=True, exist_ok=True)
+            path = self.profile_dir / f"tracemalloc_{stage}.txt"
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(f"# Allocations during the first '{stage}' span of run {self.run_id}\n")
+                for stat in diff[:PROFILE_TOP_LINES]:
+                    f.write(f"{stat}\n")
+
+    def write_profiles(self):
+        if not self._profiles or self.profile_dir is None:
+            return
+        self.profile_dir.mkdir(parents=True, exist_ok=True)
+        for stage, stats in self._profiles.items():
+            stats.dump_stats(str(self.profile_dir / f"cprofile_{stage}.pstats"))
+            listing = io.StringIO()
+            pstats.Stats(str(self.profile_dir / f"cprofile_{stage}.pstats"), stream=listing) \
+                .sort_stats('cumulative').print_stats(PROFILE_TOP_LINES)
+            (self.profile_dir / f"cprofile_{stage}.txt").write_text(listing.getvalue())
+        print(f"Profiles of stage(s) {', '.join(self._profiles)} saved to: {self.profile_dir}")
+
+    def summary(self) -> dict:
+        """
+        Run totals: elapsed time, per-stage count/sum/estimated quantiles, counters and job statuses.
+        """
+        with self._lock:
+            stages = {}
+            for stage, histogram in self.durations.items():
+                stages[stage] = {'count': histogram.count, 'sum_s': histogram.sum,
+                                 **{f'p{round(q * 100)}_s': histogram.quantile(q) for q in QUANTILES}}
+            counters = {}
+            for (name, labels), value in self.counters.items():
+                counters[name] = counters.get(name, 0) + value
+            return {'elapsed_s': time.perf_counter() - self._start, 'stages': stages,
+                    'counters': counters, 'jobs': dict(self.job_status), 'peak_rss_bytes': peak_rss_bytes()}
+
+    def prometheus_text(self) -> str:
+        """
+        The run's metrics in the Prometheus text exposition format.
+        """
+        p = PROMETHEUS_PREFIX
+        lines = [f"# HELP {p}_run_info Labels of the run these metrics describe.",
+                 f"# TYPE {p}_run_info gauge",
+                 f"{p}_run_info{_format_labels({'run_id': self.run_id, **self.run_info})} 1",
+                 f"# HELP {p}_run_start_time_seconds Start of the run (Unix time).",
+                 f"# TYPE {p}_run_start_time_seconds gauge",
+                 f"{p}_run_start_time_seconds {self.started_at:.3f}",
+                 f"# HELP {p}_run_duration_seconds Time since the start of the run.",
+                 f"# TYPE {p}_run_duration_seconds gauge",
+                 f"{p}_run_duration_seconds {time.perf_counter() - self._start:.6f}"]
+        rss = peak_rss_bytes()
+        if rss is not None:
+            lines += [f"# HELP {p}_peak_rss_bytes Peak resident set size of the process.",
+                      f"# TYPE {p}_peak_rss_bytes gauge",
+                      f"{p}_peak_rss_bytes {rss}"]
+
+        with self._lock:
+            lines += [f"# HELP {p}_stage_seconds Time spent per stage of the analysis.",
+                      f"# TYPE {p}_stage_seconds histogram"]
+            for stage, histogram in self.durations.items():
+                cumulative = 0
+                for bound, in_bucket in zip(STAGE_BUCKETS + ['+Inf'], histogram.buckets):
+                    cumulative += in_bucket
+                    lines.append(f"{p}_stage_seconds_bucket{_format_labels({'stage': stage, 'le': bound})} "
+                                 f"{cumulative}")
+                lines.append(f"{p}_stage_seconds_sum{_format_labels({'stage': stage})} {histogram.sum:.6f}")
+                lines.append(f"{p}_stage_seconds_count{_format_labels({'stage': stage})} {histogram.count}")
+
+            by_name = {}
+            for (name, labels), value in sorted(self.counters.items()):
+                by_name.setdefault(name, []).append((dict(labels), value))
+            for name, series in by_name.items():
+                lines += [f"# HELP {p}_{name}_total Count of {name.replace('_', ' ')} in this run.",
+                          f"# TYPE {p}_{name}_total counter"]
+                lines += [f"{p}_{name}_total{_format_labels(labels)} {value}" for labels, value in series]
+
+            lines += [f"# HELP {p}_jobs_total Jobs finished in this run, by status.",
+                      f"# TYPE {p}_jobs_total counter"]
+            lines += [f"{p}_jobs_total{_format_labels({'status': status})} {count}"
+                      for status, count in sorted(self.job_status.items())]
+        return '\n'.join(lines) + '\n'
+
+    def close(self):
+        """
+        Writes the run summary event, the Prometheus file and any profiles.
+        """
+        for key in list(self.jobs):
+            self.finish_job(key, 'unfinished', {})
+        summary = self.summary()
+        self._write({'event': 'run', 'time': time.time(), **self.run_info, **summary})
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self.prometheus_path is not None:
+            tmp_path = self.prometheus_path.with_name(f"{self.prometheus_path.name}.tmp-{os.getpid()}")
+            tmp_path.write_text(self.prometheus_text())
+            os.replace(tmp_path, self.prometheus_path)
+        if summary['stages']:
+            print("Stage times: " + ", ".join(f"{stage} {totals['sum_s']:.2f}s ({totals['count']})"
+                                              for stage, totals in summary['stages'].items()))
+        self.write_profiles()
+        if self.tracemalloc_stages and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+def configure(metrics_config: dict, output_dir: Path, run_info: dict = None):
+    """
+    Applies the 'metrics' section of config.yaml and starts a run.
+
+    Args:
+        metrics_config (dict): The 'metrics' section of config.yaml (may be empty).
+        output_dir (Path): Directory the JSONL, Prometheus and profile files are written to.
+        run_info (dict): Labels describing the run, e.g. {'pipeline': 'darshan_shap'}.
+    """
+    global _run
+    if _run is not None:
+        _run.close()
+        _run = None
+    if not metrics_config.get('enabled', True):
+        return
+    profile_config = metrics_config.get('profile', {})
+    unknown = set(profile_config.get('cprofile') or []) | set(profile_config.get('tracemalloc') or [])
+    unknown -= set(STAGES)
+    if unknown:
+        print(f"Warning: unknown stage(s) in metrics.profile: {', '.join(sorted(unknown))}")
+    jsonl = metrics_config.get('jsonl', 'metrics.jsonl')
+    prometheus = metrics_config.get('prometheus', 'metrics.prom')
+    _run = RunMetrics(
+        jsonl_path=output_dir / jsonl if jsonl else None,
+        prometheus_path=output_dir / prometheus if prometheus else None,
+        profile_dir=output_dir / profile_config.get('dir', 'profiles'),
+        cprofile_stages=profile_config.get('cprofile') or [],
+        tracemalloc_stages=profile_config.get('tracemalloc') or [],
+        run_info=run_info,
+    )
+
+
+def enabled() -> bool:
+    return _run is not None
+
+
+def current_job():
+    """
+    The (test_id, pipeline) set with job() on this thread, or None.
+    """
+    return getattr(_local, 'job', None)
+
+
+@contextmanager
+def job(test_id: str, pipeline: str):
+    """
+    Attributes the spans and counters recorded on this thread to a job.
+    """
+    previous = current_job()
+    _local.job = (test_id, pipeline)
+    try:
+        yield
+    finally:
+        _local.job = previous
+
+
+def bind(function):
+    """
+    Wraps function so that it runs under the calling thread's job, e.g. when
+    it is handed to another thread.
+    """
+    context = current_job()
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        if context is None:
+            return function(*args, **kwargs)
+        with job(*context):
+            return function(*args, **kwargs)
+    return wrapper
+
+
+@contextmanager
+def span(stage: str, **extra):
+    """
+    Times a stage. A span inside a span of the same stage on the same thread is
+    not recorded again, so instrumented functions may call each other.
+    """
+    run = _run
+    active = getattr(_local, 'stages', None)
+    if active is None:
+        active = _local.stages = []
+    if run is None or stage in active:
+        yield
+        return
+    active.append(stage)
+    state = run.start_profile(stage)
+    started_at = time.time()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        active.remove(stage)
+        run.stop_profile(stage, state)
+        run.add_span(stage, started_at, duration, current_job(), extra)
+
+
+def timed(stage: str):
+    """
+    Decorator form of span().
+    """
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name: str, value=1, **labels):
+    """
+    Adds value to a counter (per job for the JOB_COUNTERS, and per set of labels for the run).
+    """
+    if _run is not None:
+        _run.count(name, value, current_job(), labels)
+
+
+def record_usage(usage: dict, model: str):
+    """
+    Records one LLM request and the token counts of its 'usage' block (if the API sent one).
+    """
+    if _run is None:
+        return
+    count('llm_requests', model=model)
+    for kind in ('prompt_tokens', 'completion_tokens', 'total_tokens'):
+        if usage and usage.get(kind) is not None:
+            count(kind, usage[kind], model=model)
+
+
+def finish_job(test_id: str, pipeline: str, status: str, **details):
+    """
+    Writes a job's record (per-stage seconds, tokens, cache hits, retries) to the JSONL file.
+    """
+    if _run is not None:
+        _run.finish_job((test_id, pipeline), status, details)
+
+
+def summary() -> dict:
+    """
+    The current run's totals (see RunMetrics.summary), or None if metrics are off.
+    """
+    return _run.summary() if _run is not None else None
+
+
+def prometheus_text() -> str:
+    return _run.prometheus_text() if _run is not None else ''
+
+
+def close():
+    """
+    Ends the run: writes the summary, the Prometheus file and any profiles.
+    """
+    global _run
+    if _run is not None:
+        _run.close()
+        _run = None
@@ -0,0 +1,366 @@
+# mock_llm_server.py
+"""
+Local stand-in for the OpenRouter chat-completions API, for load testing and
+CI runs of the analyzer without network access or API costs.
+
+It answers every POST with a canned response in the **Before:**/**After:**
+format that utils.extract_pipeline_data expects, built from the current
+configuration and optimization levers found in the prompt. Streaming (SSE),
+latency distributions and 429/5xx injection are configurable.
+
+Usage:
+    python mock_llm_server.py --port 8099 --latency-mean-s 2 --rate-limit-rate 0.05
+    LLM_API_URL=http://127.0.0.1:8099/api/v1/chat/completions python main.py darshan_shap --top 20
+"""
+import argparse
+import ast
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from llm_api import estimate_tokens
+
+CHAT_COMPLETIONS_PATH = "/api/v1/chat/completions"
+LATENCY_DISTRIBUTIONS = ['fixed', 'uniform', 'normal', 'lognormal']
+
+CONFIG_SECTION_RE = re.compile(r'\*\*CURRENT I/O CONFIGURATION FILE \(The Environment\):\*\*\n(.*?)(?:\n\n|\Z)', re.DOTALL)
+OPTION_LINE_RE = re.compile(r'^- \*\*(\w+)\*\*: (\[.*?\])', re.MULTILINE)
+
+# Characters per streamed chunk (about 4 tokens)
+STREAM_CHUNK_CHARS = 16
+
+
+class LatencyModel:
+    """
+    Samples the total generation time of a response, in seconds.
+    """
+
+    def __init__(self, distribution: str = 'fixed', mean_s: float = 0.0, sigma_s: float = 0.0,
+                 min_s: float = 0.0, seed: int = None):
+        if distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution '{distribution}'")
+        self.distribution = distribution
+        self.mean_s = mean_s
+        self.sigma_s = sigma_s
+        self.min_s = min_s
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self) -> float:
+        with self._lock:
+            if self.distribution == 'uniform':
+                value = self._rng.uniform(self.mean_s - self.sigma_s, self.mean_s + self.sigma_s)
+            elif self.distribution == 'normal':
+                value = self._rng.gauss(self.mean_s, self.sigma_s)
+            elif self.distribution == 'lognormal' and self.mean_s > 0:
+                # Parameterized by the mean and standard deviation of the latency itself
+                log_variance = math.log(1 + (self.sigma_s / self.mean_s) ** 2)
+                value = self._rng.lognormvariate(math.log(self.mean_s) - 0.5 * log_variance, log_variance ** 0.5)
+            else:
+                value = self.mean_s
+        return max(self.min_s, value)
+
+
+def parse_prompt(prompt: str):
+    """
+    Extracts the current configuration and the option lists from an analyzer prompt.
+
+    Returns:
+        A tuple (config, options): dicts of parameter -> value string and
+        parameter -> list of possible values.
+    """
+    config = {}
+    config_match = CONFIG_SECTION_RE.search(prompt)
+    if config_match:
+        for line in config_match.group(1).splitlines():
+            if ' = ' in line:
+                key, value = line.split(' = ', 1)
+                config[key.strip()] = value.strip()
+
+    options = {}
+    for key, values in OPTION_LINE_RE.findall(prompt):
+        try:
+            options[key] = ast.literal_eval(values)
+        except (ValueError, SyntaxError):
+            continue
+    return config, options
+
+
+def build_canned_response(prompt: str, max_changes: int = 4, model: str = None) -> str:
+    """
+    Builds a deterministic suggestion for a prompt: up to max_changes
+    parameters with more than one option are moved to a different value.
+    With a model name, each model gets its own (equally deterministic) suggestion.
+    """
+    seed_text = prompt if model is None else f"{model}\n{prompt}"
+    rng = random.Random(hashlib.sha256(seed_text.encode('utf-8')).hexdigest())
+    config, options = parse_prompt(prompt)
+    candidates = [key for key, values in options.items()
+                  if key in config and any(str(v) != config[key] for v in values)]
+    changes = {}
+    for key in sorted(rng.sample(candidates, min(max_changes, len(candidates)))):
+        changes[key] = rng.choice([v for v in options[key] if str(v) != config[key]])
+
+    ranked = "\n".join(
+        f"{i}. {key} = {value} - **Impact Score:** {8 - i % 3}, **Risk Score:** {2 + i % 3}. Mock justification."
+        for i, (key, value) in enumerate(changes.items(), start=1))
+    before = "\n".join(f"{key} = {config[key]}" for key in changes)
+    after = "\n".join(
+        f"{key} = {value}  (Impact: {8 - i % 3}, Risk: {2 + i % 3} - Mock recommendation from the local test server)"
+        for i, (key, value) in enumerate(changes.items(), start=1))
+    return f"""### **STAGE 1: Systematic Evaluation and Scoring**
+Mock analysis of {len(options)} optimization levers.
+
+### **STAGE 2: Ranked Recommendations**
+{ranked}
+
+### **STAGE 3: Final Consolidated Configuration**
+**Final Recommendation:**
+**Before:**
+{before}
+
+
+**After:**
+{after}
+"""
+
+
+class MockLLMServer:
+    """
+    OpenRouter-compatible chat-completions server running on a background thread.
+
+    Args:
+        host (str), port (int): Address to listen on (port 0 picks a free port).
+        latency (LatencyModel): Total time to produce each response.
+        ttft_fraction (float): Share of the latency spent before the first
+                               streamed token.
+        rate_limit_rate (float): Probability of answering 429 (with Retry-After).
+        error_rate (float): Probability of answering 500.
+        retry_after_s (float): Retry-After value sent with injected 429s.
+        response_text (str): Serve this text instead of building a response from the prompt.
+        vary_by_model (bool): Give each requested model its own suggestion
+                              (for testing llm.mode 'ensemble').
+        seed (int): Seed for error injection.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: LatencyModel = None,
+                 ttft_fraction: float = 0.2, rate_limit_rate: float = 0.0, error_rate: float = 0.0,
+                 retry_after_s: float = 0.2, response_text: str = None, vary_by_model: bool = False,
+                 seed: int = None):
+        self.latency = latency or LatencyModel()
+        self.ttft_fraction = ttft_fraction
+        self.rate_limit_rate = rate_limit_rate
+        self.error_rate = error_rate
+        self.retry_after_s = retry_after_s
+        self.response_text = response_text
+        self.vary_by_model = vary_by_model
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.counters = {'requests': 0, 'completed': 0, 'streamed': 0, 'rate_limited': 0, 'errors': 0}
+        # (start, end) perf_counter times of every completed response
+        self.intervals = []
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}{CHAT_COMPLETIONS_PATH}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def shutdown(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self.counters)
+
+    def _count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _draw_failure(self):
+        with self._lock:
+            draw = self._rng.random()
+        if draw < self.rate_limit_rate:
+            return 429
+        if draw < self.rate_limit_rate + self.error_rate:
+            return 500
+        return None
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status: int, body: dict, headers: dict = None):
+                data = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _write_chunk(self, data: bytes):
+                self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+                self.wfile.flush()
+
+            def do_GET(self):
+                if self.path.rstrip('/') == '/stats':
+                    self._send_json(200, server.stats())
+                else:
+                    self._send_json(404, {"error": {"message": "Not found", "code": 404}})
+
+            def do_POST(self):
+                start = time.perf_counter()
+                server._count('requests')
+                try:
+                    request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                    prompt = request['messages'][-1]['content']
+                except (ValueError, KeyError, IndexError):
+                    self._send_json(400, {"error": {"message": "Malformed chat-completions request", "code": 400}})
+                    return
+
+                failure = server._draw_failure()
+                if failure == 429:
+                    server._count('rate_limited')
+                    self._send_json(429, {"error": {"message": "Rate limit exceeded (injected)", "code": 429}},
+                                    headers={"Retry-After": f"{server.retry_after_s:g}"})
+                    return
+                if failure == 500:
+                    server._count('errors')
+                    self._send_json(500, {"error": {"message": "Internal error (injected)", "code": 500}})
+                    return
+
+                content = server.response_text or build_canned_response(
+                    prompt, model=request.get('model') if server.vary_by_model else None)
+                usage = {"prompt_tokens": estimate_tokens(prompt), "completion_tokens": estimate_tokens(content)}
+                usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+                latency = server.latency.sample()
+
+                if request.get('stream'):
+                    self._stream(request, content, usage, latency)
+                    server._count('streamed')
+                else:
+                    time.sleep(latency)
+                    self._send_json(200, {
+                        "id": f"mock-{hashlib.sha1(prompt.encode('utf-8')).hexdigest()[:12]}",
+                        "object": "chat.completion",
+                        "model": request.get('model'),
+                        "choices": [{"index": 0, "finish_reason": "stop",
+                                     "message": {"role": "assistant", "content": content}}],
+                        "usage": usage,
+                    })
+                server._count('completed')
+                with server._lock:
+                    server.intervals.append((start, time.perf_counter()))
+
+            def _stream(self, request: dict, content: str, usage: dict, latency: float):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                chunks = [content[i:i + STREAM_CHUNK_CHARS] for i in range(0, len(content), STREAM_CHUNK_CHARS)]
+                per_chunk_s = latency * (1 - server.ttft_fraction) / max(1, len(chunks))
+                try:
+                    self._write_chunk(b": OPENROUTER PROCESSING\n\n")
+                    time.sleep(latency * server.ttft_fraction)
+                    for chunk in chunks:
+                        event = {"object": "chat.completion.chunk", "model": request.get('model'),
+                                 "choices": [{"index": 0, "delta": {"content": chunk}}]}
+                        self._write_chunk(f"data: {json.dumps(event)}\n\n".encode('utf-8'))
+                        if per_chunk_s:
+                            time.sleep(per_chunk_s)
+                    final = {"object": "chat.completion.chunk", "model": request.get('model'),
+                             "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "usage": usage}
+                    self._write_chunk(f"data: {json.dumps(final)}\n\n".encode('utf-8'))
+                    self._write_chunk(b"data: [DONE]\n\n")
+                    self._write_chunk(b"")
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client aborted the generation (token budget or stop_after_block)
+                    self.close_connection = True
+
+        return Handler
+
+
+def add_server_arguments(parser: argparse.ArgumentParser):
+    """
+    Adds the mock server's latency and fault-injection options to an argument parser.
+    """
+    parser.add_argument('--latency-dist', choices=LATENCY_DISTRIBUTIONS, default='lognormal',
+                        help="Distribution of the per-response generation time.")
+    parser.add_argument('--latency-mean-s', type=float, default=1.0, help="Mean generation time in seconds.")
+    parser.add_argument('--latency-sigma-s', type=float, default=0.5,
+                        help="Standard deviation (normal, lognormal) or half-width (uniform) in seconds.")
+    parser.add_argument('--ttft-fraction', type=float, default=0.2,
+                        help="Share of the generation time spent before the first streamed token.")
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help="Probability of an injected 429.")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Probability of an injected 500.")
+    parser.add_argument('--retry-after-s', type=float, default=0.2, help="Retry-After sent with injected 429s.")
+    parser.add_argument('--response-file', type=str, help="Serve this file's text as every response.")
+    parser.add_argument('--vary-by-model', action='store_true',
+                        help="Give each requested model its own suggestion (for testing ensemble mode).")
+    parser.add_argument('--seed', type=int, default=None, help="Seed for latency sampling and fault injection.")
+
+
+def server_from_args(args, host: str = '127.0.0.1', port: int = 0) -> MockLLMServer:
+    """
+    Creates a MockLLMServer from the options added by add_server_arguments().
+    """
+    response_text = None
+    if args.response_file:
+        with open(args.response_file, 'r') as f:
+            response_text = f.read()
+    return MockLLMServer(
+        host=host,
+        port=port,
+        latency=LatencyModel(args.latency_dist, args.latency_mean_s, args.latency_sigma_s, seed=args.seed),
+        ttft_fraction=args.ttft_fraction,
+        rate_limit_rate=args.rate_limit_rate,
+        error_rate=args.error_rate,
+        retry_after_s=args.retry_after_s,
+        response_text=response_text,
+        vary_by_model=args.vary_by_model,
+        seed=args.seed,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local OpenRouter-compatible mock LLM server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8099)
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    server = server_from_args(args, host=args.host, port=args.port)
+    print(f"Mock LLM server listening on {server.url}")
+    print(f"Point the analyzer at it with: LLM_API_URL={server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\nStopping. Counters: {server.stats()}")
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
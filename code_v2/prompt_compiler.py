@@ -0,0 +1,117 @@
+# prompt_compiler.py
+from agent import (PROMPT_ROLE_AND_CONTEXT, FEATURE_GLOSSARY, PIPELINE_EVIDENCE,
+                   format_options, build_reasoning_framework)
+from llm_api import estimate_tokens
+
+LEVERS_TEMPLATE = """
+**OPTIMIZATION LEVERS AND STRATEGIC IMPACT (Your Only Choices):**
+{options_str}
+"""
+
+JOB_DATA_TEMPLATE = """
+**PERFORMANCE DIAGNOSIS DATA (The Symptoms):**
+{diagnosis_summary}
+
+**CURRENT I/O CONFIGURATION FILE (The Environment):**
+{config}
+"""
+
+# Compaction levels tried in order when a prompt is over budget:
+# (maximum values listed per parameter, include the strategic-impact descriptions)
+COMPACTION_LEVELS = [
+    (None, True),
+    (8, True),
+    (4, True),
+    (2, True),
+    (2, False),
+]
+
+
+def compact_option_values(values: list, max_values: int):
+    """
+    Shortens a long option list to max_values evenly spaced entries (always
+    keeping the first and last) and notes how many values there are in total.
+    """
+    if max_values is None or len(values) <= max_values:
+        return values
+    step = (len(values) - 1) / (max_values - 1)
+    sample = [values[round(i * step)] for i in range(max_values)]
+    return f"{sample} (sampled {max_values} of {len(values)} values)"
+
+
+class PromptCompiler:
+    """
+    Builds prompts with the invariant part first: role and context, the
+    optimization levers and the reasoning framework. Only the diagnosis and
+    the current configuration, which change per job, come after it. Keeping
+    the prefix byte-identical across jobs lets provider-side prompt caching
+    reuse it.
+
+    The prefix is built once per (evidence combination, compaction level) for
+    the option set the compiler was created with. When token_budget is set,
+    long option lists are compacted until the prompt fits.
+    """
+
+    def __init__(self, options: dict, glossary: dict = FEATURE_GLOSSARY, token_budget: int = None):
+        self.options = options
+        self.glossary = glossary
+        self.token_budget = token_budget
+        self._prefixes = {}
+        self._warned_over_budget = False
+
+    def _prefix(self, has_shap: bool, has_darshan: bool, level: int):
+        """
+        Returns (prefix, section_tokens) for one evidence combination and compaction level.
+        """
+        key = (has_shap, has_darshan, level)
+        if key not in self._prefixes:
+            max_values, with_descriptions = COMPACTION_LEVELS[level]
+            options = {param: compact_option_values(values, max_values) for param, values in self.options.items()}
+            if with_descriptions:
+                options_str = format_options(options, self.glossary)
+            else:
+                options_str = "".join(f"- **{param}**: {values}\n" for param, values in options.items())
+            sections = {
+                'role_context': PROMPT_ROLE_AND_CONTEXT,
+                'levers': LEVERS_TEMPLATE.format(options_str=options_str),
+                'framework': build_reasoning_framework(has_shap, has_darshan),
+            }
+            prefix = "".join(sections.values())
+            self._prefixes[key] = (prefix, {name: estimate_tokens(text) for name, text in sections.items()})
+        return self._prefixes[key]
+
+    def compile_with_report(self, pipeline: str, diagnosis_summary: str, config: str):
+        """
+        Compiles the prompt for one job.
+
+        Returns:
+            A tuple (prompt, report). report holds the estimated token count
+            of every section, the prefix and the whole prompt, plus the
+            compaction level used.
+        """
+        evidence = PIPELINE_EVIDENCE[pipeline]
+        job_data = JOB_DATA_TEMPLATE.format(diagnosis_summary=diagnosis_summary, config=config)
+        job_tokens = {'diagnosis': estimate_tokens(diagnosis_summary), 'config': estimate_tokens(config)}
+        job_data_tokens = estimate_tokens(job_data)
+
+        levels = range(len(COMPACTION_LEVELS)) if self.token_budget else [0]
+        for level in levels:
+            prefix, prefix_tokens = self._prefix(evidence['has_shap'], evidence['has_darshan'], level)
+            total = estimate_tokens(prefix) + job_data_tokens
+            if not self.token_budget or total <= self.token_budget:
+                break
+        else:
+            if not self._warned_over_budget:
+                print(f"Warning: prompt needs ~{total} tokens even fully compacted "
+                      f"(budget {self.token_budget}).")
+                self._warned_over_budget = True
+
+        report = {**prefix_tokens, **job_tokens,
+                  'prefix': estimate_tokens(prefix), 'total': total, 'compaction_level': level}
+        return prefix + job_data, report
+
+    def compile(self, pipeline: str, diagnosis_summary: str, config: str) -> str:
+        """
+        Compiles the prompt for one job.
+        """
+        return self.compile_with_report(pipeline, diagnosis_summary, config)[0]
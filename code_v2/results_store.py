@@ -0,0 +1,421 @@
+# results_store.py
+"""
+Consolidated, indexed store of analysis results in a single SQLite file.
+
+Instead of three small files per job and pipeline (suggestion_*.txt,
+comparison_suggestions_*.csv and ior_configurations_modified_*.csv), every
+analysis is stored as rows of four tables:
+
+    texts        prompts and raw LLM responses, zlib-compressed and stored
+                 once per distinct text (keyed by SHA-256)
+    analyses     one row per (test_id, pipeline): the prompt and response,
+                 the cluster representative the suggestion came from, the
+                 predicted speedup and when it was stored
+    suggestions  the parsed After block joined with the original
+                 configuration: one row per (test_id, pipeline, parameter),
+                 i.e. the rows of the comparison CSV
+    modified_configs  the modified IOR configuration row(s)
+
+Writes are buffered and committed in one transaction per batch, so a crash
+never leaves a half-written analysis. The per-job files can still be written
+alongside (results.export_files) or exported from the store later.
+
+Usage:
+    python results_store.py export --pipeline darshan_shap
+    python results_store.py query --parameter transferSize --pipeline darshan_shap
+    python results_store.py query --test-id test00736 --csv changes.csv
+"""
+import argparse
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+
+import pandas as pd
+
+from utils import format_suggestion, suggestion_response
+
+COMPARISON_FIXED_COLUMNS = ['Parameter', 'Original Value']
+# Columns of a comparison table named '<pipeline> <suffix>' that map to fixed store columns
+COMPARISON_PIPELINE_COLUMNS = {'Suggested Value': 'suggested_value', 'Impact': 'impact', 'Risk': 'risk'}
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS texts ("
+    " hash TEXT PRIMARY KEY,"
+    " body BLOB NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS analyses ("
+    " test_id TEXT NOT NULL,"
+    " pipeline TEXT NOT NULL,"
+    " prompt_hash TEXT NOT NULL,"
+    " response_hash TEXT NOT NULL,"
+    " representative TEXT,"
+    " predicted_speedup REAL,"
+    " created_at REAL NOT NULL,"
+    " PRIMARY KEY (test_id, pipeline))",
+    "CREATE INDEX IF NOT EXISTS idx_analyses_pipeline ON analyses(pipeline)",
+    "CREATE TABLE IF NOT EXISTS suggestions ("
+    " test_id TEXT NOT NULL,"
+    " pipeline TEXT NOT NULL,"
+    " position INTEGER NOT NULL,"
+    " parameter TEXT NOT NULL,"
+    " original_value TEXT,"
+    " suggested_value TEXT,"
+    " impact INTEGER,"
+    " risk INTEGER,"
+    " changed INTEGER NOT NULL,"
+    " extra TEXT,"
+    " PRIMARY KEY (test_id, pipeline, position))",
+    "CREATE INDEX IF NOT EXISTS idx_suggestions_parameter ON suggestions(parameter, pipeline)",
+    "CREATE TABLE IF NOT EXISTS modified_configs ("
+    " test_id TEXT NOT NULL,"
+    " pipeline TEXT NOT NULL,"
+    " position INTEGER NOT NULL,"
+    " row TEXT NOT NULL,"
+    " PRIMARY KEY (test_id, pipeline, position))",
+]
+
+
+def _text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _score(value):
+    """
+    Impact and risk scores as integers; 'N/A' (no score) as NULL.
+    """
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _json_value(value):
+    # NumPy scalars (e.g. int64 counts from the configuration table)
+    if hasattr(value, 'item'):
+        return value.item()
+    if value is None or isinstance(value, (str, int, float)):
+        return value
+    return str(value)
+
+
+class ResultsStore:
+    """
+    Batched writer and query interface of the results database.
+
+    Args:
+        path (Path): The SQLite file (created if missing).
+        batch_size (int): Analyses buffered before maybe_flush() commits them.
+        export_files (bool): Whether the analyzer also writes the per-job files.
+    """
+
+    def __init__(self, path: Path, batch_size: int = 200, export_files: bool = True):
+        self.path = Path(path)
+        self.batch_size = batch_size
+        self.export_files = export_files
+        self._lock = threading.Lock()
+        self._pending = {}
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        for statement in SCHEMA:
+            self._conn.execute(statement)
+        self._conn.commit()
+
+    # --- Writing ---
+
+    def _entry(self, test_id: str, pipeline: str) -> dict:
+        return self._pending.setdefault((test_id, pipeline), {})
+
+    def add_analysis(self, test_id: str, pipeline: str, prompt: str, response: str,
+                     representative: str = None, predicted_speedup: float = None):
+        """
+        Buffers the prompt and raw response of an analysis. For a cluster member,
+        representative is the test_id whose LLM call produced the response.
+        """
+        with self._lock:
+            self._entry(test_id, pipeline)['analysis'] = (prompt, response, representative, predicted_speedup)
+
+    def add_comparison(self, test_id: str, pipeline: str, comparison: pd.DataFrame):
+        """
+        Buffers a comparison table (utils.build_comparison_frame) as suggestion rows.
+        """
+        prefix = f"{pipeline} "
+        rows = []
+        for position, record in enumerate(comparison.to_dict('records')):
+            fixed, extra = {}, {}
+            for column, value in record.items():
+                if column in COMPARISON_FIXED_COLUMNS:
+                    continue
+                suffix = column[len(prefix):] if column.startswith(prefix) else column
+                if suffix in COMPARISON_PIPELINE_COLUMNS:
+                    fixed[COMPARISON_PIPELINE_COLUMNS[suffix]] = value
+                else:
+                    extra[suffix] = _json_value(value)
+            original, suggested = record['Original Value'], fixed.get('suggested_value')
+            rows.append((test_id, pipeline, position, record['Parameter'],
+                         None if original == 'N/A' else _json_value(original),
+                         None if suggested is None else _json_value(suggested),
+                         _score(fixed.get('impact')), _score(fixed.get('risk')),
+                         int(str(original) != str(suggested)),
+                         json.dumps(extra) if extra else None))
+        with self._lock:
+            self._entry(test_id, pipeline)['suggestions'] = rows
+
+    def add_modified_config(self, test_id: str, pipeline: str, rows: pd.DataFrame):
+        """
+        Buffers the modified configuration row(s) (utils.build_modified_config).
+        """
+        records = [(test_id, pipeline, position, json.dumps(record, default=_json_value))
+                   for position, record in enumerate(rows.to_dict('records'))]
+        with self._lock:
+            self._entry(test_id, pipeline)['modified_configs'] = records
+
+    def discard(self, test_id: str, pipeline: str):
+        """
+        Drops whatever is buffered for a job and pipeline (e.g. the rows of an
+        analysis whose outputs could not all be written). Committed rows are kept.
+        """
+        with self._lock:
+            self._pending.pop((test_id, pipeline), None)
+
+    @property
+    def pending(self) -> int:
+        """
+        Analyses buffered but not yet committed.
+        """
+        with self._lock:
+            return len(self._pending)
+
+    def maybe_flush(self) -> bool:
+        """
+        Commits the buffer once it holds batch_size analyses. Returns True if it did.
+        """
+        if self.pending < self.batch_size:
+            return False
+        self.flush()
+        return True
+
+    def flush(self):
+        """
+        Commits every buffered analysis in one transaction. The stored rows of an
+        analysis that is written again are replaced as a whole.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            if not pending:
+                return
+            now = time.time()
+            with self._conn:
+                for (test_id, pipeline), entry in pending.items():
+                    if 'analysis' in entry:
+                        prompt, response, representative, speedup = entry['analysis']
+                        hashes = []
+                        for text in (prompt, response):
+                            hashes.append(_text_hash(text))
+                            self._conn.execute("INSERT OR IGNORE INTO texts (hash, body) VALUES (?, ?)",
+                                               (hashes[-1], zlib.compress(text.encode('utf-8'))))
+                        self._conn.execute(
+                            "INSERT OR REPLACE INTO analyses (test_id, pipeline, prompt_hash, response_hash, "
+                            "representative, predicted_speedup, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                            (test_id, pipeline, hashes[0], hashes[1], representative, speedup, now))
+                    if 'suggestions' in entry:
+                        self._conn.execute("DELETE FROM suggestions WHERE test_id = ? AND pipeline = ?",
+                                           (test_id, pipeline))
+                        self._conn.executemany("INSERT INTO suggestions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                               entry['suggestions'])
+                    if 'modified_configs' in entry:
+                        self._conn.execute("DELETE FROM modified_configs WHERE test_id = ? AND pipeline = ?",
+                                           (test_id, pipeline))
+                        self._conn.executemany("INSERT INTO modified_configs VALUES (?, ?, ?, ?)",
+                                               entry['modified_configs'])
+
+    # --- Queries ---
+
+    def _text(self, text_hash: str) -> str:
+        row = self._conn.execute("SELECT body FROM texts WHERE hash = ?", (text_hash,)).fetchone()
+        return zlib.decompress(row[0]).decode('utf-8') if row else None
+
+    def has_suggestion(self, test_id: str, pipeline: str) -> bool:
+        """
+        Whether an analysis of the job under the pipeline is stored (or buffered).
+        """
+        with self._lock:
+            if 'analysis' in self._pending.get((test_id, pipeline), {}):
+                return True
+            return self._conn.execute("SELECT 1 FROM analyses WHERE test_id = ? AND pipeline = ?",
+                                      (test_id, pipeline)).fetchone() is not None
+
+    def suggestion(self, test_id: str, pipeline: str):
+        """
+        The stored analysis of a job, or None.
+
+        Returns:
+            dict: 'prompt', 'response', 'representative', 'predicted_speedup' and 'created_at'.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT prompt_hash, response_hash, representative, predicted_speedup, created_at "
+                "FROM analyses WHERE test_id = ? AND pipeline = ?", (test_id, pipeline)).fetchone()
+            if row is None:
+                return None
+            return {'prompt': self._text(row[0]), 'response': self._text(row[1]), 'representative': row[2],
+                    'predicted_speedup': row[3], 'created_at': row[4]}
+
+    def analyses(self, pipeline: str = None) -> pd.DataFrame:
+        """
+        The stored analyses (without their texts), optionally of one pipeline.
+        """
+        query = "SELECT test_id, pipeline, representative, predicted_speedup, created_at FROM analyses"
+        params = ()
+        if pipeline is not None:
+            query += " WHERE pipeline = ?"
+            params = (pipeline,)
+        with self._lock:
+            return pd.read_sql_query(query + " ORDER BY pipeline, test_id", self._conn, params=params)
+
+    def changes(self, test_id: str = None, pipeline: str = None, parameter: str = None,
+                changed_only: bool = True) -> pd.DataFrame:
+        """
+        Suggestion rows filtered by test_id, pipeline and/or parameter (all indexed).
+
+        Args:
+            changed_only (bool): Only parameters whose suggested value differs from the original.
+        """
+        conditions, params = [], []
+        for column, value in (('test_id', test_id), ('pipeline', pipeline), ('parameter', parameter)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if changed_only:
+            conditions.append("changed = 1")
+        query = ("SELECT test_id, pipeline, parameter, original_value, suggested_value, impact, risk, extra "
+                 "FROM suggestions" + (" WHERE " + " AND ".join(conditions) if conditions else "")
+                 + " ORDER BY pipeline, test_id, position")
+        with self._lock:
+            return pd.read_sql_query(query, self._conn, params=params)
+
+    def comparison_frame(self, test_id: str, pipeline: str):
+        """
+        The stored comparison table of a job, as utils.build_comparison_frame returned it, or None.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT parameter, original_value, suggested_value, impact, risk, extra FROM suggestions "
+                "WHERE test_id = ? AND pipeline = ? ORDER BY position", (test_id, pipeline)).fetchall()
+        if not rows:
+            return None
+        records = []
+        for parameter, original, suggested, impact, risk, extra in rows:
+            record = {'Parameter': parameter,
+                      'Original Value': 'N/A' if original is None else original,
+                      f'{pipeline} Suggested Value': suggested,
+                      f'{pipeline} Impact': 'N/A' if impact is None else impact,
+                      f'{pipeline} Risk': 'N/A' if risk is None else risk}
+            for suffix, value in (json.loads(extra) if extra else {}).items():
+                record[f'{pipeline} {suffix}'] = value
+            records.append(record)
+        return pd.DataFrame(records)
+
+    def modified_config(self, test_id: str, pipeline: str):
+        """
+        The stored modified configuration row(s) of a job, or None.
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT row FROM modified_configs WHERE test_id = ? AND pipeline = ? "
+                                      "ORDER BY position", (test_id, pipeline)).fetchall()
+        if not rows:
+            return None
+        return pd.DataFrame([json.loads(row[0]) for row in rows])
+
+    def export(self, output_dir: Path, test_id: str = None, pipeline: str = None) -> int:
+        """
+        Writes the per-job suggestion, comparison and modified configuration
+        files of the stored analyses, as the analyzer writes them with
+        results.export_files on.
+
+        Returns:
+            int: The number of analyses exported.
+        """
+        output_dir.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            query = "SELECT test_id, pipeline, representative FROM analyses"
+            conditions = [f"{c} = ?" for c, v in (('test_id', test_id), ('pipeline', pipeline)) if v is not None]
+            params = [v for v in (test_id, pipeline) if v is not None]
+            keys = self._conn.execute(query + (" WHERE " + " AND ".join(conditions) if conditions else ""),
+                                      params).fetchall()
+        for job_id, job_pipeline, representative in keys:
+            # Cluster members share their representative's suggestion file
+            if representative is None:
+                analysis = self.suggestion(job_id, job_pipeline)
+                (output_dir / f"suggestion_{job_pipeline}_{job_id}.txt").write_text(
+                    format_suggestion(job_pipeline, job_id, analysis['prompt'], analysis['response']))
+            comparison = self.comparison_frame(job_id, job_pipeline)
+            if comparison is not None:
+                comparison.to_csv(output_dir / f"comparison_suggestions_{job_pipeline}_{job_id}.csv", index=False)
+            modified = self.modified_config(job_id, job_pipeline)
+            if modified is not None:
+                modified.to_csv(output_dir / f"ior_configurations_modified_{job_pipeline}_{job_id}.csv", index=False)
+        return len(keys)
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._conn.close()
+
+
+def read_suggestion(output_dir: Path, pipeline: str, test_id: str, store: ResultsStore = None):
+    """
+    The saved LLM response for a job, from the results store or, failing
+    that, its suggestion_*.txt file (without the prompt, whose example and
+    job data must not be parsed as the suggestion). None if neither has it.
+    """
+    if store is not None:
+        analysis = store.suggestion(test_id, pipeline)
+        if analysis is not None:
+            return analysis['response']
+    suggestion_file = output_dir / f"suggestion_{pipeline}_{test_id}.txt"
+    return suggestion_response(suggestion_file.read_text()) if suggestion_file.exists() else None
+
+
+def main():
+    base_dir = Path(__file__).resolve().parent
+    parser = argparse.ArgumentParser(description="Query or export the consolidated results store")
+    parser.add_argument('command', choices=['export', 'query'])
+    parser.add_argument('--store', type=Path, default=base_dir / 'output' / 'results.sqlite',
+                        help="The results database (default: output/results.sqlite next to this script).")
+    parser.add_argument('--output-dir', type=Path, default=base_dir / 'output',
+                        help="export: directory the files are written to (default: output/).")
+    parser.add_argument('--test-id', help="Only this job.")
+    parser.add_argument('--pipeline', help="Only this pipeline.")
+    parser.add_argument('--parameter', help="query: only suggestions for this parameter.")
+    parser.add_argument('--all-parameters', action='store_true',
+                        help="query: include parameters the suggestion leaves unchanged.")
+    parser.add_argument('--csv', type=Path, help="query: save the result to this CSV instead of printing it.")
+    args = parser.parse_args()
+
+    if not args.store.exists():
+        print(f"Error: results store '{args.store}' not found.")
+        return
+    store = ResultsStore(args.store)
+    try:
+        if args.command == 'export':
+            count = store.export(args.output_dir, test_id=args.test_id, pipeline=args.pipeline)
+            print(f"Exported {count} analyses to '{args.output_dir}'.")
+        else:
+            df = store.changes(test_id=args.test_id, pipeline=args.pipeline, parameter=args.parameter,
+                               changed_only=not args.all_parameters)
+            if args.csv:
+                df.to_csv(args.csv, index=False)
+                print(f"Saved {len(df)} rows to: {args.csv}")
+            else:
+                print(df.to_string(index=False) if len(df) else "No matching suggestions.")
+    finally:
+        store.close()
+
+
+if __name__ == '__main__':
+    main()
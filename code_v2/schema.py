@@ -0,0 +1,149 @@
+# schema.py
+import numpy as np
+import pandas as pd
+
+SIZE_UNITS = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+
+# IOR parameters written as sizes ('4K', '1M', ...) in ior_configurations(in).csv
+SIZE_PARAMETERS = ['transferSize', 'blockSize', 'setAlignment', 'LUSTRE_STRIPE_SIZE']
+
+# Text columns stored as pandas categoricals (few distinct values)
+CATEGORICAL_COLUMNS = ['api']
+
+# Only the IOR configuration table (keyed on this column) holds size strings;
+# LUSTRE_STRIPE_SIZE in the Darshan and SHAP tables is already a number
+SIZE_TABLE_KEY = 'testFile'
+
+
+def parse_size(value) -> int:
+    """
+    Converts an IOR size string such as '4K', '1M' or '16M' (or a plain
+    number) to bytes. Returns None if the value is not a size.
+    """
+    text = str(value).strip().upper()
+    if text.endswith('B'):
+        text = text[:-1]
+    multiplier = SIZE_UNITS.get(text[-1:], 1)
+    if multiplier != 1:
+        text = text[:-1]
+    try:
+        return int(float(text) * multiplier)
+    except ValueError:
+        return None
+
+
+def format_size(size) -> str:
+    """
+    The inverse of parse_size: bytes as an IOR size string in the largest
+    unit that divides them exactly (4096 -> '4K', 16777216 -> '16M').
+    """
+    size = int(size)
+    for unit, multiplier in sorted(SIZE_UNITS.items(), key=lambda item: -item[1]):
+        if size and size % multiplier == 0:
+            return f"{size // multiplier}{unit}"
+    return str(size)
+
+
+def parse_sizes(values: pd.Series) -> pd.Series:
+    """
+    Vectorized parse_size: each distinct value is parsed once and mapped
+    back through its factorized codes.
+
+    Returns:
+        An int64 Series of bytes, or None if any value is not a size.
+    """
+    if pd.api.types.is_integer_dtype(values):
+        return values.astype(np.int64)
+    codes, uniques = pd.factorize(values)
+    parsed = [parse_size(v) for v in uniques]
+    if (codes < 0).any() or any(size is None for size in parsed):
+        return None
+    return pd.Series(np.asarray(parsed, dtype=np.int64)[codes], index=values.index, name=values.name)
+
+
+def format_sizes(values: pd.Series) -> pd.Series:
+    """
+    Vectorized format_size, back to an object column of size strings.
+    """
+    codes, uniques = pd.factorize(values)
+    labels = np.array([format_size(v) for v in uniques] + [np.nan], dtype=object)
+    return pd.Series(labels[codes], index=values.index, name=values.name)
+
+
+def _downcast_int(column: pd.Series) -> pd.Series:
+    info = np.iinfo(np.int32)
+    if len(column) and (column.min() < info.min or column.max() > info.max):
+        return column
+    return column.astype(np.int32)
+
+
+def _downcast_float(column: pd.Series, float32_rtol: float) -> pd.Series:
+    values = column.to_numpy()
+    narrow = values.astype(np.float32)
+    with np.errstate(over='ignore', invalid='ignore'):
+        wide = narrow.astype(np.float64)
+        if float32_rtol:
+            close = np.isclose(wide, values, rtol=float32_rtol, atol=0, equal_nan=True)
+        else:
+            close = (wide == values) | (np.isnan(wide) & np.isnan(values))
+    if not close.all():
+        return column
+    return pd.Series(narrow, index=column.index, name=column.name)
+
+
+def compact_frame(df: pd.DataFrame, float32_rtol: float = 0.0) -> pd.DataFrame:
+    """
+    Returns a memory-compact copy of one of the input tables:
+      - size parameters of the IOR configuration table become int bytes,
+      - the api column becomes a categorical,
+      - integer columns become int32 and float columns float32 where the
+        values survive the conversion (float32_rtol > 0 also accepts floats
+        within that relative error, e.g. 1e-6 for SHAP values).
+
+    Use display_frame() to get the original text form back. Nothing persisted
+    may depend on the types chosen here: the checkpoint fingerprints hash
+    checkpoint.canonical_frame(), which is the same for a table and its
+    compact copy.
+    """
+    columns = {}
+    for name in df.columns:
+        column = df[name]
+        if name in SIZE_PARAMETERS and SIZE_TABLE_KEY in df.columns and not pd.api.types.is_numeric_dtype(column):
+            sizes = parse_sizes(column)
+            if sizes is not None:
+                column = sizes
+        if name in CATEGORICAL_COLUMNS and column.dtype == object:
+            column = column.astype('category')
+        elif pd.api.types.is_integer_dtype(column) and column.dtype != np.int32:
+            column = _downcast_int(column)
+        elif pd.api.types.is_float_dtype(column) and column.dtype != np.float32:
+            column = _downcast_float(column, float32_rtol)
+        columns[name] = column
+    return pd.DataFrame(columns, index=df.index)
+
+
+def display_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    The text form of (part of) a compact_frame() table, as it is written in
+    the CSVs: sizes as '4K'/'1M' strings and categoricals as plain strings.
+    Frames that are already in text form are returned unchanged.
+    """
+    if SIZE_TABLE_KEY not in df.columns:
+        return df
+    converted = {}
+    for name in df.columns:
+        column = df[name]
+        if name in SIZE_PARAMETERS and pd.api.types.is_integer_dtype(column):
+            converted[name] = format_sizes(column)
+        elif isinstance(column.dtype, pd.CategoricalDtype):
+            converted[name] = column.astype(object)
+    if not converted:
+        return df
+    return df.assign(**converted)
+
+
+def memory_bytes(df: pd.DataFrame) -> int:
+    """
+    Memory used by a DataFrame, including the contents of string columns.
+    """
+    return int(df.memory_usage(deep=True).sum())
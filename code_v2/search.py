@@ -0,0 +1,234 @@
+# search.py
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from surrogate import knn_mean
+from utils import PARAMETER_TYPES
+
+# Candidates scored per task; bounds the (candidates x features) matrix of one task
+SCORE_CHUNK_ROWS = 65536
+
+# Largest grid that is enumerated and scored exhaustively; bigger grids use beam search
+MAX_EXHAUSTIVE_CANDIDATES = 5_000_000
+
+# Per-process state for _score_range, set once by _init_worker
+_worker_state = {}
+
+
+def _init_worker(value_features, radices, train_features, train_targets, k):
+    _worker_state.update(value_features=value_features, radices=radices,
+                         train_features=train_features, train_targets=train_targets, k=k)
+
+
+def _assemble_features(value_features: list, indices: np.ndarray) -> np.ndarray:
+    """
+    Builds the feature matrix of candidates given as (candidates x parameters)
+    value indices, by gathering each parameter's precomputed feature columns.
+    """
+    return np.hstack([table[indices[:, p]] for p, table in enumerate(value_features)])
+
+
+def _score_range(bounds):
+    """
+    Scores the grid candidates with linear index in [start, stop).
+    """
+    start, stop = bounds
+    state = _worker_state
+    indices = np.column_stack(np.unravel_index(np.arange(start, stop), state['radices']))
+    features = _assemble_features(state['value_features'], indices)
+    return knn_mean(state['train_features'], state['train_targets'], features, state['k'])
+
+
+class ConfigSearch:
+    """
+    Deterministic, non-LLM baseline: searches the grid of IOR parameter
+    values (the parameter_options pasted into the prompt) for the
+    configurations the surrogate model predicts to be fastest.
+
+    The predicted performance of a configuration does not depend on the job,
+    so the whole grid is scored once, in chunks across a process pool, and
+    every job's best-k is then a masked selection over the scored grid
+    (candidates within max_changes of the job's configuration). Grids larger
+    than max_exhaustive are searched per job with a beam search instead.
+
+    The grid holds only the values of each parameter that occur in the
+    surrogate's training configurations: the model cannot tell unseen values
+    apart, so they would only add arbitrarily ranked near-duplicates.
+    Candidates the model scores identically are collapsed into the one with
+    the fewest changes.
+
+    Args:
+        surrogate (surrogate.KNNSurrogate): The cost model.
+        options (dict): Parameter -> list of possible values, as from
+                        utils.discover_parameter_options.
+        workers (int): Processes used to score the grid (default: CPU count).
+        max_exhaustive (int): Largest grid that is scored exhaustively.
+        beam_width (int): States kept per step of the beam search.
+    """
+
+    def __init__(self, surrogate, options: dict, workers: int = None,
+                 max_exhaustive: int = MAX_EXHAUSTIVE_CANDIDATES, beam_width: int = 64):
+        self.surrogate = surrogate
+        # In the encoder's order, so assembled candidate features line up with the training features
+        self.parameters = [p for p in surrogate.encoder.parameters if p in options and p in PARAMETER_TYPES]
+        self.values = [self._seen_values(p, list(options[p])) for p in self.parameters]
+        self.radices = tuple(len(v) for v in self.values)
+        self.value_features = [surrogate.encoder.encode_values(p, v) for p, v in zip(self.parameters, self.values)]
+        self.workers = workers or os.cpu_count() or 1
+        self.max_exhaustive = max_exhaustive
+        self.beam_width = beam_width
+        self._grid_scores = None
+        self._grid_indices = None
+
+    def _seen_values(self, param: str, values: list) -> list:
+        """
+        The values of a parameter whose encoding matches some training
+        configuration (compared encoded, so '1M' matches 1048576 bytes).
+        """
+        encoder = self.surrogate.encoder
+        trained = np.unique(self.surrogate.features[:, encoder.slices[param]], axis=0)
+        encoded = encoder.encode_values(param, values)
+        seen = [value for value, row in zip(values, encoded)
+                if np.isclose(trained, row[None, :]).all(axis=1).any()]
+        return seen or values
+
+    @staticmethod
+    def _distinct_best(scores: np.ndarray, changes: np.ndarray, k: int) -> np.ndarray:
+        """
+        Positions of the k best distinct scores, best first, each taken from
+        its candidate with the fewest changes (then the lowest position).
+        """
+        distinct = np.unique(scores)
+        threshold = distinct[-min(k, len(distinct))]
+        candidates = np.flatnonzero(scores >= threshold)
+        order = candidates[np.lexsort((candidates, changes[candidates], -scores[candidates]))]
+        ordered_scores = scores[order]
+        first = np.r_[True, ordered_scores[1:] != ordered_scores[:-1]]
+        return order[first][:k]
+
+    @property
+    def grid_size(self) -> int:
+        return int(np.prod(self.radices, dtype=np.int64))
+
+    @property
+    def exhaustive(self) -> bool:
+        return self.grid_size <= self.max_exhaustive
+
+    def _value_indices(self, config: dict) -> np.ndarray:
+        """
+        The index of each parameter's value in its option list (-1 if not an option).
+        """
+        indices = np.full(len(self.parameters), -1, dtype=np.int16)
+        for p, (param, values) in enumerate(zip(self.parameters, self.values)):
+            as_text = [str(v) for v in values]
+            if str(config.get(param)) in as_text:
+                indices[p] = as_text.index(str(config.get(param)))
+        return indices
+
+    def _score_indices(self, indices: np.ndarray) -> np.ndarray:
+        features = _assemble_features(self.value_features, indices)
+        return knn_mean(self.surrogate.features, self.surrogate.targets, features, self.surrogate.k)
+
+    def score_grid(self) -> np.ndarray:
+        """
+        Predicted log10(bandwidth) of every grid candidate, computed once.
+        """
+        if self._grid_scores is not None:
+            return self._grid_scores
+        n = self.grid_size
+        bounds = [(start, min(start + SCORE_CHUNK_ROWS, n)) for start in range(0, n, SCORE_CHUNK_ROWS)]
+        init_args = (self.value_features, self.radices, self.surrogate.features,
+                     self.surrogate.targets, self.surrogate.k)
+        if self.workers > 1 and len(bounds) > 1:
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=init_args) as pool:
+                parts = list(pool.map(_score_range, bounds))
+        else:
+            _init_worker(*init_args)
+            parts = [_score_range(b) for b in bounds]
+        self._grid_scores = np.concatenate(parts)
+        self._grid_indices = np.column_stack(np.unravel_index(np.arange(n), self.radices)).astype(np.int16)
+        return self._grid_scores
+
+    def _result(self, original_indices: np.ndarray, indices: np.ndarray, score: float, original_score: float) -> dict:
+        changes = {param: self.values[p][indices[p]]
+                   for p, param in enumerate(self.parameters) if indices[p] != original_indices[p]}
+        return {'changes': changes, 'predicted_speedup': float(10 ** (score - original_score))}
+
+    def best_k(self, original_config: dict, k: int = 5, max_changes: int = None) -> list:
+        """
+        The k configurations predicted to be fastest for a job.
+
+        Args:
+            original_config (dict): The job's current configuration (parameter: value).
+            k (int): Number of configurations to return.
+            max_changes (int): Change at most this many parameters (default: no limit).
+
+        Returns:
+            A list of dicts with 'changes' (parameter: new value) and
+            'predicted_speedup' over the original configuration, best first.
+        """
+        original_indices = self._value_indices(original_config)
+        original_score = self.surrogate.predict([original_config])[0]
+        if not self.exhaustive:
+            return self.beam_search(original_config, k, max_changes)
+
+        scores = self.score_grid()
+        distance = (self._grid_indices != original_indices[None, :]).sum(axis=1)
+        candidates = np.arange(len(scores))
+        if max_changes is not None:
+            candidates = np.flatnonzero(distance <= max_changes)
+        if len(candidates) == 0:
+            return []
+        best = candidates[self._distinct_best(scores[candidates], distance[candidates], k)]
+        return [self._result(original_indices, self._grid_indices[i], scores[i], original_score) for i in best]
+
+    def beam_search(self, original_config: dict, k: int = 5, max_changes: int = None) -> list:
+        """
+        Pruned search for grids too large to enumerate: starting from the
+        job's configuration, every step changes one more parameter in each of
+        the beam_width best states found so far.
+        """
+        original_indices = self._value_indices(original_config)
+        original_score = self.surrogate.predict([original_config])[0]
+        start = np.maximum(original_indices, 0)
+        max_changes = len(self.parameters) if max_changes is None else max_changes
+
+        seen = {tuple(start)}
+        best = {tuple(start): float(self._score_indices(start[None, :])[0])}
+        beam = [start]
+        for _ in range(max_changes):
+            expansions = []
+            for state in beam:
+                for p, radix in enumerate(self.radices):
+                    if state[p] != start[p]:
+                        continue
+                    for value in range(radix):
+                        if value == state[p]:
+                            continue
+                        candidate = state.copy()
+                        candidate[p] = value
+                        if tuple(candidate) not in seen:
+                            seen.add(tuple(candidate))
+                            expansions.append(candidate)
+            if not expansions:
+                break
+            expansions = np.array(expansions)
+            scores = self._score_indices(expansions)
+            order = np.lexsort((np.arange(len(scores)), -scores))[:self.beam_width]
+            beam = [expansions[i] for i in order]
+            best.update((tuple(expansions[i]), float(scores[i])) for i in order)
+
+        states = np.array(list(best))
+        scores = np.array(list(best.values()))
+        changes = (states != original_indices[None, :]).sum(axis=1)
+        return [self._result(original_indices, states[i], scores[i], original_score)
+                for i in self._distinct_best(scores, changes, k)]
+
+
+def format_changes(changes: dict) -> str:
+    """
+    Formats a set of parameter changes as 'param = value; ...', or 'no change'.
+    """
+    return "; ".join(f"{param} = {value}" for param, value in changes.items()) or "no change"
@@ -0,0 +1,411 @@
+# service.py
+"""
+Long-lived analyzer daemon. The job tables, diagnoses, prompt compiler,
+surrogate model, configuration index and the LLM client's connection pool
+are loaded once and kept warm; analyses are then requested over a local
+HTTP port or a Unix socket.
+
+Endpoints:
+    POST /analyze          {"test_id": ..., "pipeline": ..., "wait": false, "force": false}
+                           Starts (or joins) the analysis of one job. Returns
+                           202 with the analysis id, or 200 with the result
+                           when "wait" is true.
+    GET  /suggestion/<id>  Status and result of an analysis; the id is
+                           '<pipeline>_<test_id>', as in the suggestion file names.
+    POST /reload           Reloads the data tables (e.g. after darshan_ingest.py).
+    GET  /health           Jobs loaded, analyses in flight, uptime.
+    GET  /metrics          Stage timings, token usage, cache hits and retries
+                           since startup, in the Prometheus text format.
+
+Concurrent requests for the same (test_id, pipeline) share one analysis.
+Jobs the checkpoint marks as done with unchanged inputs are answered from
+the stored suggestion unless "force" is set.
+
+Usage:
+    python service.py --port 8098
+    python service.py --socket /tmp/agent_io.sock
+    curl -s localhost:8098/analyze -d '{"test_id": "test00736", "pipeline": "darshan_shap", "wait": true}'
+    curl -s --unix-socket /tmp/agent_io.sock http://localhost/suggestion/darshan_shap_test00736
+"""
+import argparse
+import json
+import os
+import signal
+import socketserver
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+
+import yaml
+
+import metrics
+
+from agent import build_job_prompt
+from batch import write_suggestion_csvs
+from checkpoint import job_fingerprints, input_hash
+from data_loader import IOR_CONFIG_FILE
+from diagnosis import DiagnosisEngine
+from llm_api import call_llm, configure as configure_llm, LLMError
+from main import load_store, make_checkpoint, make_config_index, make_prompt_compiler, make_results_store, make_surrogate
+from utils import discover_parameter_options, extract_pipeline_data, save_suggestion, suggestion_response
+
+
+class AnalyzerState:
+    """
+    Everything an analysis needs that does not depend on the request, built once per (re)load.
+    """
+
+    def __init__(self, config, data_dir: Path):
+        self.store = load_store(config, data_dir)
+        if self.store is None:
+            raise RuntimeError(f"Could not load the data tables from '{data_dir}'")
+        self.ior_config_df = self.store.ior_config_df
+        self.config_positions = self.store.ior_config_positions
+        self.parameter_options = discover_parameter_options(self.ior_config_df)
+        self.diagnoses = DiagnosisEngine(self.store)
+        self.compiler = make_prompt_compiler(config, self.parameter_options)
+        self.surrogate = make_surrogate(config, self.store.config_df, self.store.tags)
+        self.config_index = make_config_index(config, self.ior_config_df,
+                                              dict(zip(self.store.test_ids, self.store.tags)))
+        self.fingerprints = job_fingerprints(self.store.raw_df, self.store.shap_df, self.store.config_df)
+        self.loaded_at = time.time()
+
+
+class AnalyzerService:
+    """
+    Runs analyses on a bounded thread pool against the warm AnalyzerState.
+
+    Args:
+        config (dict): The parsed config.yaml.
+        data_dir (Path): The path to the 'data' directory.
+        output_dir (Path): Where suggestion and CSV files are written.
+        concurrency (int): Maximum analyses (LLM calls) in flight at once.
+    """
+
+    def __init__(self, config, data_dir: Path, output_dir: Path, concurrency: int = 8):
+        self.config = config
+        self.data_dir = data_dir
+        self.output_dir = output_dir
+        self.pipelines = [p['type'] for p in config['pipelines']]
+        self.state = AnalyzerState(config, data_dir)
+        self.results = make_results_store(config, output_dir)
+        self.checkpoint = make_checkpoint(config, output_dir, self.results)
+        self.started_at = time.time()
+        self._executor = ThreadPoolExecutor(max_workers=concurrency)
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._results = {}
+
+    @staticmethod
+    def analysis_id(pipeline: str, test_id: str) -> str:
+        return f"{pipeline}_{test_id}"
+
+    def reload(self) -> int:
+        """
+        Rebuilds the warm state from the data directory; analyses in flight finish on the old one.
+        """
+        state = AnalyzerState(self.config, self.data_dir)
+        self.state = state
+        return len(state.store)
+
+    def submit(self, test_id: str, pipeline: str, force: bool = False):
+        """
+        Starts the analysis of one job, or joins the one already in flight.
+
+        Returns:
+            A tuple (analysis id, future, coalesced).
+
+        Raises:
+            KeyError: If the job is not in the loaded tables.
+            ValueError: If the pipeline is unknown.
+        """
+        if pipeline not in self.pipelines:
+            raise ValueError(f"Unknown pipeline '{pipeline}' (expected one of {', '.join(self.pipelines)})")
+        state = self.state
+        job = state.store.get(test_id)
+        if job is None:
+            raise KeyError(f"Unknown test_id '{test_id}'")
+
+        analysis_id = self.analysis_id(pipeline, test_id)
+        with self._lock:
+            future = self._in_flight.get(analysis_id)
+            if future is not None:
+                return analysis_id, future, True
+            self._results[analysis_id] = {'id': analysis_id, 'test_id': test_id, 'pipeline': pipeline,
+                                          'status': 'running', 'submitted_at': time.time()}
+            future = self._executor.submit(self._analyze_safely, state, job, pipeline, force)
+            self._in_flight[analysis_id] = future
+
+        def finished(done_future):
+            with self._lock:
+                self._in_flight.pop(analysis_id, None)
+                self._results[analysis_id] = done_future.result()
+
+        future.add_done_callback(finished)
+        return analysis_id, future, False
+
+    def _analyze_safely(self, state: AnalyzerState, job, pipeline: str, force: bool) -> dict:
+        with metrics.job(job.test_id, pipeline):
+            try:
+                result = self._analyze(state, job, pipeline, force)
+            except Exception as e:
+                print(f"Error: analysis of {pipeline} {job.test_id} failed: {e}")
+                result = {'id': self.analysis_id(pipeline, job.test_id), 'test_id': job.test_id,
+                          'pipeline': pipeline, 'status': 'failed', 'error': str(e)}
+        metrics.finish_job(job.test_id, pipeline, 'skipped' if result.get('from_checkpoint') else result['status'],
+                           latency_s=result.get('latency_s'), error=result.get('error'))
+        return result
+
+    def _analyze(self, state: AnalyzerState, job, pipeline: str, force: bool) -> dict:
+        analysis_id = self.analysis_id(pipeline, job.test_id)
+        result = {'id': analysis_id, 'test_id': job.test_id, 'pipeline': pipeline}
+        task = {
+            'test_id': job.test_id,
+            'pipeline': pipeline,
+            'prompt': build_job_prompt(pipeline, job.raw, job.shap, job.config, state.parameter_options,
+                                       diagnosis_summary=state.diagnoses.summary(pipeline, job.position),
+                                       compiler=state.compiler),
+            'original_config': job.original_config,
+            'input_hash': input_hash(pipeline, [(job.test_id, state.fingerprints[job.position])]),
+        }
+        if not force and self.checkpoint is not None and self.checkpoint.is_done(task, self.output_dir):
+            return {**self.read_suggestion(analysis_id), 'from_checkpoint': True}
+
+        start = time.perf_counter()
+        if self.checkpoint is not None:
+            self.checkpoint.record(task, 'started')
+        try:
+            suggestion = call_llm(task['prompt'])
+        except LLMError as e:
+            latency = time.perf_counter() - start
+            if self.checkpoint is not None:
+                self.checkpoint.record(task, 'failed', latency_s=latency, error=str(e))
+            return {**result, 'status': 'failed', 'error': str(e), 'latency_s': latency}
+
+        if self.results is None or self.results.export_files:
+            with metrics.span('save'):
+                result['suggestion_file'] = str(save_suggestion(self.output_dir, pipeline, job.test_id,
+                                                                task['prompt'], suggestion))
+        with metrics.span('parse'):
+            _, after_changes = extract_pipeline_data(suggestion)
+        speedup = write_suggestion_csvs(task['original_config'], after_changes, pipeline, job.test_id,
+                                        self.output_dir, self.data_dir / IOR_CONFIG_FILE,
+                                        ior_config_df=state.ior_config_df, surrogate=state.surrogate,
+                                        min_speedup=self.config.get('surrogate', {}).get('min_speedup'),
+                                        config_index=state.config_index, store=self.results,
+                                        config_positions=state.config_positions)
+        if self.results is not None:
+            # Committed per analysis, so a result the service reports is always in the store
+            with metrics.span('save'):
+                self.results.add_analysis(job.test_id, pipeline, task['prompt'], suggestion,
+                                          predicted_speedup=speedup)
+                self.results.flush()
+        latency = time.perf_counter() - start
+        if self.checkpoint is not None:
+            self.checkpoint.record(task, 'done', latency_s=latency)
+        return {**result, 'status': 'done', 'latency_s': latency,
+                'changes': {param: details['value'] for param, details in after_changes.items()},
+                'predicted_speedup': speedup, 'suggestion': suggestion}
+
+    def read_suggestion(self, analysis_id: str):
+        """
+        The result of a finished analysis from the results store or its
+        suggestion file, or None if there is none.
+        """
+        pipeline = next((p for p in self.pipelines if analysis_id.startswith(f"{p}_")), None)
+        if pipeline is None:
+            return None
+        test_id = analysis_id[len(pipeline) + 1:]
+        result = {'id': analysis_id, 'test_id': test_id, 'pipeline': pipeline, 'status': 'done'}
+        stored = self.results.suggestion(test_id, pipeline) if self.results is not None else None
+        suggestion_file = self.output_dir / f"suggestion_{analysis_id}.txt"
+        if suggestion_file.exists():
+            result['suggestion_file'] = str(suggestion_file)
+        if stored is not None:
+            suggestion = stored['response']
+            result['predicted_speedup'] = stored['predicted_speedup']
+        elif suggestion_file.exists():
+            suggestion = suggestion_response(suggestion_file.read_text())
+        else:
+            return None
+        _, after_changes = extract_pipeline_data(suggestion)
+        return {**result,
+                'changes': {param: details['value'] for param, details in after_changes.items()},
+                'suggestion': suggestion}
+
+    def result(self, analysis_id: str):
+        """
+        The status of an analysis started by this service, or the result of an earlier run on disk.
+        """
+        with self._lock:
+            result = self._results.get(analysis_id)
+        return result if result is not None else self.read_suggestion(analysis_id)
+
+    def health(self) -> dict:
+        with self._lock:
+            in_flight = len(self._in_flight)
+        return {'status': 'ok', 'jobs': len(self.state.store), 'pipelines': self.pipelines,
+                'in_flight': in_flight, 'uptime_s': time.time() - self.started_at,
+                'data_loaded_at': self.state.loaded_at}
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        if self.checkpoint is not None:
+            self.checkpoint.close()
+        if self.results is not None:
+            self.results.close()
+
+
+def _make_handler(service: AnalyzerService):
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status: int, body: dict):
+            data = json.dumps(body, default=str).encode('utf-8')
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _send_text(self, status: int, text: str, content_type: str):
+            data = text.encode('utf-8')
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _read_json(self) -> dict:
+            length = int(self.headers.get('Content-Length', 0))
+            return json.loads(self.rfile.read(length)) if length else {}
+
+        def do_GET(self):
+            path = self.path.split('?', 1)[0].rstrip('/')
+            if path == '/health':
+                self._send_json(200, service.health())
+            elif path == '/metrics':
+                self._send_text(200, metrics.prometheus_text(), "text/plain; version=0.0.4")
+            elif path.startswith('/suggestion/'):
+                result = service.result(path[len('/suggestion/'):])
+                if result is None:
+                    self._send_json(404, {'error': 'Unknown analysis id'})
+                else:
+                    self._send_json(200 if result['status'] != 'running' else 202, result)
+            else:
+                self._send_json(404, {'error': 'Not found'})
+
+        def do_POST(self):
+            path = self.path.split('?', 1)[0].rstrip('/')
+            try:
+                body = self._read_json()
+            except ValueError:
+                self._send_json(400, {'error': 'Malformed JSON body'})
+                return
+
+            if path == '/reload':
+                try:
+                    self._send_json(200, {'status': 'reloaded', 'jobs': service.reload()})
+                except RuntimeError as e:
+                    self._send_json(500, {'error': str(e)})
+                return
+            if path != '/analyze':
+                self._send_json(404, {'error': 'Not found'})
+                return
+            if not isinstance(body, dict) or 'test_id' not in body or 'pipeline' not in body:
+                self._send_json(400, {'error': "Expected a JSON object with 'test_id' and 'pipeline'"})
+                return
+
+            try:
+                analysis_id, future, coalesced = service.submit(str(body['test_id']), str(body['pipeline']),
+                                                                force=bool(body.get('force', False)))
+            except KeyError as e:
+                self._send_json(404, {'error': e.args[0]})
+                return
+            except ValueError as e:
+                self._send_json(400, {'error': str(e)})
+                return
+            if body.get('wait'):
+                self._send_json(200, {**future.result(), 'coalesced': coalesced})
+            else:
+                self._send_json(202, {'id': analysis_id, 'status': 'running', 'coalesced': coalesced})
+
+    return Handler
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    The HTTP API on a Unix domain socket, one thread per connection.
+    """
+    daemon_threads = True
+
+
+def make_server(service: AnalyzerService, host: str = '127.0.0.1', port: int = 8098, socket_path: Path = None):
+    """
+    Creates the HTTP server for the service, on host:port or on a Unix socket if socket_path is given.
+    """
+    handler = _make_handler(service)
+    if socket_path is not None:
+        if socket_path.exists():
+            socket_path.unlink()
+        return UnixHTTPServer(str(socket_path), handler)
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def _interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def main():
+    base_dir = Path(__file__).resolve().parent
+    parser = argparse.ArgumentParser(description="Long-lived HPC I/O analyzer service")
+    parser.add_argument('--config', type=Path, default=base_dir / 'config.yaml',
+                        help="Path to the configuration file (default: config.yaml next to this script).")
+    parser.add_argument('--output-dir', type=Path, default=base_dir / 'output',
+                        help="Directory for suggestions and CSV outputs (default: output/ next to this script).")
+    parser.add_argument('--host', help="Address to listen on (default: service.host in config.yaml).")
+    parser.add_argument('--port', type=int, help="Port to listen on (default: service.port in config.yaml).")
+    parser.add_argument('--socket', type=Path, help="Listen on this Unix socket instead of a TCP port.")
+    parser.add_argument('--concurrency', type=int, help="Maximum analyses in flight (default: service.concurrency).")
+    parser.add_argument('--no-cache', action='store_true', help="Bypass the LLM response cache (fresh responses are still stored).")
+    args = parser.parse_args()
+
+    with open(args.config, 'r') as f:
+        config = yaml.safe_load(f)
+    service_config = config.get('service', {})
+    args.output_dir.mkdir(parents=True, exist_ok=True)
+    configure_llm(config.get('llm', {}), base_dir, bypass_cache=args.no_cache)
+    metrics.configure(config.get('metrics', {}), args.output_dir, run_info={'pipeline': 'service'})
+
+    service = AnalyzerService(config, base_dir / 'data_v2', args.output_dir,
+                              concurrency=args.concurrency or service_config.get('concurrency', 8))
+    socket_path = args.socket or (Path(service_config['socket']) if service_config.get('socket') else None)
+    server = make_server(service, host=args.host or service_config.get('host', '127.0.0.1'),
+                         port=args.port if args.port is not None else service_config.get('port', 8098),
+                         socket_path=socket_path)
+    where = f"unix:{socket_path}" if socket_path else "http://{}:{}".format(*server.server_address[:2])
+    print(f"Analyzer service ready on {where} ({len(service.state.store)} jobs loaded).")
+
+    signal.signal(signal.SIGTERM, _interrupt)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Shutting down...")
+    finally:
+        server.server_close()
+        service.close()
+        metrics.close()
+        if socket_path is not None and socket_path.exists():
+            os.unlink(socket_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+# surrogate.py
+import numpy as np
+import pandas as pd
+
+from schema import SIZE_PARAMETERS, parse_size
+
+# Columns of ior_configurations(in).csv that are identifiers, not parameters
+ID_COLUMNS = ['config_id', 'testFile']
+
+# Query rows per distance computation; bounds the (queries x training rows) matrix
+QUERY_CHUNK_ROWS = 4096
+
+
+class ConfigEncoder:
+    """
+    Turns IOR configurations into standardized numeric feature vectors.
+
+    Size parameters ('4K', '1M', ... or bytes) become log2(bytes), integer parameters
+    log2(1 + value), and any other text parameter (e.g. api) is one-hot
+    encoded over the values seen in training. Every feature is then scaled
+    to unit variance so no parameter dominates the distance.
+    """
+
+    def __init__(self, config_df: pd.DataFrame):
+        self.parameters = [c for c in config_df.columns if c not in ID_COLUMNS]
+        self.size_params = []
+        self.categories = {}
+        for param in self.parameters:
+            column = config_df[param]
+            if pd.api.types.is_numeric_dtype(column):
+                # Sizes already stored as bytes (schema.compact_frame)
+                if param in SIZE_PARAMETERS:
+                    self.size_params.append(param)
+                continue
+            if all(parse_size(v) is not None for v in column.unique()):
+                self.size_params.append(param)
+            else:
+                self.categories[param] = sorted(column.astype(str).unique().tolist())
+
+        # Feature columns of each parameter (one-hot parameters span several)
+        self.slices = {}
+        start = 0
+        for param in self.parameters:
+            width = len(self.categories.get(param, [None]))
+            self.slices[param] = slice(start, start + width)
+            start += width
+
+        raw = self._raw_features(config_df)
+        self.mean = np.nanmean(raw, axis=0)
+        std = np.nanstd(raw, axis=0)
+        self.scale = np.where(std > 0, std, 1.0)
+
+    def _raw_features(self, configs: pd.DataFrame) -> np.ndarray:
+        columns = []
+        for param in self.parameters:
+            values = configs[param] if param in configs else pd.Series([np.nan] * len(configs))
+            if param in self.categories:
+                text = values.astype(str).to_numpy()
+                columns.extend((text == category).astype(np.float64) for category in self.categories[param])
+            elif param in self.size_params:
+                if pd.api.types.is_numeric_dtype(values):
+                    sizes = values.to_numpy(dtype=np.float64)
+                else:
+                    sizes = np.array([parse_size(v) if pd.notna(v) else None for v in values], dtype=np.float64)
+                columns.append(np.log2(sizes))
+            else:
+                numbers = pd.to_numeric(values, errors='coerce').to_numpy(dtype=np.float64)
+                columns.append(np.log2(1 + np.maximum(numbers, 0)))
+        return np.column_stack(columns)
+
+    def transform(self, configs: pd.DataFrame) -> np.ndarray:
+        """
+        Encodes configurations (one per row). Missing or unparseable values
+        are placed at the training mean.
+        """
+        features = (self._raw_features(configs) - self.mean) / self.scale
+        return np.nan_to_num(features, nan=0.0)
+
+    def encode_values(self, param: str, values: list) -> np.ndarray:
+        """
+        The standardized feature columns of one parameter for each of the given values.
+        """
+        return self.transform(pd.DataFrame({param: list(values)}))[:, self.slices[param]]
+
+
+def knn_mean(features: np.ndarray, targets: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    """
+    Mean target of the k nearest (Euclidean) training rows of every query row.
+    """
+    k = min(k, len(targets))
+    predictions = np.empty(len(queries))
+    train_sq = (features ** 2).sum(axis=1)
+    for start in range(0, len(queries), QUERY_CHUNK_ROWS):
+        chunk = queries[start:start + QUERY_CHUNK_ROWS]
+        sq_dist = (chunk ** 2).sum(axis=1)[:, None] + train_sq[None, :] - 2 * chunk @ features.T
+        nearest = np.argpartition(sq_dist, k - 1, axis=1)[:, :k]
+        predictions[start:start + QUERY_CHUNK_ROWS] = targets[nearest].mean(axis=1)
+    return predictions
+
+
+class KNNSurrogate:
+    """
+    k-nearest-neighbour performance model over IOR configurations.
+
+    Trained on the profiled jobs' configurations and their performance tags
+    (I/O bandwidth; higher is better), it predicts log10(tag) as the mean of
+    the k nearest training configurations. Original and suggested
+    configurations are predicted the same way, so a configuration that was
+    actually run is not favoured by matching its own (noisy) result.
+    """
+
+    def __init__(self, config_df: pd.DataFrame, tags, k: int = 20):
+        self.encoder = ConfigEncoder(config_df)
+        self.features = self.encoder.transform(config_df)
+        self.targets = np.log10(np.asarray(tags, dtype=np.float64))
+        self.k = min(k, len(self.targets))
+
+    @classmethod
+    def from_tables(cls, sorted_df: pd.DataFrame, ior_config_df: pd.DataFrame, k: int = 20):
+        """
+        Trains on ior_configurations(in).csv joined with the sorted-by-tag table.
+        """
+        # The column name in ior_configurations(in).csv is 'testFile'
+        joined = ior_config_df.merge(sorted_df[['test_id', 'tag']], left_on='testFile', right_on='test_id')
+        return cls(joined.drop(columns=['test_id', 'tag']), joined['tag'], k=k)
+
+    @classmethod
+    def from_job_store(cls, store, k: int = 20):
+        """
+        Trains on the jobs of a JobStore.
+        """
+        return cls(store.config_df, store.tags, k=k)
+
+    def predict(self, configs) -> np.ndarray:
+        """
+        Predicts log10(bandwidth) for each configuration.
+
+        Args:
+            configs: A DataFrame with one configuration per row, or a list of
+                     parameter -> value dicts.
+        """
+        if not isinstance(configs, pd.DataFrame):
+            configs = pd.DataFrame(list(configs))
+        return knn_mean(self.features, self.targets, self.encoder.transform(configs), self.k)
+
+    def holdout_r2(self, holdout_fraction: float = 0.2, seed: int = 0) -> float:
+        """
+        R^2 of log10(bandwidth) on a random holdout of the training data, for
+        a model with the same k trained on the rest. Values near or below 0
+        mean the configuration parameters explain little of the performance.
+        """
+        order = np.random.default_rng(seed).permutation(len(self.targets))
+        n_test = max(1, int(len(order) * holdout_fraction))
+        test, train = order[:n_test], order[n_test:]
+        predicted = knn_mean(self.features[train], self.targets[train], self.features[test], self.k)
+        actual = self.targets[test]
+        return float(1 - ((predicted - actual) ** 2).sum() / ((actual - actual.mean()) ** 2).sum())
+
+    def score_suggestions(self, original_config: dict, suggested_changes: dict) -> dict:
+        """
+        Scores a suggestion against the original configuration in one batch:
+        all changes together, and each change on its own.
+
+        Args:
+            original_config (dict): The original I/O configuration (parameter: value).
+            suggested_changes (dict): Parsed After block (parameter: {'value': ..., ...}).
+
+        Returns:
+            dict: 'speedup' (predicted bandwidth ratio of all changes together)
+            and 'per_parameter' (parameter -> predicted ratio of that change alone).
+        """
+        changes = {param: details['value'] for param, details in suggested_changes.items()
+                   if param in self.encoder.parameters}
+        configs = [original_config, {**original_config, **changes}]
+        configs += [{**original_config, param: value} for param, value in changes.items()]
+        predicted = self.predict(configs)
+        ratios = 10 ** (predicted[1:] - predicted[0])
+        return {
+            'speedup': float(ratios[0]),
+            'per_parameter': {param: float(r) for param, r in zip(changes, ratios[1:])},
+        }
+
+
+def speedup_columns(scores: dict, pipeline_name: str) -> dict:
+    """
+    Formats score_suggestions() output as extra columns for utils.generate_suggestions_csv.
+    """
+    combined = f"{scores['speedup']:.3f}"
+    return {
+        f'{pipeline_name} Predicted Speedup': {p: f"{r:.3f}" for p, r in scores['per_parameter'].items()},
+        f'{pipeline_name} Combined Predicted Speedup': {p: combined for p in scores['per_parameter']},
+    }
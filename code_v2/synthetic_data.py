@@ -0,0 +1,216 @@
+# synthetic_data.py
+"""
+Synthetic copies of the data_v2 tables at a multiple of their size, for
+benchmarking (see benchmark_suite.py).
+
+A scale-N data set holds N replicas of the real data with the same four
+files, columns and dtypes:
+
+    ior_configurations(in).csv   the configuration grid repeated N times, with
+                                 fresh config_id/testFile values
+    raw Darshan / SHAP tables    every real job once per replica, pointing at
+                                 its configuration row in that replica; the
+                                 counters and the tag are scaled by a random
+                                 factor (sigma 0.1 in log space) and the SHAP
+                                 values perturbed by 5%
+    sorted-by-tag table          (test_id, tag) of every job, ascending by tag
+                                 (ties in the order of the real table)
+
+Replica 0 is the real data unchanged, so scale 1 reproduces the data_v2
+tables. The tables are written one replica at a time, so memory use does
+not grow with the scale.
+
+The data sets go to the user's cache directory by default (see cache_dir()),
+never into the source tree: at scale 100 and above they take gigabytes.
+
+Usage:
+    python synthetic_data.py 10                      # -> ~/.cache/agent_io/synthetic/data_v2-<hash>/scale_10
+    python synthetic_data.py 100 --output-dir /scratch/agent_io_x100 --seed 1
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from data_loader import SORTED_JOBS_FILE, RAW_DARSHAN_FILE, SHAP_VALUES_FILE, IOR_CONFIG_FILE
+
+# Bumped whenever the generated data changes, so stale data sets are regenerated
+GENERATOR_VERSION = 1
+MANIFEST_FILE = 'synthetic.json'
+SYNTHETIC_DIRNAME = 'synthetic'
+
+# Spread of the per-replica perturbations
+COUNTER_LOG_SIGMA = 0.1
+SHAP_RELATIVE_SIGMA = 0.05
+
+
+def cache_dir() -> Path:
+    """
+    Where generated benchmark files go: $AGENT_IO_CACHE_DIR if set, else
+    agent_io in $XDG_CACHE_HOME (~/.cache by default).
+    """
+    if os.environ.get('AGENT_IO_CACHE_DIR'):
+        return Path(os.environ['AGENT_IO_CACHE_DIR']).expanduser()
+    return Path(os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache').expanduser() / 'agent_io'
+
+
+def default_output_dir(data_dir: Path, scale: int) -> Path:
+    """
+    The cache directory of the scale-N data set generated from data_dir. Each
+    source directory gets its own subdirectory (named after a hash of its
+    absolute path), so data sets of different checkouts do not collide.
+    """
+    source = Path(data_dir).resolve()
+    key = hashlib.sha256(str(source).encode()).hexdigest()[:8]
+    return cache_dir() / SYNTHETIC_DIRNAME / f"{source.name}-{key}" / f"scale_{scale}"
+
+
+def is_generated(output_dir: Path, scale: int, seed: int = 0) -> bool:
+    """
+    True if output_dir holds a complete data set of this scale and seed from this generator version.
+    """
+    manifest_path = output_dir / MANIFEST_FILE
+    if not manifest_path.exists():
+        return False
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    return (manifest.get('generator_version') == GENERATOR_VERSION
+            and manifest.get('scale') == scale and manifest.get('seed') == seed)
+
+
+def _perturb_raw(raw_df: pd.DataFrame, rng: np.random.Generator) -> pd.DataFrame:
+    """
+    Scales every numeric column of the raw Darshan table by a random factor
+    per value; integer counters stay integers (and zero counters zero).
+    """
+    df = raw_df.copy()
+    for column in df.columns:
+        if column == 'test_id' or not pd.api.types.is_numeric_dtype(df[column]):
+            continue
+        factors = np.exp(rng.normal(0.0, COUNTER_LOG_SIGMA, len(df)))
+        values = df[column].to_numpy() * factors
+        if pd.api.types.is_integer_dtype(df[column]):
+            values = np.rint(values).astype(df[column].dtype)
+        df[column] = values
+    return df
+
+
+def _perturb_shap(shap_df: pd.DataFrame, rng: np.random.Generator) -> pd.DataFrame:
+    df = shap_df.copy()
+    numeric = [c for c in df.columns if c != 'test_id' and pd.api.types.is_numeric_dtype(df[c])]
+    df[numeric] = df[numeric].to_numpy() * (1.0 + rng.normal(0.0, SHAP_RELATIVE_SIGMA, (len(df), len(numeric))))
+    return df
+
+
+def generate(data_dir: Path, output_dir: Path, scale: int, seed: int = 0) -> dict:
+    """
+    Writes a scale-N synthetic copy of the four tables in data_dir to output_dir.
+
+    Args:
+        data_dir (Path): The real 'data' directory.
+        output_dir (Path): Where the synthetic tables are written (created if missing).
+        scale (int): Number of replicas of the real data.
+        seed (int): Seed of the perturbations.
+
+    Returns:
+        dict: The data set's manifest (scale, seed and the row count of each file), or None on error.
+    """
+    try:
+        config_df = pd.read_csv(data_dir / IOR_CONFIG_FILE)
+        raw_df = pd.read_csv(data_dir / RAW_DARSHAN_FILE)
+        shap_df = pd.read_csv(data_dir / SHAP_VALUES_FILE)
+        sorted_ids = pd.read_csv(data_dir / SORTED_JOBS_FILE, usecols=['test_id'])['test_id'].astype(str)
+    except FileNotFoundError as e:
+        print(f"Error: {e}.")
+        return None
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    (output_dir / MANIFEST_FILE).unlink(missing_ok=True)
+    start = time.perf_counter()
+
+    # Replica r maps configuration row p to testFile test<r * n_configs + p + 1>
+    n_configs = len(config_df)
+    width = max(5, len(str(scale * n_configs)))
+    config_position = pd.Series(np.arange(n_configs), index=config_df['testFile'].astype(str))
+    raw_positions = config_position.reindex(raw_df['test_id'].astype(str)).to_numpy()
+    shap_positions = config_position.reindex(shap_df['test_id'].astype(str)).to_numpy()
+    if np.isnan(raw_positions).any() or np.isnan(shap_positions).any():
+        print("Error: Some jobs have no row in the IOR configuration table.")
+        return None
+    raw_positions = raw_positions.astype(np.int64)
+    shap_positions = shap_positions.astype(np.int64)
+    # Jobs with equal tags keep the order of the real sorted table
+    sorted_rank = pd.Series(np.arange(len(sorted_ids)), index=sorted_ids).reindex(
+        raw_df['test_id'].astype(str)).fillna(len(sorted_ids)).to_numpy()
+
+    def ids(replica: int, positions: np.ndarray) -> np.ndarray:
+        numbers = replica * n_configs + positions + 1
+        return np.char.add('test', np.char.zfill(numbers.astype(str), width))
+
+    sorted_parts = []
+    for replica in range(scale):
+        rng = np.random.default_rng([seed, replica])
+        mode, header = ('w', True) if replica == 0 else ('a', False)
+
+        config_part = config_df.copy()
+        config_part['config_id'] = replica * n_configs + np.arange(1, n_configs + 1)
+        config_part['testFile'] = ids(replica, np.arange(n_configs))
+        config_part.to_csv(output_dir / IOR_CONFIG_FILE, mode=mode, header=header, index=False)
+
+        raw_part = raw_df if replica == 0 else _perturb_raw(raw_df, rng)
+        raw_part = raw_part.assign(test_id=ids(replica, raw_positions))
+        raw_part.to_csv(output_dir / RAW_DARSHAN_FILE, mode=mode, header=header, index=False)
+        sorted_parts.append(raw_part[['test_id', 'tag']].assign(rank=sorted_rank))
+
+        shap_part = shap_df if replica == 0 else _perturb_shap(shap_df, rng)
+        shap_part = shap_part.assign(test_id=ids(replica, shap_positions))
+        shap_part.to_csv(output_dir / SHAP_VALUES_FILE, mode=mode, header=header, index=False)
+
+    sorted_df = pd.concat(sorted_parts, ignore_index=True).sort_values(['tag', 'rank'], kind='stable')
+    sorted_df = sorted_df.drop(columns='rank')
+    sorted_df.to_csv(output_dir / SORTED_JOBS_FILE, index=False)
+
+    manifest = {
+        'generator_version': GENERATOR_VERSION,
+        'scale': scale,
+        'seed': seed,
+        'source': str(data_dir),
+        'rows': {IOR_CONFIG_FILE: scale * n_configs, RAW_DARSHAN_FILE: scale * len(raw_df),
+                 SHAP_VALUES_FILE: scale * len(shap_df), SORTED_JOBS_FILE: len(sorted_df)},
+        'generated_s': time.perf_counter() - start,
+    }
+    # Written last: a data set without a manifest is incomplete
+    with open(output_dir / MANIFEST_FILE, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def main():
+    base_dir = Path(__file__).resolve().parent
+    parser = argparse.ArgumentParser(description="Generate a synthetic copy of the data tables at N times their size")
+    parser.add_argument('scale', type=int, help="Size of the data set as a multiple of data_v2 (e.g. 1, 10, 100, 1000).")
+    parser.add_argument('--data-dir', type=Path, default=base_dir / 'data_v2',
+                        help="The real data directory (default: data_v2/ next to this script).")
+    parser.add_argument('--output-dir', type=Path,
+                        help="Where the tables are written (default: scale_<N> in the user's cache directory).")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the perturbations (default: 0).")
+    args = parser.parse_args()
+    if args.scale < 1:
+        print("Error: scale must be at least 1.")
+        return
+
+    output_dir = args.output_dir or default_output_dir(args.data_dir, args.scale)
+    print(f"Generating a {args.scale}x synthetic data set in '{output_dir}'...")
+    manifest = generate(args.data_dir, output_dir, args.scale, seed=args.seed)
+    if manifest is not None:
+        print(f"Done in {manifest['generated_s']:.1f}s: "
+              + ", ".join(f"{rows} rows in '{name}'" for name, rows in manifest['rows'].items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,6 @@
+# conftest.py
+import sys
+from pathlib import Path
+
+# The analyzer's modules live flat in code_v2/ and import each other by name
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,110 @@
+# test_batch.py
+from pathlib import Path
+
+import pytest
+
+import batch
+from data_loader import IOR_CONFIG_FILE, load_job_store
+from llm_api import LLMError
+from results_store import ResultsStore
+from utils import extract_pipeline_data
+
+DATA_DIR = Path(__file__).resolve().parent.parent / 'data_v2'
+RESPONSE = "**Before:**\nnumTasks = 4\n\n**After:**\nnumTasks = 16  (Impact: 7, Risk: 3 - More parallelism)\n\nWhy: ...\n"
+
+
+@pytest.fixture(scope='module')
+def job_store():
+    return load_job_store(DATA_DIR)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ResultsStore(tmp_path / 'results.sqlite')
+    yield store
+    store.close()
+
+
+def tasks_for(job_store, test_ids: list) -> list:
+    return [{'test_id': t, 'pipeline': 'darshan_shap', 'prompt': f"prompt {t}",
+             'original_config': job_store.get(t).original_config} for t in test_ids]
+
+
+def run(job_store, tasks, output_dir, store) -> dict:
+    results = batch.run_batch(tasks, output_dir, DATA_DIR / IOR_CONFIG_FILE, concurrency=2,
+                              ior_config_df=job_store.ior_config_df, store=store)
+    return {r['test_id']: r['status'] for r in results}
+
+
+def stream_then(error=None):
+    """
+    A stream_llm that reports the After block, then fails with error (or completes).
+    """
+    def stream_llm(prompt, on_after_block=None):
+        on_after_block(extract_pipeline_data(RESPONSE)[1])
+        if error is not None:
+            raise error
+        return {'content': RESPONSE, 'ttft_s': 0.01, 'after_block_s': 0.02}
+    return stream_llm
+
+
+def test_stream_failing_after_its_after_block_leaves_no_outputs(job_store, store, tmp_path, monkeypatch):
+    monkeypatch.setattr(batch, 'streaming_enabled', lambda: True)
+    monkeypatch.setattr(batch, 'stream_llm', stream_then(LLMError("The response stream broke off")))
+
+    statuses = run(job_store, tasks_for(job_store, ['test00019']), tmp_path, store)
+
+    assert statuses == {'test00019': 'failed'}
+    assert sorted(p.name for p in tmp_path.glob('*.csv')) == []
+    assert store.changes().empty and store.modified_config('test00019', 'darshan_shap') is None
+
+
+def test_streamed_outputs_are_written_once_the_stream_completes(job_store, store, tmp_path, monkeypatch):
+    monkeypatch.setattr(batch, 'streaming_enabled', lambda: True)
+    monkeypatch.setattr(batch, 'stream_llm', stream_then())
+
+    statuses = run(job_store, tasks_for(job_store, ['test00019']), tmp_path, store)
+
+    assert statuses == {'test00019': 'done'}
+    assert sorted(p.name for p in tmp_path.glob('*.csv')) == [
+        'comparison_suggestions_darshan_shap_test00019.csv', 'ior_configurations_modified_darshan_shap_test00019.csv']
+    assert store.modified_config('test00019', 'darshan_shap')['numTasks'].tolist() == [16]
+    assert store.suggestion('test00019', 'darshan_shap')['response'] == RESPONSE
+
+
+def test_failed_write_fails_only_its_task(job_store, store, tmp_path, monkeypatch):
+    monkeypatch.setattr(batch, 'streaming_enabled', lambda: False)
+    monkeypatch.setattr(batch, 'call_llm', lambda prompt: RESPONSE)
+    write_modified_config = batch.write_modified_config
+
+    def failing_write(df, pipeline, output_dir, test_id):
+        if test_id == 'test00019':
+            raise OSError("No space left on device")
+        return write_modified_config(df, pipeline, output_dir, test_id)
+    monkeypatch.setattr(batch, 'write_modified_config', failing_write)
+
+    statuses = run(job_store, tasks_for(job_store, ['test00019', 'test00736']), tmp_path, store)
+
+    assert statuses == {'test00019': 'failed', 'test00736': 'done'}
+    # The files and store rows written before the failure are removed; the other job is committed
+    assert not list(tmp_path.glob('*test00019*'))
+    assert store.analyses()['test_id'].tolist() == ['test00736']
+    assert store.changes()['test_id'].unique().tolist() == ['test00736']
+    assert store.modified_config('test00736', 'darshan_shap') is not None
+
+
+def test_error_building_streamed_outputs_fails_only_its_task(job_store, store, tmp_path, monkeypatch):
+    monkeypatch.setattr(batch, 'streaming_enabled', lambda: True)
+    monkeypatch.setattr(batch, 'stream_llm', stream_then())
+    build_suggestion_outputs = batch.build_suggestion_outputs
+
+    def failing_build(original_config, after_changes, pipeline, test_id, *args, **kwargs):
+        if test_id == 'test00019':
+            raise KeyError('numTasks')
+        return build_suggestion_outputs(original_config, after_changes, pipeline, test_id, *args, **kwargs)
+    monkeypatch.setattr(batch, 'build_suggestion_outputs', failing_build)
+
+    statuses = run(job_store, tasks_for(job_store, ['test00019', 'test00736']), tmp_path, store)
+
+    assert statuses == {'test00019': 'failed', 'test00736': 'done'}
+    assert store.analyses()['test_id'].tolist() == ['test00736']
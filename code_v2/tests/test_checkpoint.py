@@ -0,0 +1,83 @@
+# test_checkpoint.py
+from pathlib import Path
+
+import pytest
+
+from checkpoint import Checkpoint, input_hash, job_fingerprints
+from data_loader import load_all_data, load_job_store
+from utils import save_suggestion
+
+DATA_DIR = Path(__file__).resolve().parent.parent / 'data_v2'
+
+
+def task(test_id: str = 'test00019', prompt: str = 'prompt', fingerprint: str = 'f1') -> dict:
+    return {'test_id': test_id, 'pipeline': 'darshan_shap', 'prompt': prompt,
+            'input_hash': input_hash('darshan_shap', [(test_id, fingerprint)])}
+
+
+def finish(checkpoint: Checkpoint, output_dir: Path, t: dict):
+    checkpoint.record(t, 'started')
+    save_suggestion(output_dir, t['pipeline'], t['test_id'], t['prompt'], 'response')
+    checkpoint.record(t, 'done', latency_s=1.0)
+
+
+@pytest.fixture(scope='module')
+def worst_job_fingerprint():
+    raw, shap, config, test_id = load_all_data(DATA_DIR)
+    return test_id, job_fingerprints(raw, shap, config)[0]
+
+
+@pytest.mark.parametrize('compact, float32_rtol', [(False, 0.0), (True, 0.0), (True, 1e-6)])
+def test_fingerprints_do_not_depend_on_load_mode(worst_job_fingerprint, compact, float32_rtol):
+    # Single-job mode and 'all' hash load_all_data's frames, fleet mode the JobStore's
+    test_id, expected = worst_job_fingerprint
+    store = load_job_store(DATA_DIR, compact=compact, float32_rtol=float32_rtol)
+
+    fingerprints = job_fingerprints(store.raw_df, store.shap_df, store.config_df)
+
+    assert fingerprints[store.get(test_id).position] == expected
+
+
+def test_done_task_is_skipped_after_reopen(tmp_path):
+    t = task()
+    checkpoint = Checkpoint(tmp_path / 'checkpoint.jsonl')
+    finish(checkpoint, tmp_path, t)
+    checkpoint.close()
+
+    reopened = Checkpoint(tmp_path / 'checkpoint.jsonl')
+
+    assert reopened.pending([t], tmp_path) == []
+
+
+@pytest.mark.parametrize('changed', [task(prompt='new prompt'), task(fingerprint='f2')], ids=['prompt', 'inputs'])
+def test_changed_task_is_redone(tmp_path, changed):
+    checkpoint = Checkpoint(tmp_path / 'checkpoint.jsonl')
+    finish(checkpoint, tmp_path, task())
+
+    assert checkpoint.pending([changed], tmp_path) == [changed]
+
+
+def test_interrupted_failed_or_missing_output_is_redone(tmp_path):
+    started, failed, deleted = task('test00001'), task('test00002'), task('test00003')
+    checkpoint = Checkpoint(tmp_path / 'checkpoint.jsonl')
+    checkpoint.record(started, 'started')
+    checkpoint.record(failed, 'failed', error='HTTP 500')
+    finish(checkpoint, tmp_path, deleted)
+    (tmp_path / 'suggestion_darshan_shap_test00003.txt').unlink()
+
+    assert checkpoint.pending([started, failed, deleted], tmp_path) == [started, failed, deleted]
+
+
+def test_torn_last_line_is_ignored(tmp_path):
+    t = task()
+    checkpoint = Checkpoint(tmp_path / 'checkpoint.jsonl')
+    finish(checkpoint, tmp_path, t)
+    checkpoint.close()
+    with open(tmp_path / 'checkpoint.jsonl', 'a') as f:
+        f.write('{"test_id": "test00019", "pipeline": "darsh')
+
+    reopened = Checkpoint(tmp_path / 'checkpoint.jsonl')
+    reopened.record(task('test00001'), 'started')
+    reopened.close()
+
+    assert Checkpoint(tmp_path / 'checkpoint.jsonl').pending([t], tmp_path) == []
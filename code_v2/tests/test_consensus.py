@@ -0,0 +1,98 @@
+# test_consensus.py
+from consensus import merge_after_blocks, merge_responses
+from utils import extract_pipeline_data
+
+
+def change(value, impact=5, risk=2) -> dict:
+    return {'value': value, 'impact': impact, 'risk': risk}
+
+
+def response(before: str, after: str) -> str:
+    return f"Analysis.\n\n**Before:**\n{before}\n\n**After:**\n{after}\n"
+
+
+def test_parameter_needs_a_majority_of_models():
+    merged = merge_after_blocks({
+        'a': {'transferSize': change('1M'), 'fsync': change('0')},
+        'b': {'transferSize': change('1M')},
+        'c': {},
+    })
+
+    assert list(merged) == ['transferSize']
+    assert merged['transferSize']['votes'] == 2 and merged['transferSize']['models'] == 2
+
+
+def test_min_votes_overrides_the_majority():
+    changes = {'a': {'fsync': change('0')}, 'b': {}, 'c': {}}
+
+    assert 'fsync' in merge_after_blocks(changes, min_votes=1)
+    assert merge_after_blocks(changes, min_votes=2) == {}
+
+
+def test_equal_sizes_and_api_spellings_vote_together():
+    merged = merge_after_blocks({
+        'a': {'transferSize': change('4M'), 'api': change('MPIIO')},
+        'b': {'transferSize': change('4194304'), 'api': change('mpiio')},
+        'c': {'transferSize': change('1M'), 'api': change('POSIX')},
+    })
+
+    # The first spelling of the winning value is kept
+    assert merged['transferSize']['value'] == '4M' and merged['transferSize']['votes'] == 2
+    assert merged['transferSize']['alternatives'] == {'1M': 1}
+    assert merged['api']['value'] == 'MPIIO'
+
+
+def test_value_with_the_highest_impact_weighted_vote_wins():
+    merged = merge_after_blocks({
+        'a': {'transferSize': change('1M', impact=2)},
+        'b': {'transferSize': change('1M', impact=2)},
+        'c': {'transferSize': change('4M', impact=9)},
+    })
+
+    assert merged['transferSize']['value'] == '4M'
+    assert merged['transferSize']['alternatives'] == {'1M': 2}
+
+
+def test_model_weights_scale_the_votes():
+    changes = {'a': {'numTasks': change('16')}, 'b': {'numTasks': change('64')}}
+
+    assert merge_after_blocks(changes, min_votes=1)['numTasks']['value'] == '16'
+    assert merge_after_blocks(changes, min_votes=1, weights={'b': 2})['numTasks']['value'] == '64'
+
+
+def test_ties_go_to_the_value_seen_first_and_scores_are_averaged():
+    merged = merge_after_blocks({
+        'a': {'blockSize': change('8M', impact=6, risk=1)},
+        'b': {'blockSize': change('2M', impact=6, risk=3)},
+        'c': {'blockSize': change('8M', impact='N/A', risk='N/A')},
+    }, min_votes=2)
+
+    # 8M: 6 + DEFAULT_IMPACT 5; 2M: 6
+    assert merged['blockSize']['value'] == '8M'
+    assert (merged['blockSize']['impact'], merged['blockSize']['risk']) == (6, 1)
+
+    tied = merge_after_blocks({'a': {'blockSize': change('2M')}, 'b': {'blockSize': change('8M')}}, min_votes=1)
+    assert tied['blockSize']['value'] == '2M'
+
+
+def test_placeholder_parameters_are_ignored():
+    merged = merge_after_blocks({'a': {'parameter1': change('x')}, 'b': {'parameter1': change('x')}})
+
+    assert merged == {}
+
+
+def test_merged_response_parses_to_the_merged_changes():
+    merged_text = merge_responses({
+        'model-a': response("transferSize = 4K\nfsync = 1",
+                            "transferSize = 1M  (Impact: 8, Risk: 2 - Fewer calls)\nfsync = 0  (Impact: 4, Risk: 3 - No flush)"),
+        'model-b': response("transferSize = 4K",
+                            "transferSize = 1048576  (Impact: 6, Risk: 2 - Larger requests)"),
+        'model-c': response("numTasks = 4", "numTasks = 16"),
+    })
+
+    before, after = extract_pipeline_data(merged_text)
+
+    assert before == {'transferSize': '4K'}
+    assert after == {'transferSize': {'value': '1M', 'impact': 7, 'risk': 2}}
+    assert "- model-c: numTasks -> 16" in merged_text
+    assert "2/3 models agree" in merged_text
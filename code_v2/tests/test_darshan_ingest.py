@@ -0,0 +1,65 @@
+# test_darshan_ingest.py
+import shutil
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from darshan_ingest import DEFAULT_MODULES, ingest_file, ingest_logs
+from data_loader import RAW_DARSHAN_FILE
+
+DATA_DIR = Path(__file__).resolve().parent.parent / 'data_v2'
+# A darshan-parser dump of job test01984: two POSIX records (rank 0 and 1) whose
+# counters add up to that job's row of the raw Darshan table, plus counters
+# and modules that are not columns of the table
+SAMPLE_DUMP = Path(__file__).resolve().parent / 'data' / 'test01984.darshan.txt'
+
+
+@pytest.fixture(scope='module')
+def raw_table():
+    return pd.read_csv(DATA_DIR / RAW_DARSHAN_FILE)
+
+
+def test_dump_round_trips_known_row(raw_table):
+    known = raw_table[raw_table['test_id'] == 'test01984'].iloc[0]
+
+    [row] = ingest_file(SAMPLE_DUMP, DEFAULT_MODULES, list(raw_table.columns))
+
+    assert row['test_id'] == 'test01984'
+    # Not derivable from a dump: left for the table's own preprocessing
+    assert 'tag' not in row and 'nprocs' not in row
+    for column, value in row.items():
+        assert value == known[column], column
+
+
+def table_without(raw_table, tmp_path, test_id) -> Path:
+    data_dir = tmp_path / 'data'
+    data_dir.mkdir()
+    raw_table[raw_table['test_id'] != test_id].to_csv(data_dir / RAW_DARSHAN_FILE, index=False)
+    return data_dir
+
+
+def test_ingest_appends_row_with_empty_tag(raw_table, tmp_path):
+    data_dir = table_without(raw_table, tmp_path, 'test01984')
+
+    counts = ingest_logs([SAMPLE_DUMP], data_dir, workers=1)
+    again = ingest_logs([SAMPLE_DUMP], data_dir, workers=1)
+
+    assert counts['ingested'] == 1 and counts['out_of_range'] == 0
+    assert again['ingested'] == 0 and again['skipped'] == 1
+    table = pd.read_csv(data_dir / RAW_DARSHAN_FILE)
+    new = table[table['test_id'] == 'test01984'].iloc[0]
+    known = raw_table[raw_table['test_id'] == 'test01984'].iloc[0]
+    assert pd.isna(new['tag'])
+    assert new.drop(['tag', 'nprocs']).equals(known.drop(['tag', 'nprocs']))
+
+
+def test_ingest_warns_about_counters_outside_existing_range(raw_table, tmp_path, capsys):
+    data_dir = table_without(raw_table, tmp_path, 'test01984')
+    dump = tmp_path / 'big.txt'
+    dump.write_text(SAMPLE_DUMP.read_text().replace('POSIX_BYTES_WRITTEN\t1967', 'POSIX_BYTES_WRITTEN\t1967000000'))
+
+    counts = ingest_logs([dump], data_dir, workers=1)
+
+    assert counts['ingested'] == 1 and counts['out_of_range'] == 1
+    assert 'POSIX_BYTES_WRITTEN' in capsys.readouterr().out
@@ -0,0 +1,163 @@
+# test_data_cache.py
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import data_cache
+from data_cache import append_rows, open_table
+
+BUILD_MESSAGE = "Building columnar cache"
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = tmp_path / 'jobs.csv'
+    pd.DataFrame({
+        'test_id': ['test002', 'test001', 'test003', 'test001'],
+        'api': ['POSIX', 'MPIIO', None, 'POSIX'],
+        'nprocs': [4, 8, 16, 32],
+        'tag': [0.5, 1.25, 2.0, 3.5],
+    }).to_csv(path, index=False)
+    return path
+
+
+def assert_matches_csv(table, csv_path):
+    pd.testing.assert_frame_equal(table.to_frame(), pd.read_csv(csv_path), check_dtype=False)
+
+
+def test_first_open_builds_the_cache(csv_path, capsys):
+    table = open_table(csv_path, csv_path.parent / '.cache', 'test_id')
+
+    assert BUILD_MESSAGE in capsys.readouterr().out
+    assert len(table) == 4
+    assert_matches_csv(table, csv_path)
+    # Duplicate keys return every matching row, in row order
+    assert table.lookup('test001')['nprocs'].tolist() == [8, 32]
+    assert table.lookup(['test003', 'missing'])['api'].isna().all()
+
+
+def test_unchanged_source_reuses_the_cache(csv_path, capsys):
+    open_table(csv_path, csv_path.parent / '.cache', 'test_id')
+    capsys.readouterr()
+    stat = csv_path.stat()
+    os.utime(csv_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    table = open_table(csv_path, csv_path.parent / '.cache', 'test_id')
+
+    # Only the mtime changed: the content hash matches, so nothing is re-parsed
+    assert BUILD_MESSAGE not in capsys.readouterr().out
+    assert table.manifest['mtime_ns'] == csv_path.stat().st_mtime_ns
+    assert_matches_csv(table, csv_path)
+
+
+def test_changed_source_rebuilds_the_cache(csv_path, capsys):
+    open_table(csv_path, csv_path.parent / '.cache', 'test_id')
+    capsys.readouterr()
+    df = pd.read_csv(csv_path)
+    df.loc[0, 'nprocs'] = 64
+    df.to_csv(csv_path, index=False)
+
+    table = open_table(csv_path, csv_path.parent / '.cache', 'test_id')
+
+    assert BUILD_MESSAGE in capsys.readouterr().out
+    assert table.lookup('test002')['nprocs'].tolist() == [64]
+
+
+def test_cache_of_another_format_is_rebuilt(csv_path, capsys):
+    table = open_table(csv_path, csv_path.parent / '.cache', 'test_id')
+    manifest_path = table.table_dir / 'manifest.json'
+    manifest = json.loads(manifest_path.read_text())
+    manifest_path.write_text(json.dumps({**manifest, 'format_version': 0}))
+    capsys.readouterr()
+
+    open_table(csv_path, csv_path.parent / '.cache', 'test_id')
+
+    assert BUILD_MESSAGE in capsys.readouterr().out
+
+
+def test_append_rows_matches_a_rebuild(csv_path, capsys):
+    cache_dir = csv_path.parent / '.cache'
+    open_table(csv_path, cache_dir, 'test_id')
+    rows = pd.DataFrame({
+        # A longer id and api than any stored, a missing api, and a float in the int column
+        'test_id': ['test000004', 'test001'],
+        'api': ['HDF5-PARALLEL', np.nan],
+        'nprocs': [2.5, 1],
+        'tag': [0.1, 0.2],
+    })
+
+    table = append_rows(csv_path, cache_dir, 'test_id', rows)
+
+    assert len(table) == 6
+    assert_matches_csv(table, csv_path)
+    assert table.lookup('test001')['nprocs'].tolist() == [8, 32, 1]
+    assert table.lookup('test000004')['api'].tolist() == ['HDF5-PARALLEL']
+
+    # The appended cache is fresh: reopening neither rebuilds it nor changes it
+    capsys.readouterr()
+    reopened = open_table(csv_path, cache_dir, 'test_id')
+    assert BUILD_MESSAGE not in capsys.readouterr().out
+    assert_matches_csv(reopened, csv_path)
+
+
+def test_append_rows_extends_columns_in_place(csv_path):
+    cache_dir = csv_path.parent / '.cache'
+    table = open_table(csv_path, cache_dir, 'test_id')
+    column_file = table.table_dir / table.manifest['columns'][3]['file']
+    before = column_file.stat().st_ino
+
+    table = append_rows(csv_path, cache_dir, 'test_id',
+                        pd.DataFrame({'test_id': ['test005'], 'api': ['POSIX'], 'nprocs': [4], 'tag': [9.0]}))
+
+    # Same dtype: the float column was appended to, not rewritten
+    assert column_file.stat().st_ino == before
+    assert table.column('tag').tolist() == [0.5, 1.25, 2.0, 3.5, 9.0]
+
+
+@pytest.mark.parametrize('batches', [
+    [['test005', 'test006'], ['test007']],                    # increasing ids: appended in place
+    [['test000', 'test002'], ['test0015', 'test001', 'test999', 'test001']],  # merged into the index
+    [['test000000000009'], ['a']],                            # longer keys widen the index
+])
+def test_appended_keys_are_merged_into_the_index(csv_path, monkeypatch, batches):
+    # Small hash blocks, so appends cross block boundaries
+    monkeypatch.setattr(data_cache, 'HASH_BLOCK_BYTES', 64)
+    cache_dir = csv_path.parent / '.cache'
+    open_table(csv_path, cache_dir, 'test_id')
+    for keys in batches:
+        table = append_rows(csv_path, cache_dir, 'test_id', pd.DataFrame(
+            {'test_id': keys, 'api': 'POSIX', 'nprocs': range(len(keys)), 'tag': 1.0}))
+
+    all_keys = pd.read_csv(csv_path)['test_id'].astype(str).to_numpy()
+    order = np.argsort(all_keys, kind='stable')
+    assert np.load(table.table_dir / 'index_keys.npy').tolist() == all_keys[order].tolist()
+    assert np.load(table.table_dir / 'index_positions.npy').tolist() == order.tolist()
+    for key in set(all_keys):
+        assert table.positions(key).tolist() == np.flatnonzero(all_keys == key).tolist()
+    # The incrementally updated hashes are those of the whole file
+    assert table.manifest['block_hashes'] == data_cache._block_hashes(csv_path)
+    assert len(table.manifest['block_hashes']) > 1
+
+
+def test_append_hashes_only_the_last_block_and_the_new_rows(csv_path, monkeypatch):
+    monkeypatch.setattr(data_cache, 'HASH_BLOCK_BYTES', 64)
+    cache_dir = csv_path.parent / '.cache'
+    for i in range(5):
+        append_rows(csv_path, cache_dir, 'test_id', pd.DataFrame(
+            {'test_id': [f'test1{i:02d}'], 'api': 'POSIX', 'nprocs': [i], 'tag': [0.5]}))
+    size = csv_path.stat().st_size
+    offsets = []
+    block_hashes = data_cache._block_hashes
+
+    def recording_block_hashes(path, hashes=None, from_offset=0):
+        offsets.append(from_offset)
+        return block_hashes(path, hashes, from_offset)
+    monkeypatch.setattr(data_cache, '_block_hashes', recording_block_hashes)
+
+    append_rows(csv_path, cache_dir, 'test_id', pd.DataFrame(
+        {'test_id': ['test200'], 'api': 'POSIX', 'nprocs': [1], 'tag': [0.5]}))
+
+    assert offsets == [size]
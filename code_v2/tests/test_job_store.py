@@ -0,0 +1,63 @@
+# test_job_store.py
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+import job_store
+from data_loader import load_all_data, load_job_store
+from utils import build_modified_config, config_row_positions
+
+DATA_DIR = Path(__file__).resolve().parent.parent / 'data_v2'
+
+
+@pytest.fixture(scope='module')
+def worst_job():
+    return load_all_data(DATA_DIR)
+
+
+@pytest.mark.parametrize('compact', [False, True])
+def test_job_rows_match_the_single_job_load(worst_job, compact):
+    raw, shap, config, test_id = worst_job
+    job = load_job_store(DATA_DIR, compact=compact).get(test_id)
+
+    assert job.raw['test_id'].iat[0] == test_id
+    assert job.shap['test_id'].iat[0] == test_id
+    # Sizes come back in text form even from the compact tables
+    pd.testing.assert_frame_equal(job.config.reset_index(drop=True), config.reset_index(drop=True),
+                                  check_dtype=False)
+
+
+def test_config_is_converted_to_text_once(monkeypatch):
+    store = load_job_store(DATA_DIR, compact=True)
+    calls = []
+    display_frame = job_store.display_frame
+    monkeypatch.setattr(job_store, 'display_frame', lambda df: calls.append(len(df)) or display_frame(df))
+
+    configs = [job.config for job in store.worst(50)]
+
+    assert calls == [len(store)]
+    assert [c['testFile'].iat[0] for c in configs] == store.test_ids[:50]
+    assert configs[0]['transferSize'].dtype == object
+
+
+def test_config_rows_come_from_the_table_they_are_looked_up_in():
+    store = load_job_store(DATA_DIR, compact=True)
+    # Another table with the same testFiles in a different order, as after a reload
+    other = store.ior_config_df.iloc[::-1].reset_index(drop=True)
+    other_positions = config_row_positions(other)
+    changes = {'numTasks': {'value': '16', 'impact': 7, 'risk': 3}}
+
+    for test_id in store.test_ids[:20]:
+        # Interleaved lookups in both tables, with and without their indexes
+        first = build_modified_config(store.ior_config_df, changes, test_id, store.ior_config_positions)
+        second = build_modified_config(other, changes, test_id, other_positions)
+        scanned = build_modified_config(other, changes, test_id)
+
+        assert first['testFile'].tolist() == second['testFile'].tolist() == [test_id]
+        pd.testing.assert_frame_equal(second, scanned)
+        assert first.drop(columns='numTasks').iloc[0].to_dict() == store.get(test_id).config.drop(
+            columns='numTasks').iloc[0].to_dict()
+
+    assert build_modified_config(other, changes, 'test99999', other_positions) is None
+    assert build_modified_config(other, changes, 'test99999') is None
@@ -0,0 +1,64 @@
+# test_llm_api.py
+import pytest
+
+import llm_api
+from llm_api import LLMClient, LLMError
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, headers: dict = None, body: dict = None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.body = body
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.body
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(llm_api.time, 'sleep', sleeps.append)
+    return sleeps
+
+
+def client_answering(*responses) -> LLMClient:
+    client = LLMClient(api_url='http://127.0.0.1:1/v1/chat/completions', max_retries=3,
+                       backoff_max_s=30, max_retry_after_s=120)
+    queue = list(responses)
+    client.session.post = lambda *args, **kwargs: queue.pop(0)
+    return client
+
+
+def payload() -> dict:
+    return {'model': 'm', 'messages': [{'role': 'user', 'content': 'hi'}]}
+
+
+def test_short_retry_after_is_honored(sleeps):
+    client = client_answering(FakeResponse(429, {'Retry-After': '90'}), FakeResponse(200, body={'choices': []}))
+
+    assert client.chat(payload()) == {'choices': []}
+    assert sleeps == [90.0]
+
+
+@pytest.mark.parametrize('retry_after', ['3600', 'Fri, 31 Dec 2100 23:59:59 GMT'])
+def test_long_retry_after_fails_instead_of_waiting(sleeps, retry_after):
+    client = client_answering(FakeResponse(503, {'Retry-After': retry_after}), FakeResponse(200, body={}))
+
+    with pytest.raises(LLMError, match="max_retry_after_s"):
+        client.chat(payload())
+    assert sleeps == []
+
+
+def test_backoff_without_retry_after_is_capped(sleeps):
+    client = client_answering(*[FakeResponse(500)] * 4)
+
+    with pytest.raises(LLMError, match="Giving up after 4 attempts"):
+        client.chat(payload())
+    assert len(sleeps) == 3 and max(sleeps) <= 30
@@ -0,0 +1,58 @@
+# test_metrics.py
+import re
+
+import metrics
+from metrics import STAGE_BUCKETS, RunMetrics
+
+
+def record(run: RunMetrics, stage: str, durations: list):
+    for duration in durations:
+        run.add_span(stage, 0.0, duration, None, {})
+
+
+def test_stage_times_take_constant_memory():
+    run = RunMetrics()
+    record(run, 'llm', [0.3] * 10000 + [7.0] * 10000)
+
+    histogram = run.durations['llm']
+    assert len(histogram.buckets) == len(STAGE_BUCKETS) + 1
+    assert histogram.count == 20000 and abs(histogram.sum - 73000.0) < 1e-6
+    assert histogram.buckets[STAGE_BUCKETS.index(0.5)] == 10000
+    assert histogram.buckets[STAGE_BUCKETS.index(10.0)] == 10000
+
+
+def test_summary_quantiles_fall_in_their_buckets():
+    run = RunMetrics()
+    record(run, 'parse', [0.002] * 80 + [0.2] * 18 + [400.0] * 2)
+
+    stage = run.summary()['stages']['parse']
+
+    assert stage['count'] == 100
+    assert 0.001 < stage['p50_s'] <= 0.0025
+    assert 0.1 < stage['p90_s'] <= 0.25
+    # The +Inf bucket ends at the largest span
+    assert 300.0 < stage['p99_s'] <= 400.0
+    assert run.summary()['stages'].keys() == {'parse'}
+
+
+def test_prometheus_histogram_is_cumulative():
+    run = RunMetrics()
+    record(run, 'csv', [0.0005, 0.004, 0.004, 1000.0])
+
+    text = run.prometheus_text()
+    buckets = re.findall(r'agent_io_stage_seconds_bucket\{stage="csv",le="([^"]+)"\} (\d+)', text)
+
+    assert "# TYPE agent_io_stage_seconds histogram" in text
+    assert [le for le, _ in buckets] == [str(b) for b in STAGE_BUCKETS] + ['+Inf']
+    counts = [int(c) for _, c in buckets]
+    assert counts == sorted(counts)
+    assert dict(buckets)['0.001'] == '1' and dict(buckets)['0.005'] == '3' and counts[-1] == 4
+    assert 'agent_io_stage_seconds_count{stage="csv"} 4' in text
+    assert 'agent_io_stage_seconds_sum{stage="csv"} 1000.008500' in text
+
+
+def test_spans_are_not_recorded_without_a_run():
+    metrics.close()
+    with metrics.span('load'):
+        pass
+    assert metrics.summary() is None and metrics.prometheus_text() == ''
@@ -0,0 +1,114 @@
+# test_parsing.py
+import random
+import re
+
+import pytest
+
+from utils import AfterBlockStreamParser, extract_pipeline_data, parse_after_block, parse_config_block, \
+    split_pipeline_blocks
+
+
+def legacy_parse_after_block(block_str: str) -> dict:
+    # The line-by-line parser parse_after_block replaced; its results are the reference
+    suggested_changes = {}
+    for line in block_str.strip().split('\n'):
+        match = re.match(r'(\w+) = (.+?)\s+\(Impact: (\d+), Risk: (\d+)\s+-\s*(.+?)\)', line)
+        if match:
+            param, value, impact, risk, _ = match.groups()
+            suggested_changes[param.strip()] = {'value': value.strip(), 'impact': int(impact), 'risk': int(risk)}
+        else:
+            match_simple = re.match(r'(\w+) = (.+)', line)
+            if match_simple:
+                param, value = match_simple.groups()
+                suggested_changes[param.strip()] = {'value': value.strip(), 'impact': 'N/A', 'risk': 'N/A'}
+    return suggested_changes
+
+
+def legacy_extract_pipeline_data(content: str) -> tuple:
+    before_match = re.search(r'\*\*Before:\*\*(.*?)\*\*After:\*\*', content, re.DOTALL)
+    after_match = re.search(r'\*\*After:\*\*(.*)', content, re.DOTALL)
+    before_config = parse_config_block(before_match.group(1)) if before_match else {}
+    after_changes = legacy_parse_after_block(after_match.group(1)) if after_match else {}
+    return before_config, after_changes
+
+
+AFTER_LINES = [
+    "transferSize = 1M  (Impact: 8, Risk: 2 - larger requests amortize per-call overhead)",
+    "blockSize = 4M (Impact: 10, Risk: 3 -no space)",
+    "api = MPIIO\t(Impact: 7, Risk: 4 -\tcollective buffering)",
+    "fsync = 0 (Impact: 6, Risk: 5 - fewer flushes) trailing text",
+    "setAlignment = 1M (Impact: 6, Risk: 2)",
+    "numTasks = 64 (Impact: 6, Risk: 2 - nested (parentheses))",
+    "useO_DIRECT = 0",
+    "LUSTRE_STRIPE_WIDTH = 8   ",
+    "segmentCount = 16 (Impact: x, Risk: 2 - not a score)",
+    "parameter1 = value1 (Impact: 1, Risk: 1 - placeholder)",
+    "filePerProc = 1 (Impact: 5, Risk: 1 - windows line end)\r",
+    "useStridedDatatype = 1\r",
+    "  transferSize = 2M (Impact: 4, Risk: 1 - indented)",
+    "transferSize=2M",
+    "transferSize =",
+    "- blockSize = 8M",
+    "",
+    "   ",
+    "Justification: a longer transfer size = fewer calls",
+    "**Before:**",
+    "x = (Impact: 1, Risk: 1 - empty value)",
+]
+
+
+def random_response(rng: random.Random) -> str:
+    parts = []
+    for _ in range(rng.randint(0, 3)):
+        parts.append(rng.choice(["Some analysis.", "### **Final Recommendation:**", "**Before:**", "**After:**",
+                                 "api = POSIX", "transferSize = 4K", ""]))
+        parts.extend(rng.sample(AFTER_LINES, rng.randint(0, 4)))
+    return rng.choice(["\n", "\r\n"]).join(parts)
+
+
+@pytest.mark.parametrize('line', AFTER_LINES)
+def test_parse_after_block_matches_the_line_parser(line):
+    assert parse_after_block(line) == legacy_parse_after_block(line)
+
+
+def test_parse_after_block_matches_the_line_parser_on_random_blocks():
+    rng = random.Random(0)
+    for _ in range(2000):
+        block = "\n".join(rng.choices(AFTER_LINES, k=rng.randint(0, 8)))
+        assert parse_after_block(block) == legacy_parse_after_block(block), block
+
+
+def test_extract_pipeline_data_matches_the_regex_split_on_random_responses():
+    rng = random.Random(1)
+    for _ in range(2000):
+        content = random_response(rng)
+        assert extract_pipeline_data(content) == legacy_extract_pipeline_data(content), content
+
+
+@pytest.mark.parametrize('content, expected', [
+    ("no markers", (None, None)),
+    ("**Before:**\na = 1\n", (None, None)),
+    ("**After:**\nb = 2", (None, "\nb = 2")),
+    ("**After:** x **Before:**\na = 1\n", (None, " x **Before:**\na = 1\n")),
+    ("**Before:**a = 1**After:**b = 2**After:**c = 3", ("a = 1", "b = 2**After:**c = 3")),
+    ("**Before:****After:**", ("", "")),
+])
+def test_split_pipeline_blocks_edge_cases(content, expected):
+    assert split_pipeline_blocks(content) == expected
+
+
+def test_stream_parser_agrees_with_extract_pipeline_data():
+    response = ("Analysis...\n### **Final Recommendation:**\n**Before:**\ntransferSize = 4K\n\n**After:**\n"
+                "transferSize = 1M (Impact: 8, Risk: 2 - fewer calls)\nfsync = 0\n\nJustification: ...\n")
+    rng = random.Random(2)
+    for _ in range(50):
+        parser = AfterBlockStreamParser()
+        at = 0
+        while at < len(response):
+            step = rng.randint(1, 12)
+            parser.feed(response[at:at + step])
+            at += step
+        parser.close()
+
+        assert parser.complete and parser.saw_final_recommendation
+        assert parser.changes == extract_pipeline_data(response)[1]
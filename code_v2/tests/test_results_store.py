@@ -0,0 +1,88 @@
+# test_results_store.py
+import argparse
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+import main
+from results_store import ResultsStore
+from utils import build_comparison_frame, build_modified_config, format_suggestion
+
+DATA_DIR = Path(__file__).resolve().parent.parent / 'data_v2'
+ORIGINAL = {'api': 'POSIX', 'transferSize': '4K', 'numTasks': 4}
+OLD_RESPONSE = "**Before:**\ntransferSize = 4K\n\n**After:**\ntransferSize = 1M  (Impact: 6, Risk: 2 - Larger requests)\n"
+NEW_RESPONSE = "**Before:**\nnumTasks = 4\n\n**After:**\nnumTasks = 16  (Impact: 7, Risk: 3 - More parallelism)\n"
+AFTER = {'numTasks': {'value': '16', 'impact': 7, 'risk': 3}}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ResultsStore(tmp_path / 'results.sqlite', export_files=False)
+    yield store
+    store.close()
+
+
+def test_buffered_analysis_counts_as_stored_before_flush(store):
+    store.add_analysis('test00019', 'darshan_shap', 'prompt', NEW_RESPONSE)
+
+    assert store.has_suggestion('test00019', 'darshan_shap')
+    assert store.suggestion('test00019', 'darshan_shap') is None
+    store.flush()
+    assert store.suggestion('test00019', 'darshan_shap')['response'] == NEW_RESPONSE
+
+
+def test_rewritten_analysis_replaces_its_rows(store):
+    store.add_comparison('test00019', 'darshan_shap', build_comparison_frame(
+        ORIGINAL, {'transferSize': {'value': '1M', 'impact': 6, 'risk': 2}}, 'darshan_shap'))
+    store.flush()
+    store.add_comparison('test00019', 'darshan_shap', build_comparison_frame(ORIGINAL, AFTER, 'darshan_shap'))
+    store.flush()
+
+    changes = store.changes()
+
+    assert changes[['parameter', 'suggested_value']].values.tolist() == [['numTasks', '16']]
+
+
+def test_shared_prompts_are_stored_once(store):
+    for test_id in ('test00001', 'test00002'):
+        store.add_analysis(test_id, 'darshan_shap', 'the same prompt', f"response for {test_id}")
+    store.flush()
+
+    assert store._conn.execute("SELECT COUNT(*) FROM texts").fetchone()[0] == 3
+
+
+def test_export_writes_the_files_of_the_analyzer(store, tmp_path):
+    config_df = pd.read_csv(DATA_DIR / main.IOR_CONFIG_FILE)
+    comparison = build_comparison_frame(ORIGINAL, AFTER, 'darshan_shap')
+    modified = build_modified_config(config_df, AFTER, 'test00019')
+    store.add_analysis('test00019', 'darshan_shap', 'prompt', NEW_RESPONSE)
+    store.add_comparison('test00019', 'darshan_shap', comparison)
+    store.add_modified_config('test00019', 'darshan_shap', modified)
+    store.flush()
+
+    store.export(tmp_path / 'export')
+
+    export = tmp_path / 'export'
+    assert ((export / 'suggestion_darshan_shap_test00019.txt').read_text()
+            == format_suggestion('darshan_shap', 'test00019', 'prompt', NEW_RESPONSE))
+    assert ((export / 'comparison_suggestions_darshan_shap_test00019.csv').read_text()
+            == comparison.to_csv(index=False))
+    assert ((export / 'ior_configurations_modified_darshan_shap_test00019.csv').read_text()
+            == modified.to_csv(index=False))
+
+
+def test_single_job_stores_tables_of_the_new_response(store, tmp_path, monkeypatch):
+    # Earlier runs of the three pipelines, as single-job mode needs them
+    for pipeline in ('darshan_shap', 'raw_darshan', 'shap_only'):
+        store.add_analysis('test00019', pipeline, 'old prompt', OLD_RESPONSE)
+    store.flush()
+    monkeypatch.setattr(main, 'call_llm', lambda prompt: NEW_RESPONSE)
+    config = {'surrogate': {'enabled': False}, 'config_index': {'enabled': False}}
+
+    main.run_single_job(argparse.Namespace(pipeline='darshan_shap'), config, DATA_DIR, tmp_path, results=store)
+
+    assert store.suggestion('test00019', 'darshan_shap')['response'] == NEW_RESPONSE
+    changes = store.changes()
+    assert changes[['pipeline', 'parameter', 'suggested_value']].values.tolist() == [['darshan_shap', 'numTasks', '16']]
+    assert store.modified_config('test00019', 'darshan_shap')['numTasks'].tolist() == [16]
@@ -0,0 +1,36 @@
+# test_schema.py
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from checkpoint import canonical_frame
+from data_loader import IOR_CONFIG_FILE, TABLE_FILES
+from schema import compact_frame, display_frame, format_size, parse_size
+
+DATA_DIR = Path(__file__).resolve().parent.parent / 'data_v2'
+
+
+@pytest.mark.parametrize('text, size', [('4K', 4096), ('1M', 1048576), ('16M', 16777216), ('0', 0), ('1000', 1000)])
+def test_size_round_trip(text, size):
+    assert parse_size(text) == size
+    assert format_size(size) == text
+
+
+def test_parse_size_rejects_text():
+    assert parse_size('POSIX') is None
+
+
+def test_compact_configurations_display_as_written():
+    df = pd.read_csv(DATA_DIR / IOR_CONFIG_FILE)
+
+    shown = display_frame(compact_frame(df))
+
+    assert shown.astype(str).equals(df.astype(str))
+
+
+@pytest.mark.parametrize('file_name', [name for name, _ in TABLE_FILES])
+def test_compaction_does_not_change_the_hashed_form(file_name):
+    df = pd.read_csv(DATA_DIR / file_name)
+
+    assert canonical_frame(compact_frame(df, float32_rtol=1e-6)).equals(canonical_frame(df))
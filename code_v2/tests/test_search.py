@@ -0,0 +1,33 @@
+# test_search.py
+import pandas as pd
+import pytest
+
+from search import ConfigSearch
+from surrogate import KNNSurrogate
+
+# Every (numTasks, transferSize) pair once, all with the POSIX api; bandwidth depends on numTasks only
+TRAINING = pd.DataFrame([{'api': 'POSIX', 'numTasks': n, 'transferSize': t}
+                         for n in (1, 4, 16) for t in ('1M', '4M')])
+TAGS = TRAINING['numTasks'].map({1: 1e5, 4: 2e5, 16: 4e5})
+OPTIONS = {'api': ['HDF5', 'MPIIO', 'POSIX'], 'numTasks': [1, 4, 16, 64], 'transferSize': ['1M', '4M', '16M']}
+ORIGINAL = {'api': 'POSIX', 'numTasks': 1, 'transferSize': '1M'}
+
+
+def engine(max_exhaustive: int) -> ConfigSearch:
+    return ConfigSearch(KNNSurrogate(TRAINING, TAGS, k=1), OPTIONS, workers=1, max_exhaustive=max_exhaustive)
+
+
+def test_grid_holds_only_trained_values():
+    search = engine(1000)
+
+    assert dict(zip(search.parameters, search.values)) == {
+        'transferSize': ['1M', '4M'], 'numTasks': [1, 4, 16], 'api': ['POSIX']}
+
+
+@pytest.mark.parametrize('max_exhaustive', [1000, 0], ids=['exhaustive', 'beam'])
+def test_identical_predictions_collapse_to_fewest_changes(max_exhaustive):
+    results = engine(max_exhaustive).best_k(ORIGINAL, k=5)
+
+    # transferSize does not change the prediction, so it is never changed
+    assert [r['changes'] for r in results] == [{'numTasks': 16}, {'numTasks': 4}, {}]
+    assert [round(r['predicted_speedup'], 6) for r in results] == [4.0, 2.0, 1.0]
@@ -0,0 +1,129 @@
+# test_service.py
+import threading
+from pathlib import Path
+
+import pytest
+
+import service
+from llm_api import LLMError
+
+DATA_DIR = Path(__file__).resolve().parent.parent / 'data_v2'
+RESPONSE = "**Before:**\nnumTasks = 4\n\n**After:**\nnumTasks = 16  (Impact: 7, Risk: 3 - More parallelism)\n"
+CONFIG = {
+    'pipelines': [{'type': 'darshan_shap'}, {'type': 'raw_darshan'}],
+    'surrogate': {'enabled': False},
+    'config_index': {'enabled': False},
+    'results': {'export_files': False},
+}
+
+
+class FakeLLM:
+    """
+    Stands in for call_llm: counts the calls and holds each one until released.
+    """
+
+    def __init__(self, response=RESPONSE):
+        self.response = response
+        self.calls = 0
+        self.started = threading.Semaphore(0)
+        self.release = threading.Event()
+        self._lock = threading.Lock()
+
+    def __call__(self, prompt):
+        with self._lock:
+            self.calls += 1
+        self.started.release()
+        assert self.release.wait(10), "the test never released the LLM call"
+        if isinstance(self.response, Exception):
+            raise self.response
+        return self.response
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    fake = FakeLLM()
+    monkeypatch.setattr(service, 'call_llm', fake)
+    yield fake
+    fake.release.set()
+
+
+@pytest.fixture
+def analyzer(tmp_path, llm):
+    analyzer = service.AnalyzerService(CONFIG, DATA_DIR, tmp_path, concurrency=4)
+    yield analyzer
+    llm.release.set()
+    analyzer.close()
+
+
+def test_concurrent_requests_for_a_job_share_one_analysis(analyzer, llm):
+    barrier = threading.Barrier(8)
+    submitted = []
+
+    def request():
+        barrier.wait()
+        submitted.append(analyzer.submit('test00019', 'darshan_shap'))
+
+    threads = [threading.Thread(target=request) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert llm.started.acquire(timeout=10)
+    assert analyzer.health()['in_flight'] == 1
+    llm.release.set()
+    results = [future.result(timeout=10) for _, future, _ in submitted]
+
+    assert llm.calls == 1
+    assert sorted(coalesced for _, _, coalesced in submitted) == [False] + [True] * 7
+    assert {analysis_id for analysis_id, _, _ in submitted} == {'darshan_shap_test00019'}
+    assert all(result is results[0] for result in results)
+    assert results[0]['status'] == 'done' and results[0]['changes'] == {'numTasks': '16'}
+    assert analyzer.result('darshan_shap_test00019') is results[0]
+    assert analyzer.health()['in_flight'] == 0
+
+
+def test_different_jobs_and_pipelines_are_not_coalesced(analyzer, llm):
+    submitted = [analyzer.submit('test00019', 'darshan_shap'), analyzer.submit('test00019', 'raw_darshan'),
+                 analyzer.submit('test00736', 'darshan_shap')]
+    llm.release.set()
+    for _, future, _ in submitted:
+        future.result(timeout=10)
+
+    assert llm.calls == 3
+    assert [coalesced for _, _, coalesced in submitted] == [False, False, False]
+
+
+def test_finished_analysis_is_answered_from_the_checkpoint(analyzer, llm):
+    llm.release.set()
+    analyzer.submit('test00019', 'darshan_shap')[1].result(timeout=10)
+
+    _, future, coalesced = analyzer.submit('test00019', 'darshan_shap')
+    result = future.result(timeout=10)
+
+    assert not coalesced and llm.calls == 1
+    assert result['from_checkpoint'] and result['changes'] == {'numTasks': '16'}
+
+    analyzer.submit('test00019', 'darshan_shap', force=True)[1].result(timeout=10)
+    assert llm.calls == 2
+
+
+def test_failed_analysis_is_not_joined_by_later_requests(analyzer, llm):
+    llm.response = LLMError("connection refused")
+    llm.release.set()
+    failed = analyzer.submit('test00019', 'darshan_shap')[1].result(timeout=10)
+    assert failed['status'] == 'failed' and failed['error'] == "connection refused"
+
+    llm.response = RESPONSE
+    _, future, coalesced = analyzer.submit('test00019', 'darshan_shap')
+
+    assert not coalesced
+    assert future.result(timeout=10)['status'] == 'done'
+    assert llm.calls == 2
+
+
+def test_unknown_jobs_and_pipelines_are_rejected(analyzer, llm):
+    with pytest.raises(KeyError):
+        analyzer.submit('test99999', 'darshan_shap')
+    with pytest.raises(ValueError):
+        analyzer.submit('test00019', 'shap_only')
+    assert llm.calls == 0
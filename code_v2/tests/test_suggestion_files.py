@@ -0,0 +1,56 @@
+# test_suggestion_files.py
+from bulk_parse import parse_suggestion_text
+from prompt_compiler import PromptCompiler
+from results_store import ResultsStore, read_suggestion
+from utils import AFTER_MARKER, extract_pipeline_data, format_suggestion, save_suggestion
+
+OPTIONS = {'api': ['MPIIO', 'POSIX'], 'transferSize': ['1M', '4M'], 'collective': [0, 1]}
+CURRENT_CONFIG = "api = POSIX\ncollective = 0\ntransferSize = 1M"
+RESPONSE = """**Final Recommendation:**
+**Before:**
+transferSize = 1M
+
+**After:**
+transferSize = 4M  (Impact: 4, Risk: 1 - Fewer, larger requests)
+"""
+
+
+def compiled_prompt():
+    return PromptCompiler(OPTIONS).compile('darshan_shap', 'Top features: POSIX_SEQ_WRITES', CURRENT_CONFIG)
+
+
+def test_compiled_prompt_has_job_data_after_example_block():
+    # The case the read-back must handle: config lines follow the prompt's example After block
+    prompt = compiled_prompt()
+    assert prompt.index(AFTER_MARKER) < prompt.index(CURRENT_CONFIG)
+
+
+def test_read_suggestion_file_returns_only_response_changes(tmp_path):
+    save_suggestion(tmp_path, 'darshan_shap', 'test00019', compiled_prompt(), RESPONSE)
+
+    suggestion = read_suggestion(tmp_path, 'darshan_shap', 'test00019')
+    before, after = extract_pipeline_data(suggestion)
+
+    assert before == {'transferSize': '1M'}
+    assert after == {'transferSize': {'value': '4M', 'impact': 4, 'risk': 1}}
+
+
+def test_read_suggestion_from_store_returns_only_response_changes(tmp_path):
+    store = ResultsStore(tmp_path / 'results.sqlite', export_files=False)
+    store.add_analysis('test00019', 'darshan_shap', compiled_prompt(), RESPONSE)
+    store.flush()
+
+    _, after = extract_pipeline_data(read_suggestion(tmp_path, 'darshan_shap', 'test00019', store))
+    store.close()
+
+    assert list(after) == ['transferSize']
+
+
+def test_read_suggestion_missing(tmp_path):
+    assert read_suggestion(tmp_path, 'darshan_shap', 'test00019') is None
+
+
+def test_bulk_parse_ignores_prompt(tmp_path):
+    text = format_suggestion('darshan_shap', 'test00019', compiled_prompt(), RESPONSE)
+
+    assert parse_suggestion_text(text) == [('test00019', 'darshan_shap', 'transferSize', '1M', '4M', 4, 1)]
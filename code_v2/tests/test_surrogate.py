@@ -0,0 +1,41 @@
+# test_surrogate.py
+import numpy as np
+import pandas as pd
+
+from main import make_surrogate
+
+CONFIG = {'surrogate': {'enabled': True, 'k': 5, 'min_r2': 0.0}}
+
+
+def configs(n: int = 400, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'config_id': np.arange(n),
+        'testFile': [f"test{i:05d}" for i in range(n)],
+        'transferSize': rng.choice(['4K', '64K', '1M', '4M'], n),
+        'numTasks': rng.choice([1, 4, 16, 64], n),
+    })
+
+
+def test_model_that_explains_performance_is_used():
+    df = configs()
+    # Bandwidth grows with the transfer size
+    tags = df['transferSize'].map({'4K': 1e3, '64K': 1e4, '1M': 1e5, '4M': 1e6})
+
+    assert make_surrogate(CONFIG, df, tags) is not None
+
+
+def test_model_no_better_than_the_mean_is_not_used():
+    df = configs()
+    tags = 10 ** np.random.default_rng(1).normal(6, 0.5, len(df))
+
+    assert make_surrogate(CONFIG, df, tags) is None
+    # The search baseline needs a model either way
+    assert make_surrogate(CONFIG, df, tags, required=True) is not None
+
+
+def test_disabled_by_default():
+    df = configs()
+    tags = df['transferSize'].map({'4K': 1e3, '64K': 1e4, '1M': 1e5, '4M': 1e6})
+
+    assert make_surrogate({}, df, tags) is None
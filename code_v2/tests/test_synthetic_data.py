@@ -0,0 +1,28 @@
+# test_synthetic_data.py
+from pathlib import Path
+
+from synthetic_data import cache_dir, default_output_dir
+
+CODE_DIR = Path(__file__).resolve().parent.parent
+
+
+def test_data_sets_default_to_the_cache_directory(monkeypatch, tmp_path):
+    monkeypatch.delenv('AGENT_IO_CACHE_DIR', raising=False)
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path))
+
+    output_dir = default_output_dir(CODE_DIR / 'data_v2', 10)
+
+    assert cache_dir() == tmp_path / 'agent_io'
+    assert output_dir.parent.parent == tmp_path / 'agent_io' / 'synthetic'
+    assert output_dir.name == 'scale_10'
+    assert CODE_DIR not in output_dir.parents
+
+
+def test_cache_directory_can_be_overridden(monkeypatch, tmp_path):
+    monkeypatch.setenv('AGENT_IO_CACHE_DIR', str(tmp_path / 'bench'))
+
+    assert default_output_dir(Path('data_v2'), 1).is_relative_to(tmp_path / 'bench')
+
+
+def test_each_source_directory_gets_its_own_data_sets(tmp_path):
+    assert default_output_dir(tmp_path / 'a' / 'data_v2', 1) != default_output_dir(tmp_path / 'b' / 'data_v2', 1)
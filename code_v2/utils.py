@@ -4,6 +4,8 @@ from pathlib import Path
 import re
 import numpy as np 
 
+from schema import display_frame
+
 # (No PARAMETER_TYPES dictionary needed anymore here)
 
 def parse_config_block(block_str: str) -> dict:
@@ -17,58 +19,192 @@ def parse_config_block(block_str: str) -> dict:
             config[key.strip()] = value.strip()
     return config
 
+# One line of an After block: 'param = value  (Impact: N, Risk: N - note)', or just 'param = value'
+# ([^\S\n] is whitespace other than a line break, so a match never spans two lines)
+AFTER_LINE_PATTERN = re.compile(r'^(\w+) = (?:(.+?)[^\S\n]+\(Impact: (\d+), Risk: (\d+)[^\S\n]+-[^\S\n]*.+?\)|(.+))',
+                                re.MULTILINE)
+
+BEFORE_MARKER = '**Before:**'
+AFTER_MARKER = '**After:**'
+
 def parse_after_block(block_str: str) -> dict:
     """
     Parses the 'After' configuration block from LLM output, extracting parameter,
     suggested value, impact, and risk scores.
     """
     suggested_changes = {}
-    lines = block_str.strip().split('\n')
-    for line in lines:
-        # Regex to capture parameter, value, impact, risk, and optional justification
-        match = re.match(r'(\w+) = (.+?)\s+\(Impact: (\d+), Risk: (\d+)\s+-\s*(.+?)\)', line)
-        if match:
-            param, value, impact, risk, _ = match.groups()
-            suggested_changes[param.strip()] = {
+    # One pass of a precompiled pattern over the block; each match is one parameter line
+    for param, value, impact, risk, simple_value in AFTER_LINE_PATTERN.findall(block_str.strip()):
+        if simple_value:
+            # Only a simple parameter = value is present
+            suggested_changes[param] = {
+                'value': simple_value.strip(),
+                'impact': 'N/A', # No impact/risk provided
+                'risk': 'N/A'    # No impact/risk provided
+            }
+        else:
+            suggested_changes[param] = {
                 'value': value.strip(),
                 'impact': int(impact),
                 'risk': int(risk)
             }
-        else:
-            # Handle cases where only a simple parameter = value is present
-            match_simple = re.match(r'(\w+) = (.+)', line)
-            if match_simple:
-                param, value = match_simple.groups()
-                suggested_changes[param.strip()] = {
-                    'value': value.strip(),
-                    'impact': 'N/A', # No impact/risk provided
-                    'risk': 'N/A'    # No impact/risk provided
-                }
     return suggested_changes
 
+def split_pipeline_blocks(content: str) -> tuple:
+    """
+    Finds the 'Before' and 'After' blocks of a suggestion with plain string
+    searches (no regex scan of the whole response).
+
+    Returns:
+        tuple: (before block text, after block text); None for a block that is missing.
+    """
+    before_block = after_block = None
+    after_at = content.find(AFTER_MARKER)
+    if after_at >= 0:
+        after_block = content[after_at + len(AFTER_MARKER):]
+    before_at = content.find(BEFORE_MARKER)
+    if before_at >= 0:
+        # The Before block ends at the first After marker that follows it
+        end = content.find(AFTER_MARKER, before_at + len(BEFORE_MARKER))
+        if end >= 0:
+            before_block = content[before_at + len(BEFORE_MARKER):end]
+    return before_block, after_block
+
 def extract_pipeline_data(content: str) -> tuple[dict, dict]:
     """
     Extracts the 'Before' and 'After' configuration blocks from an LLM pipeline
     suggestion content string. Returns (before_config_dict, after_changes_dict).
     """
-    before_match = re.search(r'\*\*Before:\*\*(.*?)\*\*After:\*\*', content, re.DOTALL)
-    after_match = re.search(r'\*\*After:\*\*(.*)', content, re.DOTALL)
+    before_block, after_block = split_pipeline_blocks(content)
 
     before_config = {}
-    if before_match:
-        before_config = parse_config_block(before_match.group(1))
+    if before_block is not None:
+        before_config = parse_config_block(before_block)
 
     after_changes = {}
-    if after_match:
-        after_changes = parse_after_block(after_match.group(1))
+    if after_block is not None:
+        after_changes = parse_after_block(after_block)
 
     return before_config, after_changes
 
+FINAL_RECOMMENDATION_MARKER = '**Final Recommendation:**'
+
+class AfterBlockStreamParser:
+    """
+    Incrementally parses an LLM response as it streams in and detects the
+    'After' block as soon as it is complete.
+
+    Each line after the **After:** marker is parsed with parse_after_block. The
+    block is complete at the first blank or non-matching line that follows at
+    least one parsed parameter line (or when the stream ends).
+    """
+
+    def __init__(self):
+        self._pending = ''
+        self._in_block = False
+        self.changes = {}
+        self.complete = False
+        self.saw_final_recommendation = False
+
+    def feed(self, text: str) -> bool:
+        """
+        Consumes the next chunk of the response. Returns True if this chunk
+        completed the After block.
+        """
+        if self.complete:
+            return False
+        self._pending += text
+        *lines, self._pending = self._pending.split('\n')
+        for line in lines:
+            self._process_line(line)
+            if self.complete:
+                return True
+        return False
+
+    def close(self) -> bool:
+        """
+        Signals the end of the stream. Returns True if this completed the After block.
+        """
+        if self.complete:
+            return False
+        self._process_line(self._pending)
+        self._pending = ''
+        if self._in_block and self.changes:
+            self.complete = True
+        return self.complete
+
+    def _process_line(self, line: str):
+        if not self._in_block:
+            if FINAL_RECOMMENDATION_MARKER in line:
+                self.saw_final_recommendation = True
+            marker_at = line.find(AFTER_MARKER)
+            if marker_at < 0:
+                return
+            self._in_block = True
+            line = line[marker_at + len(AFTER_MARKER):]
+
+        parsed = parse_after_block(line)
+        if parsed:
+            self.changes.update(parsed)
+        elif self.changes:
+            self.complete = True
+
+def discover_parameter_options(ior_config_df: pd.DataFrame) -> dict:
+    """
+    Automated discovery of optimization levers: every unique value of every
+    tunable IOR parameter.
+    """
+    parameter_options = {}
+    tunable_params = [col for col in ior_config_df.columns if col not in ['config_id', 'testFile']]
+    # Options are listed as written in the CSV, also for a compact (typed) table
+    ior_config_df = display_frame(ior_config_df)
+
+    for param in tunable_params:
+        parameter_options[param] = sorted(ior_config_df[param].unique().tolist())
+    return parameter_options
+
+SUGGESTION_MARKER = "--- LLM SUGGESTION ---\n"
+
+def format_suggestion(pipeline_name: str, test_id: str, prompt: str, suggestion: str) -> str:
+    """
+    The text of a suggestion_<pipeline>_<test_id>.txt file: a header, the prompt and the LLM suggestion.
+    """
+    return (f"--- Analysis for test_id: {test_id} ---\n"
+            f"--- Pipeline: {pipeline_name} ---\n"
+            "\n--- PROMPT SENT TO LLM ---\n"
+            f"{prompt}"
+            "\n\n" + "="*50 + "\n\n"
+            f"{SUGGESTION_MARKER}"
+            f"{suggestion}")
+
+def suggestion_response(content: str) -> str:
+    """
+    The LLM response part of a suggestion file's text (everything after its
+    SUGGESTION_MARKER), or the text itself if it has no marker. The prompt
+    part must never be parsed: it holds an example After block and, with the
+    prompt compiler, the job's current configuration after it.
+    """
+    marker_at = content.find(SUGGESTION_MARKER)
+    return content[marker_at + len(SUGGESTION_MARKER):] if marker_at >= 0 else content
+
+def save_suggestion(output_dir: Path, pipeline_name: str, test_id: str, prompt: str, suggestion: str) -> Path:
+    """
+    Saves the prompt and the LLM suggestion for one job to output/suggestion_<pipeline>_<test_id>.txt.
+
+    Returns:
+        Path: The path of the written file.
+    """
+    output_file = output_dir / f"suggestion_{pipeline_name}_{test_id}.txt"
+    with open(output_file, 'w') as f:
+        f.write(format_suggestion(pipeline_name, test_id, prompt, suggestion))
+    return output_file
+
 def generate_suggestions_csv(original_config: dict,
                              llm_suggestions: dict,
                              pipeline_name: str,
                              output_dir: Path,
-                             test_id: str):
+                             test_id: str,
+                             extra_columns: dict = None):
     """
     Generates a CSV file comparing original config with LLM-suggested changes for a specific pipeline.
 
@@ -80,6 +216,16 @@ def generate_suggestions_csv(original_config: dict,
                              used for column naming and filename.
         output_dir (Path): The directory where the CSV file will be saved.
         test_id (str): The ID of the job being analyzed, used for the filename.
+        extra_columns (dict): Optional additional columns, {column name: {parameter: value}}
+                              (e.g. predicted speedups); parameters not listed get 'N/A'.
+    """
+    df = build_comparison_frame(original_config, llm_suggestions, pipeline_name, extra_columns=extra_columns)
+    write_comparison_csv(df, pipeline_name, output_dir, test_id)
+
+def build_comparison_frame(original_config: dict, llm_suggestions: dict, pipeline_name: str,
+                           extra_columns: dict = None) -> pd.DataFrame:
+    """
+    The comparison table of generate_suggestions_csv (one row per parameter), without writing it.
     """
     data_for_df = []
 
@@ -115,13 +261,23 @@ def generate_suggestions_csv(original_config: dict,
             }
             df.loc[param] = new_row # Add the new row to the DataFrame
 
+    for column, values in (extra_columns or {}).items():
+        df[column] = [values.get(param, 'N/A') for param in df.index]
+
     df.reset_index(inplace=True) # Convert 'Parameter' index back to a regular column for CSV export
+    return df
 
-    # Define output file path and save the DataFrame to CSV
+def write_comparison_csv(df: pd.DataFrame, pipeline_name: str, output_dir: Path, test_id: str) -> Path:
+    """
+    Saves a build_comparison_frame table to output/comparison_suggestions_<pipeline>_<test_id>.csv.
+    """
     output_file = output_dir / f"comparison_suggestions_{pipeline_name}_{test_id}.csv"
     df.to_csv(output_file, index=False)
     print(f"\nCSV comparison for '{pipeline_name}' suggestions saved to: {output_file}")
+    return output_file
 
+# Types of the parameters as written in ior_configurations(in).csv and in
+# prompts; the SIZE_PARAMETERS are stored as int bytes in compact tables (see schema.py).
 PARAMETER_TYPES = {
     'api': str,
     'transferSize': str,
@@ -137,10 +293,77 @@ PARAMETER_TYPES = {
     'LUSTRE_STRIPE_WIDTH': int
 }
 
+def config_row_positions(config_df: pd.DataFrame) -> dict:
+    """
+    The row positions of every testFile in an IOR configuration table. It is
+    built once by whatever owns the table (e.g. JobStore.ior_config_positions)
+    and passed along with it, so it always describes that table.
+    """
+    return config_df.groupby('testFile', sort=False).indices
+
+def config_rows(config_df: pd.DataFrame, test_id: str, config_positions: dict = None) -> pd.DataFrame:
+    """
+    The row(s) of the IOR configuration table for one testFile, through
+    config_positions (config_row_positions of config_df) if given, else by a
+    scan of the table.
+    """
+    if config_positions is None:
+        positions = np.flatnonzero(config_df['testFile'].to_numpy() == test_id)
+    else:
+        positions = config_positions.get(test_id, [])
+    return config_df.iloc[positions]
+
+def build_modified_config(config_df: pd.DataFrame, llm_suggested_changes: dict, target_test_id: str,
+                          config_positions: dict = None):
+    """
+    Applies LLM suggested changes to a copy of one test_id's configuration row(s), in text form.
+    config_positions is config_df's config_row_positions, when its owner has one.
+
+    Returns:
+        pd.DataFrame: The modified row(s), or None if target_test_id is not in config_df.
+    """
+    # Copy only the row(s) corresponding to the target_test_id (in text form); the shared table is never modified
+    df = display_frame(config_rows(config_df, target_test_id, config_positions)).copy()
+    row_indices = df.index
+    if row_indices.empty:
+        return None
+
+    # Apply changes to the selected row(s)
+    for param, details in llm_suggested_changes.items():
+        # Skip generic placeholder parameters
+        if param.startswith('parameter'):
+            continue
+
+        if param in df.columns:
+            target_dtype = df[param].dtype
+            try:
+                if pd.api.types.is_integer_dtype(target_dtype) or pd.api.types.is_bool_dtype(target_dtype):
+                    df.loc[row_indices, param] = int(details['value'])
+                else:
+                    df.loc[row_indices, param] = str(details['value'])
+            except ValueError:
+                print(f"Warning: Could not convert suggested value '{details['value']}' "
+                      f"to {target_dtype} for parameter '{param}' of {target_test_id}. Assigning as is.")
+                df.loc[row_indices, param] = details['value']
+        else:
+            print(f"Warning: Suggested parameter '{param}' not found in original CSV columns. Skipping for {target_test_id}.")
+    return df
+
+def write_modified_config(df: pd.DataFrame, pipeline_name: str, output_dir: Path, test_id: str) -> Path:
+    """
+    Saves a build_modified_config table to output/ior_configurations_modified_<pipeline>_<test_id>.csv.
+    """
+    output_file = output_dir / f"ior_configurations_modified_{pipeline_name}_{test_id}.csv"
+    df.to_csv(output_file, index=False)
+    print(f"Modified configuration for {test_id} saved to: {output_file}")
+    return output_file
+
 def apply_llm_suggestions_to_csv(original_csv_path: Path,
                                  llm_suggested_changes: dict,
                                  target_test_id: str,
-                                 output_modified_csv_path: Path):
+                                 output_modified_csv_path: Path,
+                                 config_df: pd.DataFrame = None,
+                                 config_positions: dict = None):
     """
     Reads an original IOR configuration CSV, applies LLM suggested changes
     to a specific test_id's row, and saves ONLY THE MODIFIED ROW(S) to a new CSV.
@@ -151,40 +374,23 @@ def apply_llm_suggestions_to_csv(original_csv_path: Path,
                                       (e.g., {'transferSize': {'value': '1M', ...}}).
         target_test_id (str): The 'testFile' ID of the row to modify.
         output_modified_csv_path (Path): Path to save the new CSV file with applied changes.
-    """
-    df = pd.read_csv(original_csv_path)
-
-    # Find the row(s) corresponding to the target_test_id
-    row_indices = df[df['testFile'] == target_test_id].index
+        config_df (pd.DataFrame): The already-loaded configuration table. If given,
+                                  original_csv_path is not re-read.
+        config_positions (dict): config_row_positions of config_df, if its owner has one.
 
-    if not row_indices.empty:
-        # Apply changes to the entire DataFrame first
-        for param, details in llm_suggested_changes.items():
-            # Skip generic placeholder parameters
-            if param.startswith('parameter'):
-                continue
-
-            if param in df.columns:
-                target_dtype = df[param].dtype
-                try:
-                    if pd.api.types.is_integer_dtype(target_dtype) or pd.api.types.is_bool_dtype(target_dtype):
-                        df.loc[row_indices, param] = int(details['value'])
-                    else:
-                        df.loc[row_indices, param] = str(details['value'])
-                except ValueError:
-                    print(f"Warning: Could not convert suggested value '{details['value']}' "
-                          f"to {target_dtype} for parameter '{param}' of {target_test_id}. Assigning as is.")
-                    df.loc[row_indices, param] = details['value']
-            else:
-                print(f"Warning: Suggested parameter '{param}' not found in original CSV columns. Skipping for {target_test_id}.")
-        
-        # --- NEW: Filter the DataFrame to contain ONLY the modified row(s) ---
-        df_modified_row_only = df[df['testFile'] == target_test_id]
+    Returns:
+        pd.DataFrame: The modified row(s), or None if the test ID was not found.
+    """
+    if config_df is None:
+        config_df = pd.read_csv(original_csv_path)
 
-        df_modified_row_only.to_csv(output_modified_csv_path, index=False)
+    df = build_modified_config(config_df, llm_suggested_changes, target_test_id, config_positions)
+    if df is not None:
+        df.to_csv(output_modified_csv_path, index=False)
         print(f"Modified configuration for {target_test_id} saved to: {output_modified_csv_path}")
     else:
         print(f"Error: Test ID '{target_test_id}' not found in '{original_csv_path}'. No changes applied.")
+    return df
 
 
 